@@ -0,0 +1,119 @@
+'''
+Boot time benchmark: how long until a controller with many rooms has its GoogleCalendar objects,
+    against the local stand-in of the Google API (fake_google.py).
+
+Scenarios, for each room count in --rooms:
+    import: "import gs_google_calendar" in a fresh interpreter (median of --imports runs)
+    construct: ServiceAccount.GetRoomInterface for every room, should not send any request
+    warm up: ServiceAccount.WarmUp, the token and the calendar list (one crawl for all the rooms)
+    first poll: ServiceAccount.UpdateAll
+
+The server adds --latency seconds to every request, so any request made during construction shows up in the time.
+
+Run from the repo root with the GS modules on the path:
+    python benchmarks/bench_boot.py
+    python benchmarks/bench_boot.py --rooms 100,1000 --latency 0.1
+'''
+import argparse
+import datetime
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from bench_rooms import FakeServerProcess, _FakeAuthManager
+
+import gs_google_calendar
+
+# heavy modules that should not be loaded by "import gs_google_calendar"
+LAZY_MODULES = ['asyncio', 'ssl', 'gs_requests', 'gs_oauth_tools', 'extronlib']
+
+IMPORT_SCRIPT = '''
+import sys, time
+sys.path[:0] = {path!r}
+start = time.perf_counter()
+import gs_google_calendar
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(name for name in {lazy!r} if name in sys.modules))
+'''
+
+
+class BootBench:
+    def __init__(self, args):
+        self.args = args
+        self.requests = 0
+        print('{:<40} {:>9} {:>9}'.format('scenario', 'seconds', 'requests'))
+
+    def Sink(self, record):
+        if record['type'] == 'request':
+            self.requests += 1
+
+    def Run(self, name, func):
+        self.requests = 0
+        start = time.perf_counter()
+        ret = func()
+        print('{:<40} {:>9.3f} {:>9}'.format(name, time.perf_counter() - start, self.requests))
+        sys.stdout.flush()
+        return ret
+
+    def Import(self):
+        script = IMPORT_SCRIPT.format(path=sys.path[:], lazy=LAZY_MODULES)
+        times = []
+        loaded = ''
+        for _ in range(self.args.imports):
+            out = subprocess.check_output([sys.executable, '-c', script]).decode().split()
+            times.append(float(out[0]))
+            loaded = out[1] if len(out) > 1 else ''
+        print('{:<40} {:>9.3f} {:>9}'.format('import', statistics.median(times), '-'))
+        if loaded:
+            print('    loaded by the import: {}'.format(loaded))
+
+    def Rooms(self, rooms):
+        server = FakeServerProcess(self.args, rooms=rooms, events=self.args.events)
+        try:
+            serviceAccount = gs_google_calendar.ServiceAccount(
+                googleJSONpath='bench.json',
+                oauthID='bench-boot-{}'.format(rooms),
+                authManager=_FakeAuthManager(),
+            )
+            interfaces = self.Run('{} rooms: construct'.format(rooms), lambda: [
+                serviceAccount.GetRoomInterface(
+                    'Room {}'.format(room),
+                    apiRoot=server.url,
+                    rateLimit=1e9,
+                    metricsSinks=[self.Sink],
+                ) for room in range(rooms)
+            ])
+            self.Run('{} rooms: warm up'.format(rooms), lambda: serviceAccount.WarmUp(wait=True))
+
+            now = datetime.datetime.now()
+            self.Run('{} rooms: first poll'.format(rooms), lambda: serviceAccount.UpdateAll(
+                now - datetime.timedelta(days=1, hours=1),
+                now + datetime.timedelta(days=8),
+            ))
+            del interfaces
+        finally:
+            server.Stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', default='1,100,1000', help='comma separated room counts')
+    parser.add_argument('--events', type=int, default=20, help='events per room')
+    parser.add_argument('--imports', type=int, default=5, help='number of fresh interpreters to time the import in')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the server adds to every request')
+    args = parser.parse_args()
+
+    # what FakeServerProcess expects from the bench_rooms arguments
+    args.jitter = 0
+    args.error_rate = 0
+    args.error_status = 503
+
+    bench = BootBench(args)
+    bench.Import()
+    for rooms in [int(rooms) for rooms in args.rooms.split(',') if rooms]:
+        bench.Rooms(rooms)
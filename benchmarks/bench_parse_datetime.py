@@ -0,0 +1,64 @@
+'''
+Microbenchmark of the event start/end parsing done for every item in UpdateCalendar.
+
+    old: fromisoformat() followed by the timestamp()/fromtimestamp() round trip UpdateCalendar used to do
+    cold: _ParseRFC3339 with an empty cache (first poll)
+    warm: _ParseRFC3339 with the strings already cached (every following poll)
+
+Run from the repo root with the GS modules on the path:
+    python benchmarks/bench_parse_datetime.py
+'''
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gs_google_calendar
+
+NUMBER_OF_EVENTS = 1000
+REPEAT = 20
+
+base = datetime.datetime(2020, 7, 31, 8, 0)
+STRINGS = []
+for i in range(NUMBER_OF_EVENTS):
+    dt = base + datetime.timedelta(minutes=30 * i)
+    STRINGS.append(dt.isoformat() + '-04:00')
+
+
+def Old():
+    for s in STRINGS:
+        dt = gs_google_calendar.fromisoformat(s)
+        datetime.datetime.fromtimestamp(dt.timestamp())
+
+
+def Cold():
+    gs_google_calendar._ParseRFC3339.cache_clear()
+    for s in STRINGS:
+        gs_google_calendar._ParseRFC3339(s)
+
+
+def Warm():
+    for s in STRINGS:
+        gs_google_calendar._ParseRFC3339(s)
+
+
+if __name__ == '__main__':
+    # same results
+    for s in STRINGS:
+        assert gs_google_calendar._ParseRFC3339(s) == datetime.datetime.fromtimestamp(
+            gs_google_calendar.fromisoformat(s).timestamp())
+
+    Warm()  # fill the cache
+
+    results = {}
+    for name, func in (('old', Old), ('cold', Cold), ('warm', Warm)):
+        seconds = min(timeit.repeat(func, number=1, repeat=REPEAT))
+        results[name] = seconds
+        print('{:>5}: {:8.2f} us per timestamp'.format(name, seconds / NUMBER_OF_EVENTS * 1e6))
+
+    print('cold speedup x{:.1f}, warm speedup x{:.1f}'.format(
+        results['old'] / results['cold'],
+        results['old'] / results['warm'],
+    ))
@@ -0,0 +1,316 @@
+'''
+Throughput benchmark of gs_google_calendar against the local stand-in of the Google API (fake_google.py),
+    no credentials or network needed. The fake server runs in its own process so it does not skew the numbers.
+
+Scenarios, for each room count in --rooms:
+    construct: GoogleCalendar objects created for every room
+    first poll: every room updated once with GoogleCalendarScheduler.UpdateAll (full window)
+    unchanged poll: same again, nothing changed on the server
+    service account: rooms made with ServiceAccount.GetRoomInterface, then updated with ServiceAccount.UpdateAll (batched)
+    availability: ServiceAccount.UpdateAvailability (freeBusy) for every room, then 1000 "which rooms are free" queries
+And once:
+    big window: 1 room with --big-window events in the window
+    attachments: every attachment of a room downloaded into the cache and read
+    sliding window: 1 room polled 96 times with the window moved 15 minutes each time (a day of polls),
+        with the whole window read each time and with GoogleCalendar(dayTiles=True)
+
+Reported for each scenario: seconds, HTTP requests and requests/s, p50/p99 request latency, KB received,
+    peak memory allocated by Python during the scenario (tracemalloc, slows things down, see --no-allocations)
+    and the peak RSS of the process so far.
+
+Run from the repo root with the GS modules on the path:
+    python benchmarks/bench_rooms.py
+    python benchmarks/bench_rooms.py --rooms 1,100 --events 50 --latency 0.02 --error-rate 0.01
+'''
+import argparse
+import datetime
+import gc
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+import gs_google_calendar
+
+
+class _FakeUser:
+    def GetAccessToken(self):
+        return 'fake-token'
+
+
+class _FakeAuthManager:
+    # what ServiceAccount needs from gs_oauth_tools.AuthManager
+    def GetUserByID(self, ID):
+        return _FakeUser()
+
+
+class FakeServerProcess:
+    '''
+    fake_google.py in a subprocess
+    '''
+
+    def __init__(self, args, rooms, events, attachments=0):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+
+        self._process = subprocess.Popen([
+            sys.executable, os.path.join(HERE, 'fake_google.py'),
+            '--port', str(self.port),
+            '--rooms', str(rooms),
+            '--events', str(events),
+            '--attachments', str(attachments),
+            '--latency', str(args.latency),
+            '--jitter', str(args.jitter),
+            '--error-rate', str(args.error_rate),
+            '--error-status', str(args.error_status),
+        ], stdout=subprocess.DEVNULL)
+
+        # wait for it to listen, building the events can take a moment
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            self.Stop()
+            raise RuntimeError('fake_google.py did not start')
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+    def Stop(self):
+        self._process.terminate()
+        self._process.wait()
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.latencies = []  # seconds of every request of the current scenario
+        self.bytesIn = 0  # bytes received by the current scenario
+        self.cacheDir = tempfile.mkdtemp(prefix='bench_attachments_')
+        self._accounts = 0
+
+        print('{:<40} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10} {:>9}'.format(
+            'scenario', 'seconds', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'KB in', 'alloc MB', 'RSS MB'))
+
+    def Sink(self, record):
+        if record['type'] == 'request':
+            self.latencies.append(record['total'])
+            self.bytesIn += record['bytesIn'] or 0
+
+    def CalendarKwargs(self, server):
+        # a new account for every scenario, so the transports/caches/limiters start cold
+        self._accounts += 1
+        return {
+            'apiRoot': server.url,
+            'accountKey': 'bench-{}'.format(self._accounts),
+            'rateLimit': self.args.rate_limit or 1e9,
+            'metricsSinks': [self.Sink],
+            'attachmentCacheDir': self.cacheDir,
+        }
+
+    def Run(self, name, func):
+        gc.collect()
+        self.latencies = []
+        self.bytesIn = 0
+        if self.args.allocations:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        ret = func()
+        elapsed = time.perf_counter() - start
+
+        allocated = None
+        if self.args.allocations:
+            allocated = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        latencies = sorted(self.latencies)
+        print('{:<40} {:>9.3f} {:>9} {:>9.0f} {:>9} {:>9} {:>9.1f} {:>10} {:>9}'.format(
+            name,
+            elapsed,
+            len(latencies),
+            len(latencies) / elapsed if elapsed else 0,
+            _Format(_Percentile(latencies, 0.5), 1000),
+            _Format(_Percentile(latencies, 0.99), 1000),
+            self.bytesIn / 1024,
+            _Format(allocated, 1 / 1024 / 1024),
+            _Format(_PeakRSS(), 1 / 1024 / 1024),
+        ))
+        sys.stdout.flush()
+        return ret
+
+    def Window(self):
+        # the fake server spreads the events from 1 day ago over 8 days
+        now = datetime.datetime.now()
+        return now - datetime.timedelta(days=1, hours=1), now + datetime.timedelta(days=8)
+
+    def Rooms(self, rooms):
+        server = FakeServerProcess(self.args, rooms=rooms, events=self.args.events)
+        try:
+            startDT, endDT = self.Window()
+            kwargs = self.CalendarKwargs(server)
+            calendars = self.Run('{} rooms: construct'.format(rooms), lambda: [
+                gs_google_calendar.GoogleCalendar(
+                    getAccessTokenCallback=lambda: 'fake-token',
+                    calendarName='Room {}'.format(room),
+                    **kwargs
+                ) for room in range(rooms)
+            ])
+
+            scheduler = gs_google_calendar.GoogleCalendarScheduler(
+                calendars,
+                maxWorkers=self.args.workers,
+                maxPerAccount=self.args.workers,
+            )
+            self.Run('{} rooms: first poll'.format(rooms), lambda: scheduler.UpdateAll(startDT, endDT))
+            self.Run('{} rooms: unchanged poll'.format(rooms), lambda: scheduler.UpdateAll(startDT, endDT))
+            del calendars, scheduler
+
+            serviceAccount = gs_google_calendar.ServiceAccount(
+                googleJSONpath='bench.json',
+                oauthID='bench-service-account-{}'.format(rooms),
+                authManager=_FakeAuthManager(),
+            )
+            kwargs = self.CalendarKwargs(server)
+            kwargs.pop('accountKey')
+            interfaces = self.Run('{} rooms: GetRoomInterface'.format(rooms), lambda: [
+                serviceAccount.GetRoomInterface('Room {}'.format(room), **kwargs)
+                for room in range(rooms)
+            ])
+            self.Run('{} rooms: service account poll'.format(rooms), lambda: serviceAccount.UpdateAll(startDT, endDT))
+            index = self.Run('{} rooms: availability'.format(rooms), lambda: serviceAccount.UpdateAvailability(
+                startDT=startDT,
+                endDT=endDT,
+            ))
+            hours = [startDT + datetime.timedelta(hours=hour) for hour in range(1000)]
+            self.Run('{} rooms: 1000 x GetFreeRooms'.format(rooms), lambda: [
+                index.GetFreeRooms(hour, hour + datetime.timedelta(hours=1))
+                for hour in hours if index.Covers(hour, hour + datetime.timedelta(hours=1))
+            ])
+            del interfaces
+        finally:
+            server.Stop()
+
+    def BigWindow(self):
+        server = FakeServerProcess(self.args, rooms=1, events=self.args.big_window)
+        try:
+            startDT, endDT = self.Window()
+            calendar = gs_google_calendar.GoogleCalendar(
+                getAccessTokenCallback=lambda: 'fake-token',
+                calendarName='Room 0',
+                maxResults=2500,
+                **self.CalendarKwargs(server)
+            )
+            name = '{} events: '.format(self.args.big_window)
+            self.Run(name + 'first poll', lambda: calendar.UpdateCalendar(startDT=startDT, endDT=endDT))
+            self.Run(name + 'unchanged poll', lambda: calendar.UpdateCalendar(startDT=startDT, endDT=endDT))
+            self.Run(name + '1000 x GetNowCalItems', lambda: [calendar.GetNowCalItems() for _ in range(1000)])
+        finally:
+            server.Stop()
+
+    def Attachments(self):
+        server = FakeServerProcess(self.args, rooms=1, events=20, attachments=2)
+        try:
+            startDT, endDT = self.Window()
+            calendar = gs_google_calendar.GoogleCalendar(
+                getAccessTokenCallback=lambda: 'fake-token',
+                calendarName='Room 0',
+                **self.CalendarKwargs(server)
+            )
+            calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+            items = calendar.GetCalendarItemsInRange(startDT, endDT)
+
+            def ReadAll():
+                total = 0
+                for item in items:
+                    for attachment in calendar.GetAttachments(item):
+                        total += len(attachment.Read())
+                return total
+
+            self.Run('attachments: download + read', ReadAll)
+            self.Run('attachments: cached read', ReadAll)
+        finally:
+            server.Stop()
+
+    def SlidingWindow(self):
+        server = FakeServerProcess(self.args, rooms=1, events=self.args.events)
+        try:
+            startDT, endDT = self.Window()
+            for dayTiles in (False, True):
+                calendar = gs_google_calendar.GoogleCalendar(
+                    getAccessTokenCallback=lambda: 'fake-token',
+                    calendarName='Room 0',
+                    dayTiles=dayTiles,
+                    **self.CalendarKwargs(server)
+                )
+                calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+
+                def Poll():
+                    for step in range(1, 97):
+                        shift = datetime.timedelta(minutes=15 * step)
+                        calendar.UpdateCalendar(startDT=startDT + shift, endDT=endDT + shift)
+
+                self.Run('sliding window: 96 polls{}'.format(', day tiles' if dayTiles else ''), Poll)
+        finally:
+            server.Stop()
+
+
+def _Percentile(values, fraction):
+    if not values:
+        return None
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def _Format(value, scale):
+    return '-' if value is None else '{:.1f}'.format(value * scale)
+
+
+def _PeakRSS():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KB elsewhere
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', default='1,100,1000', help='comma separated room counts')
+    parser.add_argument('--events', type=int, default=50, help='events per room')
+    parser.add_argument('--big-window', type=int, default=10000, help='events in the big window scenario, 0 to skip')
+    parser.add_argument('--no-attachments', action='store_true', help='skip the attachments scenario')
+    parser.add_argument('--workers', type=int, default=20, help='GoogleCalendarScheduler maxWorkers')
+    parser.add_argument('--rate-limit', type=float, default=0, help='requests/s per account, 0 for no limit')
+    parser.add_argument('--latency', type=float, default=0, help='seconds the server adds to every request')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many more seconds, random')
+    parser.add_argument('--error-rate', type=float, default=0, help='0-1, share of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--no-allocations', dest='allocations', action='store_false',
+                        help='do not trace the allocations (faster, more accurate timings)')
+    args = parser.parse_args()
+
+    bench = Bench(args)
+    for rooms in [int(rooms) for rooms in args.rooms.split(',') if rooms]:
+        bench.Rooms(rooms)
+    if args.big_window:
+        bench.BigWindow()
+    if not args.no_attachments:
+        bench.Attachments()
+    bench.SlidingWindow()
@@ -0,0 +1,611 @@
+'''
+Local stand-in for the parts of the Google Calendar/Drive APIs that gs_google_calendar uses,
+    so the module can be benchmarked without credentials or network.
+
+Supported:
+    GET  /calendar/v3/users/me/calendarList          paging (maxResults/pageToken)
+    GET  /calendar/v3/calendars/{id}/events          timeMin/timeMax, paging, syncToken (410 when unknown),
+                                                     ETag/If-None-Match (304)
+    GET  /calendar/v3/calendars/{id}/events/{id}/instances
+                                                     timeMin/timeMax, paging, RRULE FREQ=DAILY (COUNT/INTERVAL),
+                                                     RDATE, EXDATE and the modified instances
+    POST /calendar/v3/calendars/{id}/events          create
+    PATCH /calendar/v3/calendars/{id}/events/{id}    change start/end
+    POST /calendar/v3/calendars/{id}/events/watch
+    POST /calendar/v3/channels/stop
+    POST /calendar/v3/freeBusy                       up to 50 calendars
+    POST /batch/calendar/v3                          multipart/mixed batch of any of the above
+    GET  /drive/v3/files/{id}                        metadata, or the content with alt=media
+
+The items(...) part of the fields parameter is applied to the events, the rest of it is ignored.
+Any bearer token is accepted. Latency and errors (5xx/429/403 rateLimitExceeded) can be injected.
+
+Use it from a script:
+    api = FakeGoogleAPI(rooms=100, eventsPerRoom=50)
+    server = FakeGoogleServer(api)
+    server.Start()
+    GoogleCalendar(apiRoot=server.url, getAccessTokenCallback=lambda: 'fake', calendarName='Room 1')
+
+Or stand alone:
+    python benchmarks/fake_google.py --port 8765 --rooms 100 --events 50 --latency 0.02
+'''
+import argparse
+import datetime
+import gzip
+import hashlib
+import http.server
+import json
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+import uuid
+from calendar import timegm
+
+
+def _ToRFC3339(ts):
+    return datetime.datetime.utcfromtimestamp(ts).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _FromRFC3339(string):
+    # "2020-07-31T19:30:00Z", "2020-07-31T19:30:00.123456-0000", "2020-07-31T15:30:00-04:00" > epoch seconds
+    ts = timegm(time.strptime(string[:19], '%Y-%m-%dT%H:%M:%S'))
+    rest = string[19:]
+    if rest.startswith('.'):
+        rest = rest.lstrip('.0123456789')
+    if rest and rest[0] in '+-':
+        sign = 1 if rest[0] == '+' else -1
+        digits = rest[1:].replace(':', '')
+        ts -= sign * (int(digits[:2]) * 3600 + int(digits[2:4] or 0) * 60)
+    return ts
+
+
+def _FromUTCString(string):
+    # "20200731T193000Z" > epoch seconds
+    return timegm(time.strptime(string, '%Y%m%dT%H%M%SZ'))
+
+
+def _ProjectItems(items, fields):
+    '''
+    Keeps the keys of each item that the "items(...)" part of a partial response projection asks for
+
+    :param items: list of dicts
+    :param fields: str, like 'nextPageToken,items(id,creator/email,start)', or None
+    :return: list of dicts
+    '''
+    start = (fields or '').find('items(')
+    if start == -1:
+        return items
+
+    keys = set()
+    depth = 0
+    key = ''
+    for char in fields[start + len('items('):]:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            if depth == 0:
+                break
+            depth -= 1
+        elif char == ',' and depth == 0:
+            keys.add(key.split('/')[0])
+            key = ''
+        elif depth == 0:
+            key += char
+    keys.add(key.split('/')[0])
+    return [{key: val for key, val in item.items() if key in keys} for item in items]
+
+
+class FakeGoogleAPI:
+    '''
+    The data and the request handling, independent of the HTTP server
+    '''
+
+    def __init__(
+            self,
+            rooms=1,
+            eventsPerRoom=50,
+            windowStart=None,
+            windowDays=8,
+            attachmentsPerEvent=0,
+            attachmentSize=64 * 1024,
+            latency=0,
+            latencyJitter=0,
+            errorRate=0,
+            errorStatus=503,
+            calendarPageSize=100,
+    ):
+        '''
+
+        :param rooms: int, number of calendars, named "Room 0", "Room 1"...
+        :param eventsPerRoom: int, events spread evenly over the window of each room
+        :param windowStart: float, epoch of the first event, default is 1 day ago
+        :param windowDays: float
+        :param attachmentsPerEvent: int, Drive attachments on each event
+        :param attachmentSize: int, bytes per attachment
+        :param latency: float, seconds added to every HTTP request
+        :param latencyJitter: float, up to this many more seconds, random
+        :param errorRate: float, 0-1, share of HTTP requests that fail with errorStatus
+        :param errorStatus: int, 503, 429 or 403 (sent as rateLimitExceeded)
+        :param calendarPageSize: int, calendars per page of the calendar list
+        '''
+        self.latency = latency
+        self.latencyJitter = latencyJitter
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.calendarPageSize = calendarPageSize
+
+        self._lock = threading.Lock()
+        self._version = 0
+        self.calendars = []  # list of {'id': str, 'summary': str}
+        self.events = {}  # calendarID > {eventID: event dict, with the "_v" version}
+        self.files = {}  # fileId > bytes
+        self.requestCount = 0
+
+        windowStart = windowStart or time.time() - 24 * 3600
+        spacing = windowDays * 24 * 3600 / max(eventsPerRoom, 1)
+        for room in range(rooms):
+            calendarID = 'room{}@resource.calendar.google.com'.format(room)
+            self.calendars.append({'id': calendarID, 'summary': 'Room {}'.format(room)})
+            self.events[calendarID] = {}
+            for i in range(eventsPerRoom):
+                start = windowStart + i * spacing
+                attachments = []
+                for a in range(attachmentsPerEvent):
+                    fileId = 'file-{}-{}-{}'.format(room, i, a)
+                    self.files[fileId] = (fileId.encode() * (attachmentSize // len(fileId) + 1))[:attachmentSize]
+                    attachments.append({
+                        'fileId': fileId,
+                        'fileUrl': 'https://drive.google.com/open?id={}'.format(fileId),
+                        'title': '{}.pdf'.format(fileId),
+                        'mimeType': 'application/pdf',
+                    })
+                self._PutEvent(calendarID, {
+                    'id': 'evt{}x{}'.format(room, i),
+                    'status': 'confirmed',
+                    'summary': 'Meeting {} in Room {}'.format(i, room),
+                    'description': 'Agenda ' * 20,
+                    'creator': {'email': 'organizer{}@example.com'.format(i % 50)},
+                    'organizer': {'email': 'organizer{}@example.com'.format(i % 50)},
+                    'attendees': [{'email': 'person{}@example.com'.format(n)} for n in range(5)],
+                    'start': {'dateTime': _ToRFC3339(start)},
+                    'end': {'dateTime': _ToRFC3339(start + min(spacing, 3600))},
+                    'attachments': attachments,
+                })
+
+    def _PutEvent(self, calendarID, event):
+        # must hold self._lock, or be in __init__
+        self._version += 1
+        event['_v'] = self._version
+        event['etag'] = '"{}"'.format(self._version)
+        event['updated'] = _ToRFC3339(time.time())
+        self.events[calendarID][event['id']] = event
+
+    def Touch(self, calendarID, count=1):
+        '''
+        Changes the summary of "count" events, to benchmark incremental polls
+
+        :param calendarID: str
+        :param count: int
+        '''
+        with self._lock:
+            for event in list(self.events[calendarID].values())[:count]:
+                event['summary'] += '*'
+                self._PutEvent(calendarID, event)
+
+    def Handle(self, method, url, headers, body, inject=True):
+        '''
+
+        :param method: str
+        :param url: str, path and query
+        :param headers: dict like, request headers
+        :param body: bytes
+        :param inject: bool, False for the parts of a batch (the latency/errors apply to the whole HTTP request)
+        :return: tuple of (status int, headers dict, body bytes)
+        '''
+        self.requestCount += 1
+        if inject:
+            if self.latency or self.latencyJitter:
+                time.sleep(self.latency + random.uniform(0, self.latencyJitter))
+            if self.errorRate and random.random() < self.errorRate:
+                return self._Error(self.errorStatus)
+
+        parts = urllib.parse.urlsplit(url)
+        path = urllib.parse.unquote(parts.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        method = method.upper()
+
+        if path.startswith('/batch/') and method == 'POST':
+            return self._Batch(headers, body)
+
+        jsonBody = None
+        if body:
+            try:
+                jsonBody = json.loads(body.decode())
+            except ValueError:
+                return self._Error(400)
+
+        if path == '/calendar/v3/users/me/calendarList' and method == 'GET':
+            return self._CalendarList(query)
+
+        if path == '/calendar/v3/channels/stop' and method == 'POST':
+            return 204, {}, b''
+
+        if path == '/calendar/v3/freeBusy' and method == 'POST':
+            return self._FreeBusy(jsonBody or {})
+
+        if path.startswith('/calendar/v3/calendars/'):
+            rest = path[len('/calendar/v3/calendars/'):].split('/')
+            calendarID = rest[0]
+            if calendarID not in self.events:
+                return self._Error(404)
+
+            if rest[1:] == ['events'] and method == 'GET':
+                return self._ListEvents(calendarID, query, headers)
+            if rest[1:] == ['events'] and method == 'POST':
+                return self._InsertEvent(calendarID, jsonBody or {})
+            if rest[1:] == ['events', 'watch'] and method == 'POST':
+                return self._JSON(200, {
+                    'kind': 'api#channel',
+                    'id': (jsonBody or {}).get('id', str(uuid.uuid4())),
+                    'resourceId': 'resource-{}'.format(calendarID),
+                    'expiration': str(int((time.time() + 7 * 24 * 3600) * 1000)),
+                })
+            if len(rest) == 4 and rest[1] == 'events' and rest[3] == 'instances' and method == 'GET':
+                return self._Instances(calendarID, rest[2], query)
+            if len(rest) == 3 and rest[1] == 'events' and method == 'PATCH':
+                return self._PatchEvent(calendarID, rest[2], jsonBody or {})
+            if len(rest) == 3 and rest[1] == 'events' and method == 'GET':
+                event = self.events[calendarID].get(rest[2], None)
+                return self._JSON(200, self._Public(event)) if event else self._Error(404)
+
+        if path.startswith('/drive/v3/files/') and method == 'GET':
+            return self._DriveFile(path[len('/drive/v3/files/'):], query)
+
+        return self._Error(404)
+
+    def _CalendarList(self, query):
+        start = int(query.get('pageToken', 0))
+        size = min(int(query.get('maxResults', self.calendarPageSize)), self.calendarPageSize)
+        page = {'kind': 'calendar#calendarList', 'items': self.calendars[start:start + size]}
+        if start + size < len(self.calendars):
+            page['nextPageToken'] = str(start + size)
+        return self._JSON(200, page)
+
+    def _ListEvents(self, calendarID, query, headers):
+        with self._lock:
+            events = list(self.events[calendarID].values())
+            version = self._version
+
+        if 'syncToken' in query:
+            try:
+                since = int(query['syncToken'])
+            except ValueError:
+                return self._Error(410)
+            if since > version:
+                return self._Error(410)
+            events = [event for event in events if event['_v'] > since]
+        else:
+            events = [event for event in events if event['status'] != 'cancelled']
+            if 'timeMin' in query:
+                timeMin = _FromRFC3339(query['timeMin'])
+                events = [event for event in events if _FromRFC3339(event['end']['dateTime']) > timeMin]
+            if 'timeMax' in query:
+                timeMax = _FromRFC3339(query['timeMax'])
+                events = [event for event in events if _FromRFC3339(event['start']['dateTime']) < timeMax]
+
+        events.sort(key=lambda event: (event.get('start', {}).get('dateTime', ''), event['id']))
+        start = int(query.get('pageToken', 0))
+        size = min(int(query.get('maxResults', 250)), 2500)
+        page = {
+            'kind': 'calendar#events',
+            'items': _ProjectItems([self._Public(event) for event in events[start:start + size]], query.get('fields')),
+        }
+        if start + size < len(events):
+            page['nextPageToken'] = str(start + size)
+
+        # the ETag changes when the events of the page change, the sync token is left out
+        #   because it is shared by all the calendars here
+        etag = '"{}"'.format(hashlib.md5(json.dumps(page, sort_keys=True).encode()).hexdigest())
+        if headers.get('If-None-Match', None) == etag:
+            return 304, {'ETag': etag}, b''
+
+        if 'nextPageToken' not in page:
+            page['nextSyncToken'] = str(version)
+        status, respHeaders, body = self._JSON(200, page)
+        respHeaders['ETag'] = etag
+        return status, respHeaders, body
+
+    def _Instances(self, calendarID, eventID, query):
+        with self._lock:
+            master = self.events[calendarID].get(eventID, None)
+            modified = {
+                _FromRFC3339(event['originalStartTime']['dateTime']): event
+                for event in self.events[calendarID].values()
+                if event.get('recurringEventId', None) == eventID and 'originalStartTime' in event
+            }
+        if master is None or 'recurrence' not in master:
+            return self._Error(404)
+
+        firstTS = _FromRFC3339(master['start']['dateTime'])
+        duration = _FromRFC3339(master['end']['dateTime']) - firstTS
+        starts = set()
+        excluded = set()
+        for line in master['recurrence']:
+            name, _, value = line.partition(':')
+            name = name.split(';')[0]
+            if name == 'RRULE':
+                rule = dict(part.split('=', 1) for part in value.split(';'))
+                if rule.get('FREQ', None) != 'DAILY':
+                    return self._Error(400)
+                interval = int(rule.get('INTERVAL', 1))
+                starts.update(firstTS + i * interval * 24 * 3600 for i in range(int(rule.get('COUNT', 366))))
+            elif name == 'RDATE':
+                starts.update(_FromUTCString(date) for date in value.split(','))
+            elif name == 'EXDATE':
+                excluded.update(_FromUTCString(date) for date in value.split(','))
+
+        timeMin = _FromRFC3339(query['timeMin']) if 'timeMin' in query else float('-inf')
+        timeMax = _FromRFC3339(query['timeMax']) if 'timeMax' in query else float('inf')
+        instances = []
+        for ts in sorted(starts - excluded):
+            instance = modified.get(ts, None)
+            if instance is None:
+                instance = {key: val for key, val in master.items() if key not in ('recurrence', '_v')}
+                instance.update({
+                    'id': '{}_{}'.format(eventID, datetime.datetime.utcfromtimestamp(ts).strftime('%Y%m%dT%H%M%SZ')),
+                    'recurringEventId': eventID,
+                    'originalStartTime': {'dateTime': _ToRFC3339(ts)},
+                    'start': {'dateTime': _ToRFC3339(ts)},
+                    'end': {'dateTime': _ToRFC3339(ts + duration)},
+                })
+            if instance['status'] == 'cancelled':
+                continue
+            if _FromRFC3339(instance['end']['dateTime']) > timeMin and _FromRFC3339(instance['start']['dateTime']) < timeMax:
+                instances.append(self._Public(instance))
+
+        start = int(query.get('pageToken', 0))
+        size = min(int(query.get('maxResults', 250)), 2500)
+        page = {'kind': 'calendar#events', 'items': _ProjectItems(instances[start:start + size], query.get('fields'))}
+        if start + size < len(instances):
+            page['nextPageToken'] = str(start + size)
+        return self._JSON(200, page)
+
+    def _FreeBusy(self, data):
+        if 'timeMin' not in data or 'timeMax' not in data or len(data.get('items', [])) > 50:
+            return self._Error(400)
+        timeMin = _FromRFC3339(data['timeMin'])
+        timeMax = _FromRFC3339(data['timeMax'])
+
+        calendars = {}
+        with self._lock:
+            for item in data.get('items', []):
+                calendarID = item.get('id', None)
+                if calendarID not in self.events:
+                    calendars[calendarID] = {'errors': [{'domain': 'global', 'reason': 'notFound'}], 'busy': []}
+                    continue
+
+                busy = []
+                for event in self.events[calendarID].values():
+                    if event['status'] == 'cancelled':
+                        continue
+                    start = _FromRFC3339(event['start']['dateTime'])
+                    end = _FromRFC3339(event['end']['dateTime'])
+                    if start < timeMax and end > timeMin:
+                        busy.append((max(start, timeMin), min(end, timeMax)))
+                calendars[calendarID] = {
+                    'busy': [{'start': _ToRFC3339(start), 'end': _ToRFC3339(end)} for start, end in sorted(busy)],
+                }
+
+        return self._JSON(200, {
+            'kind': 'calendar#freeBusy',
+            'timeMin': data['timeMin'],
+            'timeMax': data['timeMax'],
+            'calendars': calendars,
+        })
+
+    def _InsertEvent(self, calendarID, data):
+        if 'start' not in data or 'end' not in data:
+            return self._Error(400)
+        event = {
+            'id': uuid.uuid4().hex,
+            'status': 'confirmed',
+            'summary': data.get('summary', ''),
+            'description': data.get('description', ''),
+            'creator': {'email': 'service@example.com'},
+            'start': data['start'],
+            'end': data['end'],
+        }
+        with self._lock:
+            self._PutEvent(calendarID, event)
+        return self._JSON(200, self._Public(event))
+
+    def _PatchEvent(self, calendarID, eventID, data):
+        with self._lock:
+            event = self.events[calendarID].get(eventID, None)
+            if event is None:
+                return self._Error(404)
+            for key in ('start', 'end', 'summary', 'description'):
+                if key in data:
+                    event[key] = data[key]
+            self._PutEvent(calendarID, event)
+        return self._JSON(200, self._Public(event))
+
+    def _DriveFile(self, fileId, query):
+        content = self.files.get(fileId, None)
+        if content is None:
+            return self._Error(404)
+        if query.get('alt', None) == 'media':
+            return 200, {'Content-Type': 'application/pdf'}, content
+        return self._JSON(200, {
+            'name': '{}.pdf'.format(fileId),
+            'size': str(len(content)),
+            'md5Checksum': hashlib.md5(content).hexdigest(),
+            'version': '1',
+            'mimeType': 'application/pdf',
+        })
+
+    def _Batch(self, headers, body):
+        contentType = headers.get('Content-Type', '')
+        boundary = contentType.split('boundary=')[-1].strip().strip('"')
+        out = []
+        responseBoundary = 'batch_{}'.format(uuid.uuid4().hex)
+        for part in body.decode().split('--' + boundary):
+            part = part.strip()
+            if not part or part == '--':
+                continue
+
+            partHeaders, _, inner = part.partition('\r\n\r\n')
+            contentID = ''
+            for line in partHeaders.split('\r\n'):
+                key, _, val = line.partition(':')
+                if key.strip().lower() == 'content-id':
+                    contentID = val.strip().strip('<>')
+
+            requestLine, _, rest = inner.partition('\r\n')
+            method, url = requestLine.split(' ')[:2]
+            innerHead, _, innerBody = rest.partition('\r\n\r\n')
+            innerHeaders = {}
+            for line in innerHead.split('\r\n'):
+                key, _, val = line.partition(':')
+                if val:
+                    innerHeaders[key.strip()] = val.strip()
+            status, respHeaders, respBody = self.Handle(method, url, innerHeaders, innerBody.strip().encode(), inject=False)
+
+            respHeaders.setdefault('Content-Type', 'application/json')
+            out.append('--{}\r\nContent-Type: application/http\r\nContent-ID: <response-{}>\r\n\r\n'
+                       'HTTP/1.1 {} {}\r\n{}\r\n{}\r\n'.format(
+                responseBoundary,
+                contentID,
+                status,
+                http.server.BaseHTTPRequestHandler.responses.get(status, ('',))[0],
+                ''.join('{}: {}\r\n'.format(key, val) for key, val in respHeaders.items()),
+                respBody.decode(),
+            ))
+        out.append('--{}--\r\n'.format(responseBoundary))
+        return 200, {'Content-Type': 'multipart/mixed; boundary={}'.format(responseBoundary)}, ''.join(out).encode()
+
+    @staticmethod
+    def _Public(event):
+        return {key: val for key, val in event.items() if key != '_v'}
+
+    @staticmethod
+    def _JSON(status, obj):
+        return status, {'Content-Type': 'application/json; charset=UTF-8'}, json.dumps(obj).encode()
+
+    def _Error(self, status):
+        reason = {
+            403: 'rateLimitExceeded',
+            404: 'notFound',
+            410: 'fullSyncRequired',
+            429: 'rateLimitExceeded',
+        }.get(status, 'backendError')
+        status, headers, body = self._JSON(status, {'error': {
+            'code': status,
+            'message': reason,
+            'errors': [{'domain': 'global', 'reason': reason, 'message': reason}],
+        }})
+        if status in (429, 503):
+            headers['Retry-After'] = '0'
+        return status, headers, body
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def _Serve(self):
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, respBody = self.server.api.Handle(self.command, self.path, self.headers, body)
+
+        if len(respBody) > 256 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            respBody = gzip.compress(respBody, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(respBody)))
+        self.end_headers()
+        self.wfile.write(respBody)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _Serve
+
+    def log_message(self, *a):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FakeGoogleServer:
+    '''
+    Serves a FakeGoogleAPI over HTTP on a background thread
+    '''
+
+    def __init__(self, api, host='127.0.0.1', port=0):
+        '''
+
+        :param api: FakeGoogleAPI
+        :param host: str
+        :param port: int, 0 picks a free port
+        '''
+        self.api = api
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.api = api
+        self._thread = None
+
+    def __str__(self):
+        return '<FakeGoogleServer: {}>'.format(self.url)
+
+    @property
+    def url(self):
+        # use as GoogleCalendar(apiRoot=...)
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def Start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def Stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--events', type=int, default=50, help='events per room')
+    parser.add_argument('--attachments', type=int, default=0, help='attachments per event')
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many more seconds, random')
+    parser.add_argument('--error-rate', type=float, default=0, help='0-1')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server = FakeGoogleServer(
+        FakeGoogleAPI(
+            rooms=args.rooms,
+            eventsPerRoom=args.events,
+            attachmentsPerEvent=args.attachments,
+            latency=args.latency,
+            latencyJitter=args.jitter,
+            errorRate=args.error_rate,
+            errorStatus=args.error_status,
+        ),
+        host=args.host,
+        port=args.port,
+    ).Start()
+    print('Serving on', server.url)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.Stop()
@@ -1,12 +1,970 @@
 import json
 import datetime
 
-from extronlib.system import ProgramLog
 from gs_calendar_base import _BaseCalendar, _CalendarItem
-import gs_requests
-import gs_oauth_tools
 from gs_service_accounts import _ServiceAccountBase
 import time
+import threading
+import uuid
+import weakref
+import random
+import concurrent.futures
+import functools
+from calendar import timegm
+import os
+import mmap
+import collections
+import bisect
+import socket
+import gzip
+import urllib.parse
+
+try:
+    import zoneinfo  # python 3.9+, lets recurring events be expanded in their own time zone
+except ImportError:
+    zoneinfo = None
+
+API_ROOT = 'https://www.googleapis.com'  # change with GoogleCalendar(apiRoot=...), for example to test against a local server
+BATCH_URL = API_ROOT + '/batch/calendar/v3'
+MAX_BATCH_SIZE = 50  # google does not allow more requests than this in one batch
+DEFAULT_WINDOW_QUANTUM = 15 * 60  # seconds, the default poll window moves in steps of this, see _GetDefaultWindow
+
+# GoogleCalendar(dayTiles=True), seconds a day of events is used before it is requested again,
+#   by number of days from today, None for all the other days
+DEFAULT_TILE_TTLS = (
+    (0, 0),  # today, every poll (usually a 304)
+    (1, 300),  # yesterday and tomorrow
+    (None, 1800),
+)
+FREEBUSY_MAX_CALENDARS = 50  # google does not allow more calendars than this in one freeBusy query
+
+# Partial response projection for the events list, only the fields that are used by _ItemFromJSON
+EVENTS_FIELDS = 'nextPageToken,nextSyncToken,items(id,etag,updated,status,summary,creator/email,start,end,attachments)'
+
+# Partial response projection for each type of call, override any of them with GoogleCalendar(fields={...})
+DEFAULT_FIELDS = {
+    'events': EVENTS_FIELDS,  # events list
+    # events list with singleEvents=False, see GoogleCalendar(expandRecurring=True)
+    'recurringEvents': 'nextPageToken,nextSyncToken,items(id,etag,updated,status,summary,creator/email,start,end,attachments,'
+                       'recurrence,recurringEventId,originalStartTime)',
+    'event': 'id,etag,updated,status,summary,creator/email,start,end,attachments',  # insert/patch response
+    'calendarList': 'nextPageToken,items(id,summary)',
+    'watch': 'id,resourceId,expiration',
+    'freeBusy': 'calendars',  # freeBusy query, see ServiceAccount.UpdateAvailability
+    'driveFile': 'name,size,md5Checksum,version,mimeType,modifiedTime',
+}
+
+# files native to google docs/sheets/slides can not be downloaded as they are, they are exported to this type
+NATIVE_MIMETYPE_PREFIX = 'application/vnd.google-apps.'
+NATIVE_EXPORT_MIMETYPE = 'application/pdf'
+
+# google only gzips the responses when the User-Agent contains "gzip"
+USER_AGENT = 'gs_google_calendar (gzip)'
+
+REQUEST_TIMEOUT = 30  # seconds without an answer before a request fails (and is retried), sync and async transports
+
+
+class _RequestError(Exception):
+    def __init__(self, resp):
+        self.resp = resp
+        super().__init__('HTTP {} {}'.format(resp.status_code, resp.text[:200]))
+
+
+class _CircuitOpenError(Exception):
+    # too many failures in a row, requests are not sent for a while
+    pass
+
+
+class _NotModified(Exception):
+    # HTTP 304, the events list is the same as the last time it was read, there is nothing to apply
+    pass
+
+
+class _Lazy:
+    '''
+    Defers building a debug string until it is actually printed, like self.print('resp=', _Lazy(lambda: resp.text))
+    '''
+    __slots__ = ('_func', '_a', '_k')
+
+    def __init__(self, func, *a, **k):
+        self._func = func
+        self._a = a
+        self._k = k
+
+    def __str__(self):
+        return str(self._func(*self._a, **self._k))
+
+
+class _BatchResponse:
+    # one part of a multipart/mixed batch response, quacks like a gs_requests response
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def __str__(self):
+        return '<_BatchResponse: status_code={}>'.format(self.status_code)
+
+
+def _BuildBatchBody(requests):
+    '''
+    Builds the body of a Google batch request (https://developers.google.com/calendar/api/guides/batch)
+
+    :param requests: list of tuples like (contentID, method, path, jsonBody) where path is relative to the API host,
+        like "/calendar/v3/calendars/{id}/events?maxResults=250", and jsonBody is a dict or None.
+        A 5th item can be a dict of headers for that request, like {'If-None-Match': etag}
+    :return: tuple of (body str, Content-Type header str)
+    '''
+    boundary = 'batch_{}'.format(uuid.uuid4().hex)
+    lines = []
+    for request in requests:
+        contentID, method, path, jsonBody = request[:4]
+        lines.append('--' + boundary)
+        lines.append('Content-Type: application/http')
+        lines.append('Content-ID: <{}>'.format(contentID))
+        lines.append('')
+        lines.append('{} {} HTTP/1.1'.format(method.upper(), path))
+        if len(request) > 4:
+            for key, val in request[4].items():
+                lines.append('{}: {}'.format(key, val))
+        if jsonBody is not None:
+            lines.append('Content-Type: application/json')
+            lines.append('')
+            lines.append(json.dumps(jsonBody))
+        else:
+            lines.append('')
+        lines.append('')
+    lines.append('--' + boundary + '--')
+    lines.append('')
+    return '\r\n'.join(lines), 'multipart/mixed; boundary={}'.format(boundary)
+
+
+def _ParseBatchResponse(resp):
+    '''
+    Splits a multipart/mixed batch response into its parts
+
+    :param resp: the response of the batch request
+    :return: dict like {contentID: _BatchResponse}, where contentID is the one passed to _BuildBatchBody
+    '''
+    contentType = resp.headers.get('Content-Type', '')
+    boundary = contentType.split('boundary=')[-1].strip().strip('"')
+    ret = {}
+    for part in resp.text.split('--' + boundary):
+        part = part.strip()
+        if not part or part == '--':
+            continue
+
+        # outer headers / inner http response
+        partHeaders, _, inner = part.replace('\r\n', '\n').partition('\n\n')
+        contentID = None
+        for line in partHeaders.split('\n'):
+            key, _, val = line.partition(':')
+            if key.strip().lower() == 'content-id':
+                # google responds with "<response-contentID>"
+                contentID = val.strip().strip('<>')
+                if contentID.startswith('response-'):
+                    contentID = contentID[len('response-'):]
+
+        head, _, body = inner.partition('\n\n')
+        headLines = head.split('\n')
+        statusCode = int(headLines[0].split(' ')[1])
+        headers = _CaseInsensitiveDict()
+        for line in headLines[1:]:
+            key, _, val = line.partition(':')
+            headers[key.strip()] = val.strip()
+
+        ret[contentID] = _BatchResponse(statusCode, headers, body)
+
+    return ret
+
+
+class _TransferStats:
+    '''
+    Request/byte counters per type of call ('events', 'calendarList', 'batch'...)
+    wireBytes is the size of the body as received (compressed), decodedBytes the size after decompression.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # callType > {'requests': int, 'wireBytes': int, 'decodedBytes': int}
+
+    def __str__(self):
+        return '<_TransferStats: {}>'.format(self.Get())
+
+    def Add(self, callType, wireBytes, decodedBytes):
+        with self._lock:
+            stats = self._stats.setdefault(callType, {'requests': 0, 'wireBytes': 0, 'decodedBytes': 0})
+            stats['requests'] += 1
+            stats['wireBytes'] += wireBytes
+            stats['decodedBytes'] += decodedBytes
+
+    def Get(self):
+        '''
+        :return: dict like {'wireBytes': int, 'decodedBytes': int, 'callTypes': {callType: {'requests': int, 'wireBytes': int, 'decodedBytes': int}}}
+        '''
+        with self._lock:
+            callTypes = {callType: dict(stats) for callType, stats in self._stats.items()}
+        return {
+            'wireBytes': sum(stats['wireBytes'] for stats in callTypes.values()),
+            'decodedBytes': sum(stats['decodedBytes'] for stats in callTypes.values()),
+            'callTypes': callTypes,
+        }
+
+
+def _GetRequestSize(data=None, json=None, **k):
+    # bytes of the request body
+    if data is not None:
+        return len(data.encode() if isinstance(data, str) else data)
+    if json is not None:
+        return len(_ToJSONBytes(json))
+    return 0
+
+
+def _GetResponseSizes(resp, stream=False):
+    # (bytes received, bytes after decompression) of a gs_requests response
+    if stream:
+        # reading the content here would load the whole download in memory
+        decoded = None
+    else:
+        decoded = len(resp.content or b'')
+
+    try:
+        wire = int(resp.headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        try:
+            # urllib3 counts the raw (compressed) bytes it read
+            wire = resp.raw.tell()
+        except Exception:
+            wire = decoded or 0
+
+    return wire, wire if decoded is None else decoded
+
+
+class _HTTPTransport:
+    '''
+    One keep-alive HTTP session per account, shared by all the GoogleCalendar objects of that account.
+    Every request (calendar list, events, batch, POST/PATCH, Drive downloads) goes through it,
+        so the TLS connections are reused from poll to poll.
+    '''
+    _transports = {}  # accountKey > _HTTPTransport
+    _transportsLock = threading.Lock()
+
+    @classmethod
+    def Get(cls, accountKey, poolSize=10, keepAlive=True, gzip=True):
+        with cls._transportsLock:
+            transport = cls._transports.get(accountKey, None)
+            if transport is None:
+                transport = cls._transports[accountKey] = cls(poolSize=poolSize, keepAlive=keepAlive, gzip=gzip)
+            return transport
+
+    def __init__(self, poolSize=10, keepAlive=True, gzip=True):
+        '''
+
+        :param poolSize: int, max number of connections kept open per host
+        :param keepAlive: bool, False to close the connection after every request
+        :param gzip: bool, ask for gzip compressed responses
+        '''
+        import gs_requests  # imported here so importing this module stays fast
+
+        self.session = gs_requests.session()
+        self.session.headers['Connection'] = 'keep-alive' if keepAlive else 'close'
+        if gzip:
+            self.session.headers['Accept-Encoding'] = 'gzip'
+            self.session.headers['User-Agent'] = USER_AGENT
+
+        self._adapter = None
+        self._MountPool(poolSize)
+
+        self._lock = threading.Lock()
+        self._requestCount = 0
+        self._transferStats = _TransferStats()
+
+    def __str__(self):
+        return '<_HTTPTransport: {}>'.format(self.GetStats())
+
+    def _MountPool(self, poolSize):
+        # sessions that are backed by "requests" accept an adapter with a bigger connection pool
+        if not hasattr(self.session, 'mount'):
+            return
+        try:
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            return
+
+        self._adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+    def Request(self, method, url, callType='other', timings=None, **k):
+        '''
+
+        :param method: str
+        :param url: str
+        :param callType: str, the counter the response bytes are added to, see GetStats
+        :param timings: dict, if given the 'ttfb', 'bytesIn' and 'bytesOut' keys are set
+            ('dns' and 'connect' are not exposed by requests)
+        :param k: passed to session.request
+        :return: the response
+        '''
+        with self._lock:
+            self._requestCount += 1
+        k.setdefault('timeout', REQUEST_TIMEOUT)
+        resp = self.session.request(method=method, url=url, **k)
+        sizes = _GetResponseSizes(resp, stream=k.get('stream', False))
+        self._transferStats.Add(callType, *sizes)
+
+        if timings is not None:
+            elapsed = getattr(resp, 'elapsed', None)  # requests: from sending the request to parsing the headers
+            timings['ttfb'] = elapsed.total_seconds() if elapsed is not None else None
+            timings['bytesIn'] = sizes[0]
+            timings['bytesOut'] = _GetRequestSize(**k)
+        return resp
+
+    def GetStats(self):
+        '''
+        :return: dict like {'requests': int, 'connectionsOpened': int or None, 'wireBytes': int, 'decodedBytes': int, 'callTypes': dict}
+            If connectionsOpened stays flat while requests grows, the connections are being reused.
+            connectionsOpened is None when the session does not expose its connection pool.
+            callTypes has the request and byte counts per type of call, see _TransferStats.
+        '''
+        stats = {
+            'requests': self._requestCount,
+            'connectionsOpened': self._CountConnections(),
+        }
+        stats.update(self._transferStats.Get())
+        return stats
+
+    def _CountConnections(self):
+        try:
+            pools = self._adapter.poolmanager.pools
+            return sum(pools[key].num_connections for key in pools.keys())
+        except Exception:
+            return None
+
+
+class _AccessTokenCache:
+    '''
+    Holds the bearer token of one account so getAccessTokenCallback is not called for every request.
+    The token is kept for "lifetime" seconds. During the last "refreshMargin" seconds it is still handed out
+        while a background thread asks the callback for a new one, so requests do not wait for the refresh.
+    Only one refresh runs at a time, no matter how many rooms/threads need the token.
+    If the callback returns a tuple like (token, secondsUntilExpiry), that expiry is used instead of "lifetime".
+    '''
+    _caches = {}  # accountKey > _AccessTokenCache
+    _cachesLock = threading.Lock()
+
+    @classmethod
+    def Get(cls, accountKey, getAccessTokenCallback, lifetime=600, refreshMargin=60):
+        with cls._cachesLock:
+            cache = cls._caches.get(accountKey, None)
+            if cache is None:
+                cache = cls._caches[accountKey] = cls(getAccessTokenCallback, lifetime, refreshMargin)
+            return cache
+
+    def __init__(self, getAccessTokenCallback, lifetime=600, refreshMargin=60):
+        self._getAccessTokenCallback = getAccessTokenCallback
+        self._lifetime = lifetime
+        self._refreshMargin = refreshMargin
+
+        self._token = None
+        self._expiresAt = 0  # time.monotonic()
+        self._refreshLock = threading.Lock()
+        self._refreshing = False
+
+    def GetToken(self, wait=True):
+        '''
+        :param wait: bool, False to return None instead of waiting when there is no usable token
+        :return: str
+        '''
+        token = self._token
+        now = time.monotonic()
+        if token is None or now >= self._expiresAt:
+            # nothing usable, have to wait
+            return self._Refresh() if wait else None
+
+        if now >= self._expiresAt - self._refreshMargin and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._BackgroundRefresh, daemon=True).start()
+
+        return token
+
+    def Invalidate(self, token):
+        # the token was rejected (HTTP 401), the next GetToken() will call the callback again
+        with self._refreshLock:
+            if self._token == token:
+                self._token = None
+
+    def _Refresh(self):
+        with self._refreshLock:
+            # another thread may have refreshed it while this one was waiting for the lock
+            if self._token is not None and time.monotonic() < self._expiresAt:
+                return self._token
+            return self._CallCallback()
+
+    def _BackgroundRefresh(self):
+        try:
+            with self._refreshLock:
+                self._CallCallback()
+        except Exception as e:
+            ProgramLog('_AccessTokenCache refresh error: {}'.format(e))
+        finally:
+            self._refreshing = False
+
+    def _CallCallback(self):
+        result = self._getAccessTokenCallback()
+        if isinstance(result, tuple):
+            token, expiresIn = result
+        else:
+            token, expiresIn = result, self._lifetime
+
+        if token:
+            self._token = token
+            self._expiresAt = time.monotonic() + expiresIn
+        return token
+
+
+class _TokenBucket:
+    '''
+    Token bucket rate limiter shared by everything that uses the same key (an account, a google project...).
+    Reserve() takes tokens and returns how long the caller must wait before sending,
+        so it works for threads (time.sleep) and coroutines (asyncio.sleep).
+    '''
+    _buckets = {}  # key > _TokenBucket
+    _bucketsLock = threading.Lock()
+
+    @classmethod
+    def Get(cls, key, rate, burst=None):
+        with cls._bucketsLock:
+            bucket = cls._buckets.get(key, None)
+            if bucket is None:
+                bucket = cls._buckets[key] = cls(rate, burst)
+            return bucket
+
+    def __init__(self, rate, burst=None):
+        '''
+
+        :param rate: float, tokens added per second
+        :param burst: float, max tokens in the bucket
+        '''
+        self._rate = rate
+        self._burst = burst or rate
+        self._tokens = self._burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return '<_TokenBucket: rate={}, burst={}>'.format(self._rate, self._burst)
+
+    def Reserve(self, tokens=1):
+        '''
+        :param tokens: float
+        :return: float, seconds to wait before using the tokens
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self._rate
+
+
+class _CircuitBreaker:
+    '''
+    After failureThreshold failures in a row the circuit "opens" and requests are refused for resetTimeout seconds.
+    Then one request is let through, if it succeeds the circuit closes, otherwise it stays open for another resetTimeout.
+    '''
+    _breakers = {}  # key > _CircuitBreaker
+    _breakersLock = threading.Lock()
+
+    @classmethod
+    def Get(cls, key, failureThreshold=5, resetTimeout=60):
+        with cls._breakersLock:
+            breaker = cls._breakers.get(key, None)
+            if breaker is None:
+                breaker = cls._breakers[key] = cls(failureThreshold, resetTimeout)
+            return breaker
+
+    def __init__(self, failureThreshold=5, resetTimeout=60):
+        self._failureThreshold = failureThreshold
+        self._resetTimeout = resetTimeout
+        self._failures = 0
+        self._openedAt = None  # time.monotonic()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return '<_CircuitBreaker: state={}, failures={}>'.format(self.State, self._failures)
+
+    @property
+    def State(self):
+        if self._openedAt is None:
+            return 'Closed'
+        if time.monotonic() - self._openedAt >= self._resetTimeout:
+            return 'Half-Open'
+        return 'Open'
+
+    def Allow(self):
+        with self._lock:
+            if self._openedAt is None:
+                return True
+            if time.monotonic() - self._openedAt >= self._resetTimeout:
+                # let one request through to test the water
+                self._openedAt = time.monotonic()
+                return True
+            return False
+
+    def RecordSuccess(self):
+        with self._lock:
+            self._failures = 0
+            self._openedAt = None
+
+    def RecordFailure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self._failureThreshold:
+                self._openedAt = time.monotonic()
+
+
+def _IsRetryable(resp):
+    # rate limited or a server error
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return True
+    if resp.status_code == 403:
+        try:
+            reasons = [e.get('reason', None) for e in resp.json()['error']['errors']]
+        except Exception:
+            return False
+        return 'rateLimitExceeded' in reasons or 'userRateLimitExceeded' in reasons
+    return False
+
+
+def _GetRetryAfter(resp):
+    # seconds from the Retry-After header, or 0
+    try:
+        return float(resp.headers.get('Retry-After', 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class _CalendarDirectory:
+    '''
+    Process-wide cache of the "users/me/calendarList" of one account, mapping calendar summary > calendar ID.
+    All the GoogleCalendar objects of an account share one _CalendarDirectory,
+        so the list is crawled once instead of once per room.
+    '''
+    _directories = {}  # accountKey > _CalendarDirectory
+    _directoriesLock = threading.Lock()
+
+    @classmethod
+    def Get(cls, accountKey, ttl=3600, snapshotPath=None, fields=None, apiRoot=API_ROOT, debug=False):
+        with cls._directoriesLock:
+            directory = cls._directories.get(accountKey, None)
+            if directory is None:
+                directory = cls._directories[accountKey] = cls(
+                    ttl=ttl,
+                    snapshotPath=snapshotPath,
+                    fields=fields,
+                    apiRoot=apiRoot,
+                    debug=debug,
+                )
+            return directory
+
+    @classmethod
+    def InvalidateAll(cls):
+        with cls._directoriesLock:
+            for directory in cls._directories.values():
+                directory.Invalidate()
+
+    def __init__(self, ttl=3600, snapshotPath=None, missRefresh=300, fields=None, apiRoot=API_ROOT, debug=False):
+        '''
+
+        :param ttl: int, seconds before the calendar list is crawled again
+        :param snapshotPath: str, optional path of a json file used to keep the list across restarts
+        :param missRefresh: int, when asked for an unknown calendar, crawl again if the list is older than this
+        :param fields: str, partial response projection of the calendar list, must include nextPageToken and items(id,summary)
+        :param apiRoot: str, like "https://www.googleapis.com"
+        :param debug: bool
+        '''
+        self._debug = debug
+        self._ttl = ttl
+        self._apiRoot = apiRoot
+        self._fields = fields or DEFAULT_FIELDS['calendarList']
+        self._snapshotPath = snapshotPath
+        self._missRefresh = missRefresh
+        self._calendarIDs = {}  # summary > id
+        self._loadedAt = None  # time.time() of the last crawl
+        self._lock = threading.Lock()
+
+        if self._snapshotPath:
+            self._LoadSnapshot()
+
+    def print(self, *a, **k):
+        if self._debug:
+            print(*a, **k)
+
+    def __str__(self):
+        return '<_CalendarDirectory: {} calendars, loadedAt={}>'.format(len(self._calendarIDs), self._loadedAt)
+
+    def GetID(self, calendarName, sendRequest):
+        '''
+
+        :param calendarName: str, the summary of the calendar
+        :param sendRequest: callable like GoogleCalendar._SendRequest, used if the list needs to be crawled
+        :return: str or None
+        '''
+        with self._lock:
+            if self._IsStale():
+                self._Crawl(sendRequest)
+
+            elif calendarName not in self._calendarIDs and time.time() - self._loadedAt > self._missRefresh:
+                # maybe the calendar was shared with this account since the last crawl
+                self._Crawl(sendRequest)
+
+            return self._calendarIDs.get(calendarName, None)
+
+    def GetNames(self, sendRequest):
+        with self._lock:
+            if self._IsStale():
+                self._Crawl(sendRequest)
+            return set(self._calendarIDs.keys())
+
+    def Invalidate(self):
+        with self._lock:
+            self._loadedAt = None
+
+    def _IsStale(self):
+        return self._loadedAt is None or time.time() - self._loadedAt > self._ttl
+
+    def _Crawl(self, sendRequest):
+        # read every page of the calendar list
+        calendarIDs = {}
+        params = {
+            'maxResults': 250,
+            'fields': self._fields,
+        }
+        while True:
+            resp = sendRequest(
+                method='get',
+                url=self._apiRoot + '/calendar/v3/users/me/calendarList',
+                params=params,
+                callType='calendarList',
+            )
+            if not resp.ok:
+                # keep whatever we had before
+                ProgramLog('Error reading Google calendar list: {} {}'.format(resp.status_code, resp.text[:200]))
+                return
+
+            page = resp.json()
+            for calendar in page.get('items', []):
+                calendarIDs[calendar.get('summary', None)] = calendar.get('id')
+
+            pageToken = page.get('nextPageToken', None)
+            if pageToken is None:
+                break
+            params['pageToken'] = pageToken
+
+        self._calendarIDs = calendarIDs
+        self._loadedAt = time.time()
+
+        if self._snapshotPath:
+            self._SaveSnapshot()
+
+    def _LoadSnapshot(self):
+        try:
+            with open(self._snapshotPath, mode='rt') as file:
+                d = json.loads(file.read())
+            self._calendarIDs = d['calendarIDs']
+            self._loadedAt = d['loadedAt']
+        except FileNotFoundError:
+            # no snapshot yet, it will be crawled on first use
+            pass
+        except Exception as e:
+            # unreadable snapshot, same as no snapshot
+            self.print('_CalendarDirectory._LoadSnapshot Error:', e)
+
+    def _SaveSnapshot(self):
+        try:
+            with open(self._snapshotPath, mode='wt') as file:
+                file.write(json.dumps({
+                    'calendarIDs': self._calendarIDs,
+                    'loadedAt': self._loadedAt,
+                }))
+        except Exception as e:
+            ProgramLog('_CalendarDirectory._SaveSnapshot Error: {}'.format(e))
+
+
+class _EventStore:
+    '''
+    Append-only log of the raw "calendar#event" dicts of one calendar, so a room has its events at boot and during an outage.
+    One json record per line:
+        ["put", {event}]
+        ["del", "itemID"]
+        ["meta", {"syncToken": str, "startTS": float, "endTS": float, "updatedAt": float}]
+    Records are buffered and written flushDelay seconds after the first change, and fsync'd at most every fsyncInterval seconds,
+        so a busy calendar costs a few writes per minute to the flash.
+    When the log gets much bigger than the events it holds, it is rewritten (compacted).
+    '''
+
+    def __init__(self, path, flushDelay=2, fsyncInterval=30, debug=False):
+        '''
+
+        :param path: str
+        :param flushDelay: float, seconds to wait for more changes before writing
+        :param fsyncInterval: float, min seconds between two fsync
+        :param debug: bool
+        '''
+        self._debug = debug
+        self._path = path
+        self._flushDelay = flushDelay
+        self._fsyncInterval = fsyncInterval
+
+        self._events = {}  # ItemId > event dict
+        self._meta = {}
+        self._records = 0  # lines in the log
+        self._pending = []  # records not written yet
+        self._needsFsync = False
+        self._lastFsync = 0  # time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return '<_EventStore: path={}, {} events>'.format(self._path, len(self._events))
+
+    def print(self, *a, **k):
+        if self._debug:
+            print(*a, **k)
+
+    def Load(self):
+        '''
+        :return: tuple of (dict like {ItemId: event dict}, meta dict)
+        '''
+        with self._lock:
+            try:
+                with open(self._path, mode='rt') as file:
+                    for line in file:
+                        try:
+                            op, value = json.loads(line)
+                        except ValueError:
+                            # the last line can be cut short by a power loss
+                            continue
+                        self._Apply(op, value)
+                        self._records += 1
+            except FileNotFoundError:
+                # no store yet, the events will come with the first poll
+                pass
+            except Exception as e:
+                self.print('_EventStore.Load Error:', e)
+
+            return dict(self._events), dict(self._meta)
+
+    def GetIDs(self):
+        return set(self._events.keys())
+
+    def Put(self, event):
+        self._Append('put', event)
+
+    def Delete(self, itemID):
+        if itemID in self._events:
+            self._Append('del', itemID)
+
+    def SetMeta(self, **meta):
+        self._Append('meta', meta)
+
+    def _Apply(self, op, value):
+        if op == 'put':
+            self._events[value['id']] = value
+        elif op == 'del':
+            self._events.pop(value, None)
+        elif op == 'meta':
+            self._meta.update(value)
+
+    def _Append(self, op, value):
+        with self._lock:
+            self._Apply(op, value)
+            self._pending.append(json.dumps([op, value]))
+            if self._timer is None:
+                self._StartTimer(self._flushDelay)
+
+    def _StartTimer(self, delay):
+        self._timer = threading.Timer(delay, self._OnTimer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _OnTimer(self):
+        with self._lock:
+            self._timer = None
+            self._Write()
+
+            if self._needsFsync:
+                # too soon to fsync again, come back later
+                self._StartTimer(max(0, self._lastFsync + self._fsyncInterval - time.monotonic()))
+
+    def Flush(self):
+        '''
+        Writes and fsyncs everything now, for example before a reboot
+        '''
+        with self._lock:
+            self._lastFsync = 0
+            self._Write()
+
+    def _Write(self):
+        # must hold self._lock
+        try:
+            if self._records + len(self._pending) > 2 * (len(self._events) + 1) + 100:
+                self._Compact()
+            elif self._pending:
+                with open(self._path, mode='at') as file:
+                    file.write('\n'.join(self._pending) + '\n')
+                    file.flush()
+                    self._Fsync(file)
+                self._records += len(self._pending)
+                self._pending = []
+            elif self._needsFsync:
+                with open(self._path, mode='at') as file:
+                    self._Fsync(file)
+
+        except Exception as e:
+            ProgramLog('_EventStore._Write Error: {}'.format(e))
+
+    def _Fsync(self, file):
+        if time.monotonic() - self._lastFsync >= self._fsyncInterval:
+            os.fsync(file.fileno())
+            self._lastFsync = time.monotonic()
+            self._needsFsync = False
+        else:
+            self._needsFsync = True
+
+    def _Compact(self):
+        # rewrite the log with only the live events, then swap it in
+        lines = [json.dumps(['put', event]) for event in self._events.values()]
+        lines.append(json.dumps(['meta', self._meta]))
+
+        tempPath = self._path + '.tmp'
+        with open(tempPath, mode='wt') as file:
+            file.write('\n'.join(lines) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+            self._lastFsync = time.monotonic()
+            self._needsFsync = False
+        os.replace(tempPath, self._path)
+
+        self._records = len(lines)
+        self._pending = []
+
+
+class HistogramSink:
+    '''
+    Metrics sink for GoogleCalendar(metricsSinks=[...]), keeps in-memory histograms of the timings
+        and counters of the requests, retries and bytes. GetPrometheusText() renders them for a scraper.
+    Any callable that accepts the record dict can be used as a sink, see GoogleCalendar._Emit for the records.
+    '''
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, buckets=None, prefix='gs_google_calendar'):
+        '''
+
+        :param buckets: list of float, upper bounds in seconds of the histogram buckets
+        :param prefix: str, prepended to the metric names
+        '''
+        self._buckets = sorted(buckets or self.DEFAULT_BUCKETS)
+        self._prefix = prefix
+        self._histograms = {}  # (name, labels) > {'buckets': [int], 'count': int, 'sum': float}
+        self._counters = {}  # (name, labels) > number
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return '<HistogramSink: {} histograms, {} counters>'.format(len(self._histograms), len(self._counters))
+
+    def __call__(self, record):
+        if record['type'] == 'request':
+            labels = (('callType', record['callType']),)
+            for phase in ('total', 'dns', 'connect', 'ttfb'):
+                if record.get(phase, None) is not None:
+                    self._Observe('request_seconds', labels + (('phase', phase),), record[phase])
+
+            self._Increment('requests_total', labels + (('status', str(record['status'])),), 1)
+            self._Increment('request_retries_total', labels, record['retries'])
+            self._Increment('received_bytes_total', labels, record.get('bytesIn', None) or 0)
+            self._Increment('sent_bytes_total', labels, record.get('bytesOut', None) or 0)
+
+        elif record['type'] == 'update':
+            for phase in ('total', 'parse', 'register'):
+                if record.get(phase, None) is not None:
+                    self._Observe('update_seconds', (('phase', phase),), record[phase])
+            self._Increment('updates_total', (('error', str(record['error'] is not None).lower()),), 1)
+            self._Increment('changed_events_total', (), record.get('changed', None) or 0)
+
+    def _Observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.get((name, labels), None)
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = {'buckets': [0] * len(self._buckets), 'count': 0, 'sum': 0}
+            index = bisect.bisect_left(self._buckets, value)
+            if index < len(self._buckets):
+                histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def _Increment(self, name, labels, value):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def GetHistograms(self):
+        '''
+        :return: dict like {(name, labels): {'buckets': [(upperBound, cumulativeCount)], 'count': int, 'sum': float}}
+        '''
+        with self._lock:
+            ret = {}
+            for key, histogram in self._histograms.items():
+                cumulative = 0
+                buckets = []
+                for upperBound, count in zip(self._buckets, histogram['buckets']):
+                    cumulative += count
+                    buckets.append((upperBound, cumulative))
+                ret[key] = {'buckets': buckets, 'count': histogram['count'], 'sum': histogram['sum']}
+            return ret
+
+    def GetCounters(self):
+        '''
+        :return: dict like {(name, labels): number}
+        '''
+        with self._lock:
+            return dict(self._counters)
+
+    def GetPrometheusText(self):
+        '''
+        :return: str, the metrics in the Prometheus text exposition format
+        '''
+        lines = []
+        for (name, labels), value in sorted(self.GetCounters().items()):
+            lines.append('{}{} {}'.format(self._MetricName(name), self._FormatLabels(labels), value))
+
+        for (name, labels), histogram in sorted(self.GetHistograms().items()):
+            metric = self._MetricName(name)
+            for upperBound, count in histogram['buckets']:
+                lines.append('{}_bucket{} {}'.format(metric, self._FormatLabels(labels + (('le', str(upperBound)),)), count))
+            lines.append('{}_bucket{} {}'.format(metric, self._FormatLabels(labels + (('le', '+Inf'),)), histogram['count']))
+            lines.append('{}_sum{} {}'.format(metric, self._FormatLabels(labels), histogram['sum']))
+            lines.append('{}_count{} {}'.format(metric, self._FormatLabels(labels), histogram['count']))
+
+        return '\n'.join(lines) + '\n'
+
+    def _MetricName(self, name):
+        return '{}_{}'.format(self._prefix, name) if self._prefix else name
+
+    @staticmethod
+    def _FormatLabels(labels):
+        if not labels:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(key, str(val).replace('"', '\\"')) for key, val in labels) + '}'
 
 
 class GoogleCalendar(_BaseCalendar):
@@ -16,6 +974,30 @@ class GoogleCalendar(_BaseCalendar):
             getAccessTokenCallback=None,
             calendarName=None,
             debug=False,
+            useSyncToken=False,
+            maxResults=250,
+            eventsFields=None,
+            fields=None,
+            accountKey=None,
+            calendarListTTL=3600,
+            calendarListSnapshot=None,
+            transport=None,
+            poolSize=10,
+            tokenLifetime=600,
+            attachmentCacheDir='attachment_cache',
+            attachmentCacheSize=50 * 1024 * 1024,
+            projectKey=None,
+            rateLimit=10,
+            projectRateLimit=100,
+            maxRetries=3,
+            eventStorePath=None,
+            eventStoreFlushDelay=2,
+            eventStoreFsyncInterval=30,
+            metricsSinks=None,
+            apiRoot=API_ROOT,
+            expandRecurring=False,
+            dayTiles=False,
+            tileTTLs=DEFAULT_TILE_TTLS,
             **k
     ):
         if not callable(getAccessTokenCallback):
@@ -24,309 +1006,3123 @@ class GoogleCalendar(_BaseCalendar):
         self._getAccessTokenCallback = getAccessTokenCallback
         self.calendarName = calendarName
         self._calendarID = None
-        self.calendars = set()  # set to avoid duplicates
-        self._baseURL = 'https://www.googleapis.com/calendar/v3/'
+        self._apiRoot = apiRoot
+        self._baseURL = apiRoot + '/calendar/v3/'
+        self._batchURL = apiRoot + '/batch/calendar/v3'
+        self._driveURL = apiRoot + '/drive/v3/'
         self._debug = debug
 
-        super().__init__(
-            *a,
-            # debug=debug, #nope
-            **k)
+        # incremental sync
+        self._useSyncToken = useSyncToken
+        self._syncToken = None
+        self._items = {}  # ItemId > _CalendarItem, all the events we currently know about
+        self._fingerprints = {}  # ItemId > etag of the event when its _CalendarItem was made
+        self._pollStats = {}
 
-        self._GetCalendarID()  # init the self.calendars attribute
-        self.session = gs_requests.session()
+        # paging
+        self._maxResults = maxResults  # events per page, google allows up to 2500
 
-    def __str__(self):
-        return '<GoogleCalendar: RoomName={}, LastUpdated={}>'.format(
-            self.calendarName,
-            self.LastUpdated,
-        )
+        # day tiles, the window is read one local day at a time and each day is kept until it is stale
+        self._dayTiles = dayTiles
+        self._tileTTLs = tileTTLs
+        self._tiles = {}  # datetime.date > (time.monotonic() when it was read, list of "calendar#event" dicts)
+
+        # conditional requests, the ETag of the last complete events list of each request URL
+        self._validators = collections.OrderedDict()  # URL with query > ETag, most recently used last
+        self._maxValidators = 16
+
+        # partial responses, callType > "fields" param
+        self._fields = dict(DEFAULT_FIELDS, **(fields or {}))
+        if eventsFields:
+            self._fields['events'] = eventsFields
+        self._nextSyncToken = None
+        self._nextValidator = None  # (url, params, etag) of the events list read by _IterEventItems, see _SaveNextValidator
+
+        # recurring events expanded locally instead of by google (singleEvents=False)
+        self._expandRecurring = expandRecurring
+        self._masters = {}  # ItemId > "calendar#event" dict of the recurring events
+        self._exceptions = {}  # ItemId of the master > set of the int timestamps of the instances that were modified/cancelled
+        self._expandedIDs = {}  # ItemId of the master > set of the instance IDs made by the last expansion
+        self._series = {}  # ItemId of the master > (etag, _RecurringSeries or None when google has to expand it)
+        self._fallbackInstances = {}  # ItemId of the master > (etag, timeMin, timeMax, list of instance dicts)
+
+        # interval index over the items of the base class, for the GetNowCalItems/GetNextCalItems/... lookups
+        self._index = None  # _IntervalIndex, None until the first lookup
+        self._indexStale = True  # the base class's items changed since the index was brought up to date
+        self._indexLock = threading.Lock()  # held while the index is synced and looked up, see _GetIndex
+
+        # push notifications / adaptive polling
+        self._channel = None  # the "api#channel" dict of the events/watch channel
+        self._changeTimes = collections.deque(maxlen=20)  # time.monotonic() of the polls that found changes
+
+        # one update at a time, see _BeginUpdate
+        self._updateLock = threading.Lock()
+        self._updating = False
+        self._updateAgain = None  # (calendar, startDT, endDT) of an update asked for while one was running
+
+        # calendar name > ID resolution is shared by all the GoogleCalendar objects of the same account
+        self._accountKey = accountKey or getAccessTokenCallback
+        self._directory = _CalendarDirectory.Get(
+            self._accountKey,
+            ttl=calendarListTTL,
+            snapshotPath=calendarListSnapshot,
+            fields=self._fields['calendarList'],
+            apiRoot=apiRoot,
+            debug=debug,
+        )
+        self._transport = transport or _HTTPTransport.Get(self._accountKey, poolSize=poolSize)
+        self._tokenCache = _AccessTokenCache.Get(self._accountKey, getAccessTokenCallback, lifetime=tokenLifetime)
+        self._attachmentCache = _AttachmentCache.Get(attachmentCacheDir, maxBytes=attachmentCacheSize)
+
+        # quota, requests/second per account and per google project (shared by all the accounts of the project)
+        self._rateLimiters = [_TokenBucket.Get(('account', self._accountKey), rateLimit, burst=rateLimit * 2)]
+        if projectKey:
+            self._rateLimiters.append(_TokenBucket.Get(('project', projectKey), projectRateLimit))
+        self._breaker = _CircuitBreaker.Get(self._accountKey)
+        self._maxRetries = maxRetries
+        self._baseBackoff = 1
+        self._maxBackoff = 32
+        self.session = self._transport.session
+
+        # instrumentation, callables that receive a dict for every request and every UpdateCalendar
+        self._metricsSinks = list(metricsSinks or [])
+        self._decodeTime = 0  # seconds spent in resp.json() by the current UpdateCalendar
+
+        # local copy of the events, next to the base class' persistentStorage unless a path is given
+        if eventStorePath is None and k.get('persistentStorage', None):
+            eventStorePath = '{}.events'.format(k['persistentStorage'])
+        self._eventStore = _EventStore(
+            eventStorePath,
+            flushDelay=eventStoreFlushDelay,
+            fsyncInterval=eventStoreFsyncInterval,
+            debug=debug,
+        ) if eventStorePath else None
+
+        super().__init__(
+            *a,
+            # debug=debug, #nope
+            **k)
+
+        if self._eventStore:
+            self._LoadEventStore()
+
+        # no network here, the calendar ID is resolved on first use or by WarmUp
+
+    def __str__(self):
+        return '<GoogleCalendar: RoomName={}, LastUpdated={}>'.format(
+            self.calendarName,
+            self.LastUpdated,
+        )
+
+    def print(self, *a, **k):
+        if self._debug:
+            print(*a, **k)
+
+    @property
+    def LastUpdated(self):
+        # datetime of the last successful poll, also set by the polls that skip RegisterCalendarItems
+        return getattr(self, '_lastUpdated', None)
+
+    @LastUpdated.setter
+    def LastUpdated(self, value):
+        self._lastUpdated = value
+
+    def _LoadEventStore(self):
+        # register the events saved by the last run, so the panel has something to show before the first poll
+        events, meta = self._eventStore.Load()
+        if not events and not meta:
+            return
+
+        for itemID, item in events.items():
+            try:
+                self._items[itemID] = self._ItemFromJSON(item)
+                self._fingerprints[itemID] = _Fingerprint(item)
+            except Exception as e:
+                self.print('_LoadEventStore error', itemID, e)
+
+        if self._useSyncToken and not self._expandRecurring:
+            # the recurring masters are not in the store, with expandRecurring the first poll has to be a full one
+            self._syncToken = meta.get('syncToken', None)
+
+        calItems = list(self._items.values())
+        startTS = meta.get('startTS', None)
+        endTS = meta.get('endTS', None)
+        if startTS is None or endTS is None:
+            if not calItems:
+                return
+            startDT = min(event.Get('Start') for event in calItems)
+            endDT = max(event.Get('End') for event in calItems)
+        else:
+            startDT = datetime.datetime.fromtimestamp(startTS)
+            endDT = datetime.datetime.fromtimestamp(endTS)
+
+        self.RegisterCalendarItems(calItems=calItems, startDT=startDT, endDT=endDT)
+        if meta.get('updatedAt', None):
+            # the data is only as fresh as the poll that saved it
+            self._lastUpdated = datetime.datetime.fromtimestamp(meta['updatedAt'])
+        self.print('Loaded {} events from {}'.format(len(calItems), self._eventStore))
+
+    def _SaveEventStore(self, items, startDT, endDT):
+        '''
+        Mirrors self._items into the local event store
+
+        :param items: list of the raw event dicts that were parsed since the last save
+        :param startDT: datetime
+        :param endDT: datetime
+        '''
+        store = self._eventStore
+        if store is None:
+            return
+
+        for itemID in store.GetIDs() - self._items.keys():
+            store.Delete(itemID)
+        for item in items:
+            if item.get('id') in self._items:
+                store.Put(item)
+        store.SetMeta(
+            syncToken=self._syncToken,
+            startTS=startDT.timestamp(),
+            endTS=endDT.timestamp(),
+            updatedAt=time.time(),
+        )
+
+    def FlushEventStore(self):
+        '''
+        Writes the pending changes of the local event store to disk now
+        '''
+        if self._eventStore:
+            self._eventStore.Flush()
+
+    def _DoRequest(self, *a, conditional=False, **k):
+        '''
+        :param conditional: bool, True to send the ETag saved by _SaveValidator for this url/params as If-None-Match,
+            the caller must then handle a 304 (empty body)
+        '''
+        self.print('_DoRequest(', a, k)
+        if self._GetCalendarID() is None:
+            raise PermissionError('Error resolving calendar ID "{}"'.format(self.calendarName))
+
+        if conditional:
+            self._AddValidator(k)
+        return self._SendRequest(*a, **k)
+
+    @staticmethod
+    def _GetValidatorKey(url, params):
+        # the url and the query, minus the paging
+        return url + '?' + urllib.parse.urlencode(sorted(
+            (key, val) for key, val in (params or {}).items() if key != 'pageToken'
+        ))
+
+    def _AddValidator(self, k):
+        # adds If-None-Match to the kwargs of a request, if a complete response for the same url/params was seen
+        etag = self._validators.get(self._GetValidatorKey(k['url'], k.get('params', None)), None)
+        if etag:
+            k['headers'] = dict(k.get('headers', None) or {}, **{'If-None-Match': etag})
+
+    def _SaveValidator(self, url, params, etag):
+        '''
+        Remembers the ETag of a response, once it has been read and applied completely
+
+        :param url: str
+        :param params: dict
+        :param etag: str or None
+        '''
+        key = self._GetValidatorKey(url, params)
+        if not etag:
+            self._validators.pop(key, None)
+            return
+
+        self._validators[key] = etag
+        self._validators.move_to_end(key)
+        while len(self._validators) > self._maxValidators:
+            self._validators.popitem(last=False)
+
+    def _SaveNextValidator(self):
+        # the ETag of the events list read by _IterEventItems, only once its events were applied/stored,
+        #   so a failure in between does not turn the next poll into a 304 over stale items
+        if self._nextValidator is not None:
+            self._SaveValidator(*self._nextValidator)
+            self._nextValidator = None
+
+    def _OnNotModified(self):
+        # the events list did not change, the registered items are still right
+        self._lastUpdated = datetime.datetime.now()
+        self._pollStats = {
+            'items': 0,
+            'skipped': 0,
+            'diffed': 0,
+            'changed': 0,
+            'parseTime': 0,
+            'registerTime': 0,
+            'notModified': True,
+        }
+        self.print('poll stats', self._pollStats)
+
+    def _SendRequest(self, method, url, headers=None, quotaCost=1, **k):
+        '''
+        Sends a request with the account's access token.
+        Waits for the account/project rate limiters, retries rate-limited and failed requests
+            with jittered exponential backoff, and refreshes the token once on HTTP 401.
+
+        :param method: str
+        :param url: str
+        :param headers: dict
+        :param quotaCost: int, how many API calls this request counts for (a batch counts for each of its parts)
+        :param k: passed to the session
+        :return: the response
+        '''
+        if not self._metricsSinks:
+            return self._SendWithRetries(method, url, headers, quotaCost, None, **k)
+
+        record = self._NewRequestRecord(method, k)
+        start = time.monotonic()
+        try:
+            resp = self._SendWithRetries(method, url, headers, quotaCost, record, **k)
+            record['status'] = resp.status_code
+            return resp
+        except Exception as e:
+            record['error'] = repr(e)
+            raise
+        finally:
+            record['total'] = time.monotonic() - start
+            self._Emit(record)
+
+    def _SendWithRetries(self, method, url, headers, quotaCost, record, **k):
+        # the retry loop of _SendRequest, record is the metrics dict or None
+        # the session is shared with other rooms, so the headers are passed per request instead of set on the session
+        headers = dict(headers or {})
+        headers.setdefault('Accept', 'application/json')
+
+        attempt = 0
+        tokenRefreshed = False
+        while True:
+            if record is not None:
+                record['retries'] = attempt
+
+            if not self._breaker.Allow():
+                self._NewConnectionStatus('Disconnected')
+                raise _CircuitOpenError('Too many failed requests, not sending "{} {}"'.format(method, url))
+
+            time.sleep(self._GetRateLimitDelay(quotaCost))
+
+            token = self._tokenCache.GetToken()
+            headers['Authorization'] = 'Bearer {}'.format(token)
+            if self._debug:
+                for key, val in headers.items():
+                    if 'Auth' in key:
+                        val = val[:15] + '...'
+
+                    self.print('header', key, '=', val)
+
+            try:
+                resp = self._transport.Request(method, url, headers=headers, timings=record, **k)
+            except OSError as e:
+                # connection refused/reset, timeout...
+                self._breaker.RecordFailure()
+                if attempt >= self._maxRetries:
+                    raise
+                self.print('_SendRequest error', e)
+                time.sleep(self._GetRetryDelay(None, attempt))
+                attempt += 1
+                continue
+
+            if resp.status_code == 401 and not tokenRefreshed:
+                # the token was revoked or expired early, get a new one and try once more
+                self.print('401, refreshing the access token')
+                self._tokenCache.Invalidate(token)
+                tokenRefreshed = True
+                continue
+
+            if not _IsRetryable(resp):
+                self._breaker.RecordSuccess()
+                return resp
+
+            self._breaker.RecordFailure()
+            if attempt >= self._maxRetries:
+                return resp
+
+            delay = self._GetRetryDelay(resp, attempt)
+            self.print('HTTP {}, retrying in {:.1f}s'.format(resp.status_code, delay))
+            time.sleep(delay)
+            attempt += 1
+
+    def _NewRequestRecord(self, method, k):
+        return {
+            'type': 'request',
+            'calendar': self.calendarName,
+            'method': method.upper(),
+            'callType': k.get('callType', 'other'),
+            'status': None,
+            'error': None,
+            'retries': 0,
+            'total': None,  # seconds, including the retries and backoff
+            'dns': None,  # seconds, None when the transport can not tell or the connection was reused
+            'connect': None,
+            'ttfb': None,  # seconds until the response headers, last attempt
+            'bytesIn': None,
+            'bytesOut': None,
+        }
+
+    def _Emit(self, record):
+        '''
+        Passes a metrics record to the sinks.
+        Records are dicts with a 'type' key:
+            'request': one per _SendRequest, see _NewRequestRecord
+            'update': one per UpdateCalendar, with the 'total', 'parse' (json decode + _ItemFromJSON) and 'register' seconds,
+                the 'items'/'changed' counts of GetPollStats and 'error'
+
+        :param record: dict
+        '''
+        for sink in self._metricsSinks:
+            try:
+                sink(record)
+            except Exception as e:
+                ProgramLog('GoogleCalendar metrics sink {} Error: {}'.format(sink, e))
+
+    def _GetRateLimitDelay(self, quotaCost=1):
+        # seconds to wait so the account and project stay under their rate limits
+        return max(bucket.Reserve(quotaCost) for bucket in self._rateLimiters)
+
+    def _GetRetryDelay(self, resp, attempt):
+        # "full jitter" exponential backoff, but never sooner than the server asked for
+        delay = random.uniform(0, min(self._maxBackoff, self._baseBackoff * 2 ** attempt))
+        if resp is not None:
+            delay = max(delay, _GetRetryAfter(resp))
+        return delay
+
+    def GetTransportStats(self):
+        return self._transport.GetStats()
+
+    def _GetCalendarID(self):
+        if self._calendarID is None:
+            self._calendarID = self._directory.GetID(self.calendarName, self._SendRequest)
+            self.print('calendar ID found "{}"'.format(self._calendarID))
+
+        return self._calendarID
+
+    @property
+    def calendars(self):
+        # the names of all the calendars this account can see
+        return self._directory.GetNames(self._SendRequest)
+
+    def WarmUp(self, wait=True):
+        '''
+        Does the network work ahead of the first UpdateCalendar: gets an access token and resolves the calendar ID
+            (one calendar list crawl, shared by every room of the account).
+        Optional, the same is done on first use.
+
+        :param wait: bool, False to do it in a background thread
+        :return: threading.Thread if wait is False, else the calendar ID (str or None)
+        '''
+        if not wait:
+            thread = threading.Thread(target=self.WarmUp, daemon=True)
+            thread.start()
+            return thread
+
+        try:
+            self._tokenCache.GetToken()
+            return self._GetCalendarID()
+        except Exception as e:
+            # the first UpdateCalendar will try again
+            ProgramLog('GoogleCalendar.WarmUp error for {}: {}'.format(self, e))
+
+    def UpdateCalendar(self, calendar=None, startDT=None, endDT=None):
+        '''
+        Subclasses should override this
+
+        :param calendar: a particular calendar ( None means use the default calendar)
+        :param startDT: only search for events after this date
+        :param endDT: only search for events before this date
+        :return:
+        '''
+        self.print('UpdateCalendar(', calendar, startDT, endDT)
+        if not self._BeginUpdate(calendar, startDT, endDT):
+            self.print('UpdateCalendar already running, it will go once more when done')
+            return
+
+        try:
+            self._UpdateCalendar(calendar, startDT, endDT)
+        except BaseException:
+            self._EndUpdate(failed=True)
+            raise
+        self._FinishUpdate()
+
+    def _BeginUpdate(self, calendar, startDT, endDT):
+        '''
+        Only one update of a calendar runs at a time.
+        When an update is asked for while one is running (a push notification during a scheduled poll,
+            two pollers...), it is folded into the running one, which goes around once more when it is done.
+
+        :return: bool, True if the caller has to run the update and then call _FinishUpdate,
+            False if it was folded into the running update
+        '''
+        with self._updateLock:
+            if self._updating:
+                self._updateAgain = (calendar, startDT, endDT)
+                return False
+            self._updating = True
+            return True
+
+    def _EndUpdate(self, failed=False):
+        # returns the arguments of the update that was folded into the running one, None once the calendar is released
+        with self._updateLock:
+            again, self._updateAgain = self._updateAgain, None
+            if again is None or failed:
+                self._updating = False
+                return None
+            return again
+
+    def _FinishUpdate(self):
+        # runs the updates that were asked for meanwhile, then lets the next _BeginUpdate through
+        try:
+            again = self._EndUpdate()
+            while again is not None:
+                self._UpdateCalendar(*again)
+                again = self._EndUpdate()
+        except BaseException:
+            self._EndUpdate(failed=True)
+            raise
+
+    def _UpdateCalendar(self, calendar, startDT, endDT):
+        # UpdateCalendar, once the calendar is claimed
+        defaultStartDT, defaultEndDT = _GetDefaultWindow()
+        startDT = startDT or defaultStartDT
+        endDT = endDT or defaultEndDT
+
+        params = self._GetEventsParams(startDT, endDT)
+        self.print('params=', params)
+
+        start = time.monotonic()
+        error = None
+        try:
+            if self._UsesTiles():
+                self._UpdateTiles(startDT, endDT)
+            else:
+                self._ApplyEventItems(self._IterEventItems(params), startDT, endDT)
+                self._SaveNextValidator()
+        except _NotModified:
+            self._OnNotModified()
+        except _CircuitOpenError as e:
+            error = e
+            self.print('UpdateCalendar', e)
+            return
+        except _RequestError as e:
+            error = e
+            if e.resp.status_code == 410 and self._syncToken:
+                # the sync token is no longer valid, start over with a full sync
+                self.print('syncToken expired, doing a full sync')
+                self._ResetSync()
+                return self._UpdateCalendar(calendar, startDT, endDT)
+
+            self.print('UpdateCalendar error', e)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self._metricsSinks:
+                self._EmitUpdate(start, error)
+
+    def _EmitUpdate(self, start, error):
+        # the 'update' metrics record of an UpdateCalendar that started at time.monotonic() start
+        stats = self._pollStats if error is None else {}
+        self._Emit({
+            'type': 'update',
+            'calendar': self.calendarName,
+            'error': None if error is None else repr(error),
+            'total': time.monotonic() - start,
+            'parse': stats.get('parseTime', None),
+            'register': stats.get('registerTime', None),
+            'items': stats.get('items', None),
+            'changed': stats.get('changed', None),
+        })
+
+    def _UsesTiles(self):
+        # the syncToken and the recurring masters are not per day, those modes always read the whole window
+        return self._dayTiles and not self._useSyncToken and not self._expandRecurring
+
+    def _UpdateTiles(self, startDT, endDT):
+        '''
+        Updates the window from the day tiles: only the days that are missing or stale are requested
+            (consecutive days in one request), then the tiles are combined and passed to _ApplyEventItems.
+        An event that moved to a day that is not stale yet shows up when that day is read again.
+
+        :param startDT: datetime
+        :param endDT: datetime
+        '''
+        today = datetime.date.today()
+        days = []
+        day = startDT.date()
+        while datetime.datetime.combine(day, datetime.time()) < endDT:
+            days.append(day)
+            day += datetime.timedelta(days=1)
+
+        for day in list(self._tiles.keys()):
+            if day not in days:
+                # out of the window, most likely in the past now
+                del self._tiles[day]
+
+        now = time.monotonic()
+        stale = [
+            day for day in days
+            if day not in self._tiles or now - self._tiles[day][0] >= self._GetTileTTL(day, today)
+        ]
+
+        decodeTime = 0
+        for run in _GroupConsecutiveDays(stale):
+            self._ReadTiles(run[0], run[-1])
+            decodeTime += self._decodeTime
+
+        # the most recently read version of each event, the same event can be in more than one tile
+        latest = {}  # ItemId > (time it was read, "calendar#event" dict)
+        for day in days:
+            readAt, items = self._tiles[day]
+            for item in items:
+                itemID = item.get('id')
+                if itemID not in latest or latest[itemID][0] < readAt:
+                    latest[itemID] = (readAt, item)
+
+        self._decodeTime = decodeTime
+        self._ApplyEventItems([
+            item for readAt, item in latest.values()
+            if _ParseEventTime(item['start']) < endDT and _ParseEventTime(item['end']) > startDT
+        ], startDT, endDT)
+        self._pollStats['tiles'] = len(days)
+        self._pollStats['tilesRead'] = len(stale)
+
+    def _GetTileTTL(self, day, today):
+        daysAway = abs((day - today).days)
+        for maxDays, ttl in self._tileTTLs:
+            if maxDays is None or daysAway <= maxDays:
+                return ttl
+        return 0
+
+    def _ReadTiles(self, firstDay, lastDay):
+        '''
+        Requests the events from the start of firstDay to the end of lastDay (local time) and replaces those tiles
+
+        :param firstDay: datetime.date
+        :param lastDay: datetime.date
+        '''
+        startDT = datetime.datetime.combine(firstDay, datetime.time())
+        endDT = datetime.datetime.combine(lastDay + datetime.timedelta(days=1), datetime.time())
+        params = self._GetEventsParams(startDT, endDT)
+        days = [firstDay + datetime.timedelta(days=i) for i in range((lastDay - firstDay).days + 1)]
+
+        readAt = time.monotonic()
+        try:
+            items = list(self._IterEventItems(params))
+        except _NotModified:
+            if all(day in self._tiles for day in days):
+                # same as the last time this range was read
+                for day in days:
+                    self._tiles[day] = (readAt, self._tiles[day][1])
+                return
+
+            # the tiles of that response were dropped since, read it again
+            self._SaveValidator(self._baseURL + 'calendars/{}/events'.format(self._GetCalendarID()), params, None)
+            items = list(self._IterEventItems(params))
+
+        tiles = {day: [] for day in days}
+        for item in items:
+            if item.get('status', None) == 'cancelled':
+                continue
+            itemStart = _ParseEventTime(item['start'])
+            itemEnd = _ParseEventTime(item['end'])
+            # every day the event is in, an event that ends at midnight is not in the next day
+            day = max(itemStart.date(), firstDay)
+            last = min(max(itemStart, itemEnd - datetime.timedelta(microseconds=1)).date(), lastDay)
+            while day <= last:
+                tiles[day].append(item)
+                day += datetime.timedelta(days=1)
+
+        for day, dayItems in tiles.items():
+            self._tiles[day] = (readAt, dayItems)
+        self._SaveNextValidator()
+
+    def _GetEventsParams(self, startDT, endDT):
+        '''
+        The query parameters for the first page of calendars/{id}/events
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :return: dict
+        '''
+        if self._useSyncToken:
+            if self._syncToken:
+                # only the changes since the last sync, cannot be combined with timeMin/timeMax
+                params = {'syncToken': self._syncToken}
+            else:
+                # full sync
+                params = {'timeMin': _ToUTCString(startDT)}
+        else:
+            params = {
+                'timeMin': _ToUTCString(startDT),
+                'timeMax': _ToUTCString(endDT),
+            }
+
+        if self._expandRecurring:
+            # masters and exceptions only, the instances are made by _ExpandRecurring
+            params['singleEvents'] = 'False'
+            params['fields'] = self._fields['recurringEvents']
+        else:
+            params['singleEvents'] = 'True'
+            params['fields'] = self._fields['events']
+        params['maxResults'] = self._maxResults
+        return params
+
+    def _IterEventItems(self, params):
+        '''
+        Generator that requests the events list one page at a time and yields the raw "calendar#event" dicts.
+        Only one page of the response is held in memory at a time.
+        When the last page has been read, its "nextSyncToken" (if any) is saved in self._nextSyncToken
+            and the ETag of the first page in self._nextValidator, for _SaveNextValidator once the events are applied.
+        The first page is requested with If-None-Match, raises _NotModified (before yielding anything)
+            if the list has not changed since it was last read completely.
+
+        :param params: dict of query parameters for the calendars/{id}/events request
+        :return: generator of dict
+        '''
+        url = self._baseURL + 'calendars/{}/events'.format(self._GetCalendarID())
+        firstParams = params
+        params = params.copy()
+        self._nextSyncToken = None
+        self._nextValidator = None
+        self._decodeTime = 0
+
+        etag = None
+        while True:
+            resp = self._DoRequest(
+                method='get',
+                url=url,
+                params=params,
+                callType='events',
+                conditional='pageToken' not in params,
+            )
+            self._NewConnectionStatus('Connected' if resp.ok else 'Disconnected')
+            if resp.status_code == 304:
+                raise _NotModified()
+            if not resp.ok:
+                if resp.status_code == 404:
+                    # the calendar may have been deleted/re-shared, resolve the ID again next time
+                    self._directory.Invalidate()
+                    self._calendarID = None
+                raise _RequestError(resp)
+
+            if 'pageToken' not in params:
+                etag = resp.headers.get('ETag', None)
+
+            decodeStart = time.perf_counter()
+            page = resp.json()
+            self._decodeTime += time.perf_counter() - decodeStart
+            self.print('{} items in page'.format(len(page.get('items', []))))
+            for item in page.get('items', []):
+                yield item
+
+            pageToken = page.get('nextPageToken', None)
+            if pageToken is None:
+                self._nextSyncToken = page.get('nextSyncToken', None)
+                self._nextValidator = (url, firstParams, etag)
+                return
+
+            params['pageToken'] = pageToken
+            del page, resp
+
+    def _ApplyEventItems(self, items, startDT, endDT):
+        '''
+        Consumes the raw events and registers the result with RegisterCalendarItems.
+        In syncToken mode the items are changes to apply to self._items,
+            otherwise they are the complete list of events in the window.
+        Events whose fingerprint (etag) has not changed since the last poll are not parsed again,
+            and RegisterCalendarItems is skipped when nothing changed at all.
+
+        :param items: iterable of "calendar#event" dicts, self._nextSyncToken must be set once it is exhausted
+        :param startDT: datetime
+        :param endDT: datetime
+        :return:
+        '''
+        if self._expandRecurring:
+            items = self._ExpandRecurring(items, startDT, endDT)
+
+        total = skipped = changes = 0
+        parseTime = 0  # seconds spent in _ItemFromJSON
+        parsed = []  # raw events that were (re)parsed, for the event store
+        oldSyncToken = self._syncToken
+
+        if self._useSyncToken:
+            for item in items:
+                total += 1
+                itemID = item.get('id')
+                if item.get('status', None) == 'cancelled':
+                    self._fingerprints.pop(itemID, None)
+                    if self._items.pop(itemID, None) is not None:
+                        changes += 1
+                    continue
+
+                fingerprint = _Fingerprint(item)
+                if fingerprint and self._fingerprints.get(itemID, None) == fingerprint and itemID in self._items:
+                    skipped += 1
+                    continue
+
+                parseStart = time.perf_counter()
+                self._items[itemID] = self._ItemFromJSON(item)
+                parseTime += time.perf_counter() - parseStart
+                self._fingerprints[itemID] = fingerprint
+                parsed.append(item)
+                changes += 1
+
+            # forget events that are over, they will never be in the window again
+            for itemID, event in list(self._items.items()):
+                if event.Get('End') < startDT:
+                    self._items.pop(itemID)
+                    self._fingerprints.pop(itemID, None)
+
+            self._syncToken = self._nextSyncToken
+            calItems = [
+                event for event in self._items.values()
+                if event.Get('Start') < endDT and event.Get('End') > startDT
+            ]
+
+        else:
+            oldItems = self._items
+            oldFingerprints = self._fingerprints
+            self._items = {}
+            self._fingerprints = {}
+            try:
+                for item in items:
+                    if item.get('status', None) == 'cancelled':
+                        continue
+                    total += 1
+                    itemID = item.get('id')
+                    fingerprint = _Fingerprint(item)
+                    oldEvent = oldItems.get(itemID, None)
+
+                    if fingerprint and oldEvent is not None and oldFingerprints.get(itemID, None) == fingerprint:
+                        # unchanged, reuse the item from the last poll
+                        event = oldEvent
+                        skipped += 1
+                    else:
+                        self.print('item=', _Lazy(json.dumps, item, indent=2, sort_keys=True))
+                        parseStart = time.perf_counter()
+                        event = self._ItemFromJSON(item)
+                        parseTime += time.perf_counter() - parseStart
+                        parsed.append(item)
+                        if oldEvent is not None and _ItemSignature(oldEvent) == _ItemSignature(event):
+                            event = oldEvent
+                        else:
+                            changes += 1
+
+                    self._items[itemID] = event
+                    self._fingerprints[itemID] = fingerprint
+            except BaseException:
+                # the list could not be read completely (_NotModified, a page failed...), keep the last complete one
+                self._items = oldItems
+                self._fingerprints = oldFingerprints
+                raise
+
+            changes += len(oldItems.keys() - self._items.keys())  # deleted
+            calItems = list(self._items.values())
+
+        self._pollStats = {
+            'items': total,
+            'skipped': skipped,  # fingerprint unchanged, not parsed
+            'diffed': total - skipped,  # parsed and compared
+            'changed': changes,
+            'parseTime': self._decodeTime + parseTime,  # seconds, json decode + _ItemFromJSON
+            'registerTime': 0,  # seconds in RegisterCalendarItems, 0 when it was skipped
+        }
+        self.print('poll stats', self._pollStats)
+
+        if changes or parsed or self._syncToken != oldSyncToken:
+            self._SaveEventStore(parsed, startDT, endDT)
+
+        if changes:
+            self._changeTimes.append(time.monotonic())
+
+        elif self._IsRegistered(calItems, startDT, endDT):
+            # RegisterCalendarItems would not find anything new/changed/deleted
+            self._lastUpdated = datetime.datetime.now()
+            return
+
+        registerStart = time.perf_counter()
+        self.RegisterCalendarItems(
+            calItems=calItems,
+            startDT=startDT,
+            endDT=endDT,
+        )
+        self._pollStats['registerTime'] = time.perf_counter() - registerStart
+
+    def _IsRegistered(self, calItems, startDT, endDT):
+        # True if calItems are exactly the items already registered for this window
+        with self._indexLock:
+            registered = self._GetIndex().GetOverlapping(startDT.timestamp(), endDT.timestamp())
+        if len(registered) != len(calItems):
+            return False
+        registered = set(id(event) for event in registered)
+        return all(id(event) in registered for event in calItems)
+
+    def GetPollStats(self):
+        '''
+        :return: dict like {'items': int, 'skipped': int, 'diffed': int, 'changed': int, 'parseTime': float, 'registerTime': float}
+            for the last poll
+        '''
+        return self._pollStats.copy()
+
+    def RegisterCalendarItems(self, calItems, startDT, endDT):
+        super().RegisterCalendarItems(calItems=calItems, startDT=startDT, endDT=endDT)
+        self._indexStale = True
+        self._lastUpdated = datetime.datetime.now()
+
+    def _GetIndex(self):
+        # the index follows the base class's own items, whatever put them there (polls, persistentStorage...)
+        # must hold self._indexLock, while syncing and until the lookup is done
+        # the flag is cleared before the items are read, so a RegisterCalendarItems meanwhile marks it stale again
+        stale, self._indexStale = self._indexStale, False
+        calItems = self._calendarItems
+        index = self._index
+        if index is None:
+            index = self._index = _IntervalIndex(calItems)
+        elif stale or len(index) != len(calItems):
+            index.Sync(calItems)
+        return index
+
+    def GetNowCalItems(self):
+        '''
+        :return: list of _CalendarItem that are happening now
+        '''
+        with self._indexLock:
+            return self._GetIndex().GetAt(time.time())
+
+    def GetNextCalItems(self):
+        '''
+        :return: list of _CalendarItem that start next (more than one if they start at the same time)
+        '''
+        with self._indexLock:
+            return self._GetIndex().GetNext(time.time())
+
+    def GetCalendarItemsInRange(self, startDT=None, endDT=None):
+        '''
+        :param startDT: datetime
+        :param endDT: datetime
+        :return: list of _CalendarItem that overlap startDT - endDT
+        '''
+        startDT = startDT or datetime.datetime.now()
+        endDT = endDT or startDT
+        with self._indexLock:
+            return self._GetIndex().GetOverlapping(startDT.timestamp(), endDT.timestamp())
+
+    def _ResetSync(self):
+        self._syncToken = None
+        self._items.clear()
+        self._fingerprints.clear()
+        self._masters.clear()
+        self._exceptions.clear()
+        self._expandedIDs.clear()
+        self._validators.clear()
+
+    def _ExpandRecurring(self, items, startDT, endDT):
+        '''
+        Generator that turns the items of a singleEvents=False response into what singleEvents=True would have returned:
+            single events and exceptions (modified/cancelled instances) are passed through,
+            recurring events ("masters") are kept and replaced by their instances in the window.
+        The expansion of each master is cached until its etag changes.
+
+        :param items: iterable of "calendar#event" dicts
+        :param startDT: datetime
+        :param endDT: datetime
+        :return: generator of "calendar#event" dicts
+        '''
+        if self._useSyncToken:
+            # the changes are applied to what the last responses left
+            masters = self._masters
+            exceptions = self._exceptions
+        else:
+            # a full response has all the masters and exceptions of the window, they replace the old ones
+            #   only once it has been read completely (it may still turn out to be a 304 or fail on a page)
+            masters = {}
+            exceptions = {}
+
+        exceptionIDs = set()
+        for item in items:
+            itemID = item.get('id')
+            if 'recurrence' in item or itemID in masters:
+                if 'recurrence' in item and item.get('status', None) != 'cancelled':
+                    masters[itemID] = item
+                else:
+                    # the whole series was deleted
+                    masters.pop(itemID, None)
+                    exceptions.pop(itemID, None)
+                continue
+
+            masterID = item.get('recurringEventId', None)
+            if masterID is not None and 'originalStartTime' in item:
+                originalStart = int(_ParseEventTime(item['originalStartTime']).timestamp())
+                exceptions.setdefault(masterID, set()).add(originalStart)
+                exceptionIDs.add(itemID)
+            yield item
+
+        # the exceptions of series that are gone
+        for masterID in list(exceptions.keys()):
+            if masterID not in masters:
+                exceptions.pop(masterID)
+        self._masters = masters
+        self._exceptions = exceptions
+
+        expandedIDs = {}
+        for masterID, master in self._masters.items():
+            exceptions = self._exceptions.get(masterID, ())
+            instanceIDs = expandedIDs[masterID] = set()
+            for instance in self._GetInstances(master, startDT, endDT):
+                originalStart = instance.get('originalStartTime', None)  # left out by a custom projection
+                if exceptions and originalStart and int(_ParseEventTime(originalStart).timestamp()) in exceptions:
+                    continue
+                instanceIDs.add(instance['id'])
+                yield instance
+
+        # instances that are gone (series shortened/deleted), this only matters in syncToken mode
+        for masterID, instanceIDs in self._expandedIDs.items():
+            for instanceID in instanceIDs - expandedIDs.get(masterID, set()) - exceptionIDs:
+                yield {'id': instanceID, 'status': 'cancelled'}
+        self._expandedIDs = expandedIDs
+
+        for masterID in list(self._series.keys()):
+            if masterID not in self._masters:
+                self._series.pop(masterID)
+                self._fallbackInstances.pop(masterID, None)
+
+    def _GetInstances(self, master, startDT, endDT):
+        # the instances of a recurring event in the window, expanded locally when possible
+        masterID = master['id']
+        etag = _Fingerprint(master)
+        cached = self._series.get(masterID, None)
+        if cached is None or cached[0] != etag:
+            try:
+                series = _RecurringSeries(master)
+            except _UnsupportedRecurrence as e:
+                self.print('Letting google expand', masterID, e)
+                series = None
+            cached = self._series[masterID] = (etag, series)
+
+        if cached[1] is not None:
+            return cached[1].GetInstances(startDT.timestamp(), endDT.timestamp())
+        return self._FetchInstances(master, startDT, endDT)
+
+    def _FetchInstances(self, master, startDT, endDT):
+        # the instances of a series _RecurringSeries can not expand, from the events/{id}/instances endpoint
+        timeMin = _ToUTCString(startDT)
+        timeMax = _ToUTCString(endDT)
+        etag = _Fingerprint(master)
+        cached = self._fallbackInstances.get(master['id'], None)
+        if cached is not None and cached[:3] == (etag, timeMin, timeMax):
+            return cached[3]
+
+        url = self._baseURL + 'calendars/{}/events/{}/instances'.format(
+            self._GetCalendarID(),
+            urllib.parse.quote(master['id'], safe=''),
+        )
+        params = {
+            'timeMin': timeMin,
+            'timeMax': timeMax,
+            'maxResults': self._maxResults,
+            'fields': self._fields['recurringEvents'],  # with originalStartTime, to leave out the exceptions
+        }
+        instances = []
+        while True:
+            resp = self._DoRequest(method='get', url=url, params=params, callType='instances')
+            if not resp.ok:
+                raise _RequestError(resp)
+            page = resp.json()
+            instances.extend(instance for instance in page.get('items', []) if instance.get('status', None) != 'cancelled')
+            if not page.get('nextPageToken', None):
+                break
+            params['pageToken'] = page['nextPageToken']
+
+        self._fallbackInstances[master['id']] = (etag, timeMin, timeMax, instances)
+        return instances
+
+    def _ItemFromJSON(self, item):
+        '''
+        Converts a Google "calendar#event" resource to a _CalendarItem
+
+        :param item: dict
+        :return: _CalendarItem
+        '''
+        hasAttachments = 'attachments' in item.keys()
+
+        return _CalendarItem(
+            startDT=_ParseEventTime(item['start']),
+            endDT=_ParseEventTime(item['end']),
+            data={
+                'ItemId': item.get('id'),
+                'Subject': item.get('summary'),
+                'OrganizerName': item['creator']['email'],
+                'HasAttachments': hasAttachments,
+                'attachments': item.get('attachments', []),
+            },
+            parentCalendar=self,
+        )
+
+    def CreateCalendarEvent(self, subject, body, startDT, endDT):
+        resp = self._DoRequest(
+            method='POST',
+            url=self._baseURL + 'calendars/{calendarID}/events'.format(
+                calendarID=self._GetCalendarID(),
+            ),
+            json=self._GetCreateEventData(subject, body, startDT, endDT),
+            params={'fields': self._fields['event']},
+            callType='event',
+        )
+        self.print('resp=', _Lazy(lambda: resp.text))
+
+        if resp.ok:
+            self._RegisterEventResponse(resp.json())
+
+    def _GetCreateEventData(self, subject, body, startDT, endDT):
+        timezone = time.tzname[-1] if len(time.tzname) > 1 else time.tzname[0]
+        self.print('timezone=', timezone)
+
+        data = {
+            "kind": "calendar#event",
+            "summary": subject,  # meeting subject
+            "description": body,  # meeting body
+            "start": {
+                # "dateTime": startDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
+                "dateTime": datetime.datetime.utcfromtimestamp(startDT.timestamp()).isoformat() + '+00:00',
+            },
+            "end": {
+                # "dateTime": endDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
+                "dateTime": datetime.datetime.utcfromtimestamp(endDT.timestamp()).isoformat() + '+00:00',
+            },
+        }
+        self.print('data=', data)
+        return data
+
+    def ChangeEventTime(self, calItem, newStartDT=None, newEndDT=None):
+        self.print('ChangeEventTime(', calItem, 'newStartDT=', newStartDT, ', newEndDT=', newEndDT)
+        # url = 'http://192.168.68.105'
+        url = self._baseURL + 'calendars/{calendarId}/events/{eventId}'.format(
+            calendarId=self._GetCalendarID(),
+            eventId=urllib.parse.quote(calItem.Get('ItemId'), safe='')
+        )
+
+        resp = self._DoRequest(
+            method='PATCH',
+            url=url,
+            json=self._GetChangeEventData(newStartDT, newEndDT),
+            params={'fields': self._fields['event']},
+            callType='event',
+        )
+        self.print('resp=', _Lazy(lambda: resp.text))
+
+        if resp.ok:
+            self._RegisterEventResponses([resp.json()], replaced=[calItem])
+
+    def _GetChangeEventData(self, newStartDT=None, newEndDT=None):
+        data = {
+        }
+
+        if newStartDT:
+            data['start'] = {
+                # "dateTime": newStartDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
+                "dateTime": datetime.datetime.utcfromtimestamp(newStartDT.timestamp()).isoformat() + '+00:00',
+            }
+
+        if newEndDT:
+            data['end'] = {
+                # "dateTime": newEndDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
+                "dateTime": datetime.datetime.utcfromtimestamp(newEndDT.timestamp()).isoformat() + '+00:00',
+            }
+
+        return data
+
+    def _RegisterEventResponse(self, item):
+        # save the calendar item returned by a POST/PATCH into memory
+        return self._RegisterEventResponses([item])[0]
+
+    def _RegisterEventResponses(self, items, replaced=()):
+        '''
+        Saves the calendar items returned by POST/PATCH requests into memory, with a single RegisterCalendarItems call.
+
+        :param items: list of "calendar#event" dicts
+        :param replaced: list of _CalendarItem, the previous version of the events that were moved
+        :return: list of _CalendarItem, in the same order as items
+        '''
+        events = []
+        for item in items:
+            event = self._ItemFromJSON(item)
+            self._items[event.Get('ItemId')] = event
+            self._fingerprints[event.Get('ItemId')] = _Fingerprint(item)
+            events.append(event)
+
+        if not events:
+            return events
+
+        if self._eventStore:
+            for item in items:
+                self._eventStore.Put(item)
+
+        # the window covers the new and the old times, so moved events do not show up twice
+        window = events + list(replaced)
+        startDT = min(event.Get('Start') for event in window)
+        endDT = max(event.Get('End') for event in window)
+
+        # RegisterCalendarItems replaces everything in the window, pass along the events it would otherwise drop
+        newIDs = set(event.Get('ItemId') for event in events)
+        with self._indexLock:
+            others = [
+                event for event in self._GetIndex().GetOverlapping(startDT.timestamp(), endDT.timestamp())
+                if event.Get('ItemId') not in newIDs
+            ]
+
+        self.RegisterCalendarItems(
+            calItems=others + events,
+            startDT=startDT,
+            endDT=endDT,
+        )
+        return events
+
+    def CreateCalendarEvents(self, events):
+        '''
+        Creates many events with batch requests (up to MAX_BATCH_SIZE events per HTTP request)
+
+        :param events: list of tuples like (subject, body, startDT, endDT)
+        :return: list with, for each event in the same order, the new _CalendarItem or the exception that made it fail
+        '''
+        requests = [
+            ('POST', 'events', self._GetCreateEventData(subject, body, startDT, endDT))
+            for subject, body, startDT, endDT in events
+        ]
+        return self._SendEventBatch(requests)
+
+    def ChangeEventTimes(self, changes):
+        '''
+        Moves many events with batch requests (up to MAX_BATCH_SIZE events per HTTP request)
+
+        :param changes: list of tuples like (calItem, newStartDT, newEndDT), newStartDT/newEndDT can be None
+        :return: list with, for each change in the same order, the updated _CalendarItem or the exception that made it fail
+        '''
+        requests = [
+            ('PATCH', 'events/{}'.format(urllib.parse.quote(calItem.Get('ItemId'), safe='')),
+             self._GetChangeEventData(newStartDT, newEndDT))
+            for calItem, newStartDT, newEndDT in changes
+        ]
+        return self._SendEventBatch(requests, replaced=[calItem for calItem, _, _ in changes])
+
+    def _SendEventBatch(self, requests, replaced=()):
+        '''
+        Sends event requests in batches, then registers all the events that succeeded at once.
+
+        :param requests: list of tuples like (method, path, jsonBody), path is relative to the calendar, like "events/{id}"
+        :param replaced: list of _CalendarItem, the previous version of the changed events
+        :return: list of _CalendarItem or exception, in the same order as requests
+        '''
+        calendarID = self._GetCalendarID()
+        if calendarID is None:
+            raise PermissionError('Error resolving calendar ID "{}"'.format(self.calendarName))
+
+        query = urllib.parse.urlencode({'fields': self._fields['event']})
+        results = [None] * len(requests)
+        for first in range(0, len(requests), MAX_BATCH_SIZE):
+            chunk = requests[first:first + MAX_BATCH_SIZE]
+            body, contentType = _BuildBatchBody([
+                (
+                    str(first + index),
+                    method,
+                    '/calendar/v3/calendars/{}/{}?{}'.format(urllib.parse.quote(calendarID, safe='@'), path, query),
+                    jsonBody,
+                )
+                for index, (method, path, jsonBody) in enumerate(chunk)
+            ])
+
+            try:
+                resp = self._DoRequest(
+                    method='POST',
+                    url=self._batchURL,
+                    data=body,
+                    headers={'Content-Type': contentType},
+                    quotaCost=len(chunk),
+                    callType='batch',
+                )
+                if not resp.ok:
+                    raise _RequestError(resp)
+                parts = _ParseBatchResponse(resp)
+            except (_RequestError, _CircuitOpenError, OSError, ValueError) as e:
+                # OSError: connection refused/reset, timeout... once the retries ran out
+                # ValueError: the multipart response could not be parsed
+                # every request of the chunk failed, the other chunks are still sent
+                self.print('_SendEventBatch error', e)
+                for index in range(first, first + len(chunk)):
+                    results[index] = e
+                continue
+
+            for index in range(first, first + len(chunk)):
+                part = parts.get(str(index), None)
+                if part is None:
+                    results[index] = _RequestError(resp)
+                elif not part.ok:
+                    results[index] = _RequestError(part)
+                else:
+                    results[index] = part.json()
+
+        succeeded = [index for index, result in enumerate(results) if isinstance(result, dict)]
+        events = self._RegisterEventResponses(
+            [results[index] for index in succeeded],
+            replaced=[replaced[index] for index in succeeded if index < len(replaced)],
+        )
+        for index, event in zip(succeeded, events):
+            results[index] = event
+
+        return results
+
+    def GetAttachments(self, item):
+        ret = []
+        for d in item.Get('attachments'):
+            ret.append(
+                _Attachment(
+                    AttachmentId=d['fileId'],
+                    name=d['title'],
+                    parentExchange=self,
+                    **d,
+                )
+            )
+        return ret
+
+    def Watch(self, address, token=None, ttl=None):
+        '''
+        Asks google to send a notification to "address" when an event in this calendar changes.
+        Google only delivers to HTTPS addresses that are reachable from the internet,
+            usually a reverse proxy in front of a GooglePushReceiver.
+
+        :param address: str, like "https://example.com/google/notifications"
+        :param token: str, echoed back by google in the X-Goog-Channel-Token header
+        :param ttl: int, seconds the channel should live (google may shorten it)
+        :return: dict, the channel (id, resourceId, expiration) or None if it failed
+        '''
+        data = {
+            'id': uuid.uuid4().hex,
+            'type': 'web_hook',
+            'address': address,
+        }
+        if token:
+            data['token'] = token
+        if ttl:
+            data['params'] = {'ttl': str(int(ttl))}
+
+        resp = self._DoRequest(
+            method='POST',
+            url=self._baseURL + 'calendars/{}/events/watch'.format(self._GetCalendarID()),
+            json=data,
+            params={'fields': self._fields['watch']},
+            callType='watch',
+        )
+        self.print('Watch resp=', _Lazy(lambda: resp.text))
+        if not resp.ok:
+            return None
+
+        self.StopWatch()
+        self._channel = resp.json()
+        return self._channel
+
+    def StopWatch(self):
+        if self._channel:
+            channel, self._channel = self._channel, None
+            resp = self._SendRequest(
+                method='POST',
+                url=self._baseURL + 'channels/stop',
+                json={'id': channel['id'], 'resourceId': channel['resourceId']},
+                callType='watch',
+            )
+            self.print('StopWatch resp=', resp.status_code)
+
+    @property
+    def ChannelExpiration(self):
+        # time.time() when the push channel expires, or None
+        if self._channel and self._channel.get('expiration', None):
+            return int(self._channel['expiration']) / 1000
+        return None
+
+    def GetSuggestedPollInterval(self, minInterval=15, maxInterval=600):
+        '''
+        How long to wait before the next UpdateCalendar.
+        Poll often when an event is about to start/end or when the calendar changes often,
+            back off when the room is idle or when push notifications are active.
+
+        :param minInterval: int seconds
+        :param maxInterval: int seconds
+        :return: float seconds
+        '''
+        if self._channel and (self.ChannelExpiration or 0) > time.time():
+            # changes are pushed, polling is only a safety net
+            return maxInterval
+
+        # time until the next event starts or ends
+        now = datetime.datetime.now()
+        untilNextBoundary = None
+        for event in self._items.values():
+            for dt in (event.Get('Start'), event.Get('End')):
+                if dt > now:
+                    seconds = (dt - now).total_seconds()
+                    if untilNextBoundary is None or seconds < untilNextBoundary:
+                        untilNextBoundary = seconds
+                    break
+
+        interval = maxInterval
+        if untilNextBoundary is not None:
+            # be up to date a few minutes before the boundary
+            interval = min(interval, max(minInterval, (untilNextBoundary - 300) / 2))
+
+        # how often the calendar changed recently
+        recent = [t for t in self._changeTimes if time.monotonic() - t < 3600]
+        if recent:
+            interval = min(interval, max(minInterval, 3600 / (len(recent) * 4)))
+
+        return interval
+
+
+class GooglePushReceiver:
+    '''
+    Small HTTP server that receives google push notifications and updates the matching GoogleCalendar right away.
+    The channels are registered with GoogleCalendar.Watch and renewed before they expire.
+    Google requires a public HTTPS address, so "publicAddress" is usually a reverse proxy that forwards to "port".
+    '''
+
+    def __init__(self, publicAddress, port=8080, calendars=None, ttl=7 * 24 * 3600, renewBefore=3600, debug=False):
+        '''
+
+        :param publicAddress: str, the https url google should send the notifications to
+        :param port: int, the local port to listen on
+        :param calendars: list of GoogleCalendar
+        :param ttl: int, requested life of each channel in seconds
+        :param renewBefore: int, renew each channel this many seconds before it expires
+        :param debug: bool
+        '''
+        self._publicAddress = publicAddress
+        self._port = port
+        self._ttl = ttl
+        self._renewBefore = renewBefore
+        self._debug = debug
+
+        self._token = uuid.uuid4().hex  # only accept notifications for our channels
+        self._lock = threading.Lock()
+        self._calendars = list(calendars or [])
+        self._pending = set()  # GoogleCalendar objects with an update in progress
+
+        self._server = None
+        self._stop = threading.Event()
+
+    def __str__(self):
+        return '<GooglePushReceiver: port={}, {} calendars>'.format(self._port, len(self._calendars))
+
+    def print(self, *a, **k):
+        if self._debug:
+            print(*a, **k)
+
+    def Add(self, calendar):
+        with self._lock:
+            if calendar not in self._calendars:
+                self._calendars.append(calendar)
+        if self._server:
+            self._Renew(calendar)
+
+    def Start(self):
+        import http.server
+
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0) or 0)
+                if length:
+                    self.rfile.read(length)
+                self.send_response(200)
+                self.end_headers()
+                receiver._HandleNotification(
+                    channelID=self.headers.get('X-Goog-Channel-ID', None),
+                    state=self.headers.get('X-Goog-Resource-State', None),
+                    token=self.headers.get('X-Goog-Channel-Token', None),
+                )
+
+            def log_message(self, *a):
+                receiver.print(*a)
+
+        self._stop.clear()
+        self._server = http.server.HTTPServer(('', self._port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._RenewLoop, daemon=True).start()
+
+    def Stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for calendar in list(self._calendars):
+            calendar.StopWatch()
+
+    def _HandleNotification(self, channelID, state, token):
+        self.print('notification channelID={}, state={}'.format(channelID, state))
+        if token != self._token or state == 'sync':
+            # "sync" is sent once when the channel is created, nothing changed
+            return
+
+        for calendar in list(self._calendars):
+            if calendar._channel and calendar._channel.get('id', None) == channelID:
+                with self._lock:
+                    if calendar in self._pending:
+                        # an update is already on its way, it will pick up this change too
+                        return
+                    self._pending.add(calendar)
+                threading.Thread(target=self._Update, args=(calendar,), daemon=True).start()
+                return
+
+    def _Update(self, calendar):
+        try:
+            calendar.UpdateCalendar()
+        except Exception as e:
+            ProgramLog('GooglePushReceiver error updating {}: {}'.format(calendar, e))
+        finally:
+            with self._lock:
+                self._pending.discard(calendar)
+
+    def _Renew(self, calendar):
+        try:
+            channel = calendar.Watch(self._publicAddress, token=self._token, ttl=self._ttl)
+            self.print('watching', calendar, channel)
+        except Exception as e:
+            ProgramLog('GooglePushReceiver error watching {}: {}'.format(calendar, e))
+
+    def _RenewLoop(self):
+        while not self._stop.is_set():
+            for calendar in list(self._calendars):
+                expiration = calendar.ChannelExpiration
+                if expiration is None or expiration - time.time() < self._renewBefore:
+                    self._Renew(calendar)
+            self._stop.wait(60)
+
+
+class GoogleCalendarPool:
+    '''
+    Polls many GoogleCalendar objects at once.
+    The events requests of all the rooms are grouped into Google batch requests
+        (up to MAX_BATCH_SIZE rooms per HTTP request) and the responses are handed back to each GoogleCalendar.
+    Rooms whose response does not fit in one page, or whose request failed, fall back to their own UpdateCalendar.
+    '''
+
+    def __init__(self, calendars=None, debug=False):
+        self._calendars = list(calendars or [])
+        self._debug = debug
+
+    def __str__(self):
+        return '<GoogleCalendarPool: {} calendars>'.format(len(self._calendars))
+
+    def print(self, *a, **k):
+        if self._debug:
+            print(*a, **k)
+
+    def Add(self, calendar):
+        if calendar not in self._calendars:
+            self._calendars.append(calendar)
+
+    def Remove(self, calendar):
+        if calendar in self._calendars:
+            self._calendars.remove(calendar)
+
+    def UpdateAll(self, startDT=None, endDT=None):
+        '''
+        Same as calling UpdateCalendar(startDT=startDT, endDT=endDT) on every calendar in the pool
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :return:
+        '''
+        defaultStartDT, defaultEndDT = _GetDefaultWindow()
+        startDT = startDT or defaultStartDT
+        endDT = endDT or defaultEndDT
+
+        # one batch can only carry one Authorization header, so group by account
+        byAccount = {}
+        for calendar in self._calendars:
+            byAccount.setdefault(calendar._accountKey, []).append(calendar)
+
+        for calendars in byAccount.values():
+            for i in range(0, len(calendars), MAX_BATCH_SIZE):
+                self._UpdateBatch(calendars[i:i + MAX_BATCH_SIZE], startDT, endDT)
+
+    def _UpdateBatch(self, calendars, startDT, endDT):
+        claimed = []  # the calendars updated by this batch, see GoogleCalendar._BeginUpdate
+        try:
+            for calendar in calendars:
+                # a calendar that another thread is updating will go once more with this window
+                if not calendar._UsesTiles() and calendar._BeginUpdate(None, startDT, endDT):
+                    claimed.append(calendar)
+            self._UpdateClaimed(claimed, startDT, endDT)
+        finally:
+            for calendar in claimed:
+                try:
+                    calendar._FinishUpdate()
+                except Exception as e:
+                    ProgramLog('GoogleCalendarPool error updating {}: {}'.format(calendar, e))
+
+        for calendar in calendars:
+            if calendar._UsesTiles():
+                # reads only the stale days, with its own requests
+                try:
+                    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+                except Exception as e:
+                    ProgramLog('GoogleCalendarPool error updating {}: {}'.format(calendar, e))
+
+    def _UpdateClaimed(self, calendars, startDT, endDT):
+        requests = []
+        contentIDs = {}  # contentID > GoogleCalendar
+        urls = {}  # contentID > (url, params) of the events request, for the ETag
+        for index, calendar in enumerate(calendars):
+            calendarID = calendar._GetCalendarID()
+            if calendarID is None:
+                self.print('Could not resolve calendar ID for', calendar)
+                continue
+
+            contentID = str(index)
+            contentIDs[contentID] = calendar
+            params = calendar._GetEventsParams(startDT, endDT)
+            k = {'url': calendar._baseURL + 'calendars/{}/events'.format(calendarID), 'params': params}
+            calendar._AddValidator(k)
+            requests.append((
+                contentID,
+                'GET',
+                '/calendar/v3/calendars/{}/events?{}'.format(
+                    urllib.parse.quote(calendarID, safe='@'),
+                    urllib.parse.urlencode(params),
+                ),
+                None,
+                k.get('headers', {}),
+            ))
+            urls[contentID] = (k['url'], params)
+
+        if not requests:
+            return
+
+        body, contentType = _BuildBatchBody(requests)
+        first = contentIDs[requests[0][0]]
+        start = time.monotonic()
+        try:
+            resp = first._DoRequest(
+                method='POST',
+                url=first._batchURL,
+                data=body,
+                headers={'Content-Type': contentType},
+                quotaCost=len(requests),
+                callType='batch',
+            )
+            if not resp.ok:
+                raise _RequestError(resp)
+            parts = _ParseBatchResponse(resp)
+        except Exception as e:
+            self.print('GoogleCalendarPool batch failed', e)
+            for calendar in contentIDs.values():
+                calendar._NewConnectionStatus('Disconnected')
+                if calendar._metricsSinks:
+                    calendar._EmitUpdate(start, e)
+            return
+
+        for contentID, calendar in contentIDs.items():
+            # one room that fails must not keep the others from being updated
+            try:
+                self._ApplyPart(calendar, parts.get(contentID, None), urls[contentID], start, startDT, endDT)
+            except Exception as e:
+                ProgramLog('GoogleCalendarPool error updating {}: {}'.format(calendar, e))
+
+    def _ApplyPart(self, calendar, part, validator, start, startDT, endDT):
+        '''
+        Applies the events list of one room of the batch, or lets the room update on its own
+
+        :param calendar: GoogleCalendar
+        :param part: _BatchResponse or None
+        :param validator: (url, params) of the room's events request, for the ETag
+        :param start: float, time.monotonic() when the batch was sent, for the 'update' metrics record
+        :param startDT: datetime
+        :param endDT: datetime
+        '''
+        if part is None or not part.ok:
+            # 410 (expired syncToken), rate limit, etc. let the calendar handle it on its own (with backoff)
+            self.print('GoogleCalendarPool part', calendar, part)
+            calendar._UpdateCalendar(None, startDT, endDT)  # emits its own 'update' record
+            return
+
+        calendar._NewConnectionStatus('Connected')
+        page = None if part.status_code == 304 else part.json()
+        if page is not None and page.get('nextPageToken', None):
+            # more than one page, simplest to let the calendar page through it
+            calendar._UpdateCalendar(None, startDT, endDT)
+            return
+
+        error = None
+        try:
+            if page is None:
+                calendar._OnNotModified()
+            else:
+                calendar._nextSyncToken = page.get('nextSyncToken', None)
+                calendar._ApplyEventItems(page.get('items', []), startDT, endDT)
+                calendar._SaveValidator(validator[0], validator[1], part.headers.get('ETag', None))
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if calendar._metricsSinks:
+                calendar._EmitUpdate(start, error)
+
+
+class GoogleCalendarScheduler:
+    '''
+    Keeps many GoogleCalendar objects up to date by calling UpdateCalendar from a bounded pool of threads,
+        so one slow room does not hold up the others.
+    Every room is polled once per interval. The first polls are spread over the interval and each
+        following poll is randomly moved by up to +/- jitter * interval, so the rooms do not all poll at the same time.
+    At most maxPerAccount rooms of the same account are updated at the same time.
+    '''
+
+    def __init__(
+            self,
+            calendars=None,
+            interval=60,
+            maxWorkers=8,
+            maxPerAccount=4,
+            jitter=0.1,
+            adaptive=False,
+            minInterval=15,
+            maxInterval=600,
+            debug=False,
+    ):
+        '''
+
+        :param calendars: list of GoogleCalendar
+        :param interval: int, seconds between two updates of the same room
+        :param maxWorkers: int, max number of rooms being updated at the same time
+        :param maxPerAccount: int, max number of rooms of the same account being updated at the same time
+        :param jitter: float, fraction of the interval to randomly add/remove to each poll
+        :param adaptive: bool, True to let each room choose its interval with GetSuggestedPollInterval
+            (between minInterval and maxInterval) instead of using "interval"
+        :param minInterval: int seconds
+        :param maxInterval: int seconds
+        :param debug: bool
+        '''
+        self._interval = interval
+        self._maxWorkers = maxWorkers
+        self._maxPerAccount = maxPerAccount
+        self._jitter = jitter
+        self._adaptive = adaptive
+        self._minInterval = minInterval
+        self._maxInterval = maxInterval
+        self._debug = debug
+
+        self._lock = threading.Lock()
+        self._calendars = []
+        self._nextPoll = {}  # GoogleCalendar > time.monotonic() of its next update
+        self._inFlight = set()  # GoogleCalendar objects being updated now
+        self._accountSemaphores = {}  # accountKey > threading.BoundedSemaphore
+        self._latencies = {}  # calendarName > seconds the last UpdateCalendar took
+
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+        for calendar in calendars or []:
+            self.Add(calendar)
+
+    def __str__(self):
+        return '<GoogleCalendarScheduler: {} calendars, interval={}>'.format(len(self._calendars), self._interval)
+
+    def print(self, *a, **k):
+        if self._debug:
+            print(*a, **k)
+
+    def Add(self, calendar):
+        with self._lock:
+            if calendar not in self._calendars:
+                self._calendars.append(calendar)
+                # spread the first polls over the interval
+                self._nextPoll[calendar] = time.monotonic() + random.uniform(0, self._interval)
+        self._wake.set()
+
+    def Remove(self, calendar):
+        with self._lock:
+            if calendar in self._calendars:
+                self._calendars.remove(calendar)
+                self._nextPoll.pop(calendar, None)
+
+    def Start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._maxWorkers)
+            self._thread = threading.Thread(target=self._Loop, daemon=True)
+            self._thread.start()
+
+    def Stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def UpdateAll(self, startDT=None, endDT=None):
+        '''
+        Updates every room once, right now, and waits for all of them to finish.
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :return: float, seconds the whole cycle took
+        '''
+        startTime = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._maxWorkers) as executor:
+            futures = [
+                executor.submit(self._Update, calendar, startDT, endDT)
+                for calendar in list(self._calendars)
+            ]
+            concurrent.futures.wait(futures)
+        return time.monotonic() - startTime
+
+    def GetLatencies(self):
+        '''
+        :return: dict like {calendarName: seconds the last UpdateCalendar took}
+        '''
+        with self._lock:
+            return self._latencies.copy()
+
+    def _GetSemaphore(self, calendar):
+        with self._lock:
+            semaphore = self._accountSemaphores.get(calendar._accountKey, None)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self._maxPerAccount)
+                self._accountSemaphores[calendar._accountKey] = semaphore
+            return semaphore
+
+    def _Update(self, calendar, startDT=None, endDT=None):
+        with self._GetSemaphore(calendar):
+            startTime = time.monotonic()
+            try:
+                calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+            except Exception as e:
+                ProgramLog('GoogleCalendarScheduler error updating {}: {}'.format(calendar, e))
+                calendar._NewConnectionStatus('Disconnected')
+            latency = time.monotonic() - startTime
+
+        if self._adaptive:
+            interval = calendar.GetSuggestedPollInterval(self._minInterval, self._maxInterval)
+        else:
+            interval = self._interval
+
+        self.print('{} updated in {:.3f}s, next in {:.0f}s'.format(calendar.calendarName, latency, interval))
+        with self._lock:
+            self._latencies[calendar.calendarName] = latency
+            self._inFlight.discard(calendar)
+            if calendar in self._nextPoll:
+                self._nextPoll[calendar] = startTime + interval * (1 + random.uniform(-self._jitter, self._jitter))
+        self._wake.set()
+
+    def _Loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                due = [
+                    calendar for calendar, nextPoll in self._nextPoll.items()
+                    if nextPoll <= now and calendar not in self._inFlight
+                ]
+                self._inFlight.update(due)
+                waiting = [
+                    nextPoll for calendar, nextPoll in self._nextPoll.items()
+                    if calendar not in self._inFlight
+                ]
+
+            for calendar in due:
+                self._executor.submit(self._Update, calendar)
+
+            # sleep until the next room is due, or until a room finishes/is added
+            timeout = max(0, min(waiting) - time.monotonic()) if waiting else self._interval
+            self._wake.wait(timeout)
+
+
+class _CaseInsensitiveDict(dict):
+    # http headers
+    def __setitem__(self, key, value):
+        super().__setitem__(key.lower(), value)
+
+    def __getitem__(self, key):
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super().__contains__(key.lower())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+
+def ProgramLog(*a, **k):
+    # extronlib is imported on first use, importing this module should not wait for it
+    from extronlib.system import ProgramLog
+    return ProgramLog(*a, **k)
+
+
+def _ToJSONBytes(obj):
+    # for the functions that have a "json" kwarg, like requests
+    return json.dumps(obj).encode()
+
+
+class _AsyncResponse:
+    # quacks like a gs_requests response
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def __str__(self):
+        return '<_AsyncResponse: status_code={}>'.format(self.status_code)
+
+
+class _AsyncHTTPTransport:
+    '''
+    Minimal asyncio HTTP/1.1 client with a keep-alive connection pool, one per account.
+    Many requests can be in flight on one thread, at most poolSize connections are open per host.
+    '''
+    _transports = {}  # accountKey > _AsyncHTTPTransport
+    _transportsLock = threading.Lock()
+
+    @classmethod
+    def Get(cls, accountKey, poolSize=10, gzip=True):
+        with cls._transportsLock:
+            transport = cls._transports.get(accountKey, None)
+            if transport is None:
+                transport = cls._transports[accountKey] = cls(poolSize=poolSize, gzip=gzip)
+            return transport
+
+    def __init__(self, poolSize=10, gzip=True):
+        self._poolSize = poolSize
+        self._gzip = gzip
+        self._idle = {}  # (host, port, useSSL) > list of (reader, writer)
+        self._semaphores = {}  # (host, port, useSSL) > asyncio.Semaphore
+        self._sslContext = None
+        self._requestCount = 0
+        self._connectionsOpened = 0
+        self._transferStats = _TransferStats()
+
+    def __str__(self):
+        return '<_AsyncHTTPTransport: {}>'.format(self.GetStats())
+
+    def GetStats(self):
+        # same keys as _HTTPTransport.GetStats
+        stats = {
+            'requests': self._requestCount,
+            'connectionsOpened': self._connectionsOpened,
+        }
+        stats.update(self._transferStats.Get())
+        return stats
+
+    async def Request(self, method, url, params=None, headers=None, json=None, data=None, callType='other', timings=None,
+                      timeout=REQUEST_TIMEOUT):
+        '''
+        Same as _HTTPTransport.Request
+
+        :param timings: dict, if given the 'dns', 'connect', 'ttfb', 'bytesIn' and 'bytesOut' keys are set,
+            'dns' and 'connect' are 0 when an idle connection was reused
+        :param timeout: float, seconds to connect and to get the whole response,
+            raises TimeoutError (an OSError, like the sync transport's timeouts)
+        '''
+        parts = urllib.parse.urlsplit(url)
+        useSSL = parts.scheme == 'https'
+        host = parts.hostname
+        port = parts.port or (443 if useSSL else 80)
+        key = (host, port, useSSL)
+
+        path = parts.path or '/'
+        query = parts.query
+        if params:
+            query = '&'.join(q for q in (query, urllib.parse.urlencode(params)) if q)
+        if query:
+            path += '?' + query
+
+        body = b''
+        allHeaders = _CaseInsensitiveDict()
+        allHeaders['Host'] = host if parts.port is None else '{}:{}'.format(host, port)
+        allHeaders['Connection'] = 'keep-alive'
+        if self._gzip:
+            allHeaders['Accept-Encoding'] = 'gzip'
+            allHeaders['User-Agent'] = USER_AGENT
+        for k, v in (headers or {}).items():
+            allHeaders[k] = v
+
+        if json is not None:
+            body = _ToJSONBytes(json)
+            allHeaders['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = data.encode() if isinstance(data, str) else data
+        if body or method.upper() in ('POST', 'PUT', 'PATCH'):
+            allHeaders['Content-Length'] = str(len(body))
+
+        request = '{} {} HTTP/1.1\r\n'.format(method.upper(), path)
+        request += ''.join('{}: {}\r\n'.format(k, v) for k, v in allHeaders.items())
+        request = request.encode() + b'\r\n' + body
+
+        import asyncio  # imported here so importing this module stays fast, same for the other async code
+
+        semaphore = self._semaphores.get(key, None)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self._poolSize)
+
+        self._requestCount += 1
+        async with semaphore:
+            idle = self._idle.setdefault(key, [])
+            for attempt in range(2):
+                reused = bool(idle)
+                if reused:
+                    reader, writer = idle.pop()
+                    if timings is not None:
+                        timings['dns'] = timings['connect'] = 0
+                else:
+                    try:
+                        reader, writer = await asyncio.wait_for(self._Open(host, port, useSSL, timings), timeout)
+                    except asyncio.TimeoutError:
+                        raise TimeoutError('Timed out connecting to {}:{}'.format(host, port))
+                try:
+                    sentAt = time.monotonic()
+                    writer.write(request)
+                    await asyncio.wait_for(writer.drain(), timeout)
+                    resp, keepAlive, wireBytes = await asyncio.wait_for(
+                        self._ReadResponse(reader, method, timings, sentAt), timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        # the server closed the idle connection, try again on a new one
+                        continue
+                    raise
+                except asyncio.TimeoutError:
+                    # the connection may still get the late response, do not reuse it
+                    writer.close()
+                    raise TimeoutError('No response from {} {} in {}s'.format(method.upper(), url, timeout))
+
+                if keepAlive:
+                    idle.append((reader, writer))
+                else:
+                    writer.close()
+                self._transferStats.Add(callType, wireBytes, len(resp.content))
+                if timings is not None:
+                    timings['bytesIn'] = wireBytes
+                    timings['bytesOut'] = len(request)
+                return resp
+
+    async def _Open(self, host, port, useSSL, timings=None):
+        import asyncio
+        import ssl
+
+        if useSSL and self._sslContext is None:
+            self._sslContext = ssl.create_default_context()
+        self._connectionsOpened += 1
+        if timings is None:
+            return await asyncio.open_connection(host, port, ssl=self._sslContext if useSSL else None)
+
+        # resolve separately so the DNS and the TCP/TLS times can be told apart
+        start = time.monotonic()
+        infos = await asyncio.get_event_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        timings['dns'] = time.monotonic() - start
+
+        start = time.monotonic()
+        ret = await asyncio.open_connection(
+            infos[0][4][0],
+            port,
+            ssl=self._sslContext if useSSL else None,
+            server_hostname=host if useSSL else None,
+        )
+        timings['connect'] = time.monotonic() - start
+        return ret
+
+    async def _ReadResponse(self, reader, method, timings=None, sentAt=None):
+        statusLine = await reader.readline()
+        if not statusLine:
+            raise ConnectionError('Connection closed')
+        if timings is not None:
+            timings['ttfb'] = time.monotonic() - sentAt
+        version, statusCode = statusLine.decode('latin-1').split(' ')[:2]
+
+        headers = _CaseInsensitiveDict()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, val = line.decode('latin-1').partition(':')
+            headers[key.strip()] = val.strip()
+
+        keepAlive = headers.get('Connection', '').lower() != 'close' and version != 'HTTP/1.0'
+        statusCode = int(statusCode)
+
+        if method.upper() == 'HEAD' or statusCode in (204, 304) or 100 <= statusCode < 200:
+            content = b''
+        elif headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b''.join(chunks)
+        elif 'Content-Length' in headers:
+            content = await reader.readexactly(int(headers['Content-Length']))
+        else:
+            content = await reader.read()
+            keepAlive = False
+
+        wireBytes = len(content)
+        if headers.get('Content-Encoding', '').lower() == 'gzip':
+            content = gzip.decompress(content)
+
+        return _AsyncResponse(statusCode, headers, content), keepAlive, wireBytes
+
+
+_asyncLoop = None
+_asyncLoopThread = None
+_asyncLoopLock = threading.Lock()
+
+
+def _GetAsyncLoop():
+    # one event loop, running in its own thread, shared by all the AsyncGoogleCalendar objects
+    import asyncio
+
+    global _asyncLoop, _asyncLoopThread
+    with _asyncLoopLock:
+        if _asyncLoop is None:
+            _asyncLoop = asyncio.new_event_loop()
+            _asyncLoopThread = threading.Thread(target=_asyncLoop.run_forever, daemon=True)
+            _asyncLoopThread.start()
+        return _asyncLoop
+
+
+class AsyncGoogleCalendar(GoogleCalendar):
+    '''
+    GoogleCalendar whose requests are coroutines running on one shared asyncio event loop and connection pool,
+        so one process can keep thousands of rooms up to date without a thread per request.
+    Use the ...Async coroutines from the loop returned by GetLoop(),
+        or the usual UpdateCalendar/CreateCalendarEvent/ChangeEventTime from any other thread.
+    '''
+
+    def __init__(self, *a, asyncTransport=None, **k):
+        super().__init__(*a, **k)
+        self._asyncTransport = asyncTransport or _AsyncHTTPTransport.Get(self._accountKey)
+
+    def __str__(self):
+        return '<AsyncGoogleCalendar: RoomName={}, LastUpdated={}>'.format(
+            self.calendarName,
+            self.LastUpdated,
+        )
+
+    def GetLoop(self):
+        # the loop thread is started by the first call, not by the constructor
+        return _GetAsyncLoop()
+
+    def _RunSync(self, coro):
+        import asyncio
+
+        # blocking wrapper for the sync API
+        if threading.current_thread() is _asyncLoopThread:
+            raise RuntimeError('Use the "...Async" coroutines from inside the event loop')
+        return asyncio.run_coroutine_threadsafe(coro, self.GetLoop()).result()
+
+    async def _SendRequestAsync(self, method, url, headers=None, quotaCost=1, **k):
+        # same as _SendRequest, but waits with asyncio.sleep so the loop keeps serving the other rooms
+        if not self._metricsSinks:
+            return await self._SendWithRetriesAsync(method, url, headers, quotaCost, None, **k)
+
+        record = self._NewRequestRecord(method, k)
+        start = time.monotonic()
+        try:
+            resp = await self._SendWithRetriesAsync(method, url, headers, quotaCost, record, **k)
+            record['status'] = resp.status_code
+            return resp
+        except Exception as e:
+            record['error'] = repr(e)
+            raise
+        finally:
+            record['total'] = time.monotonic() - start
+            self._Emit(record)
+
+    async def _SendWithRetriesAsync(self, method, url, headers, quotaCost, record, **k):
+        import asyncio
+
+        headers = dict(headers or {})
+        headers.setdefault('Accept', 'application/json')
+
+        attempt = 0
+        tokenRefreshed = False
+        while True:
+            if record is not None:
+                record['retries'] = attempt
+
+            if not self._breaker.Allow():
+                self._NewConnectionStatus('Disconnected')
+                raise _CircuitOpenError('Too many failed requests, not sending "{} {}"'.format(method, url))
+
+            delay = self._GetRateLimitDelay(quotaCost)
+            if delay:
+                await asyncio.sleep(delay)
+
+            # only go to another thread when the token has to be fetched
+            token = self._tokenCache.GetToken(wait=False) or await self.GetLoop().run_in_executor(
+                None, self._tokenCache.GetToken)
+            headers['Authorization'] = 'Bearer {}'.format(token)
+
+            try:
+                resp = await self._asyncTransport.Request(method, url, headers=headers, timings=record, **k)
+            except OSError as e:
+                self._breaker.RecordFailure()
+                if attempt >= self._maxRetries:
+                    raise
+                self.print('_SendRequestAsync error', e)
+                await asyncio.sleep(self._GetRetryDelay(None, attempt))
+                attempt += 1
+                continue
+
+            if resp.status_code == 401 and not tokenRefreshed:
+                self.print('401, refreshing the access token')
+                self._tokenCache.Invalidate(token)
+                tokenRefreshed = True
+                continue
+
+            if not _IsRetryable(resp):
+                self._breaker.RecordSuccess()
+                return resp
+
+            self._breaker.RecordFailure()
+            if attempt >= self._maxRetries:
+                return resp
+
+            delay = self._GetRetryDelay(resp, attempt)
+            self.print('HTTP {}, retrying in {:.1f}s'.format(resp.status_code, delay))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _GetCalendarIDAsync(self):
+        if self._calendarID is None:
+            # the first request may have to crawl the calendar list (blocking requests and waits),
+            #   do not block the loop with it
+            return await self.GetLoop().run_in_executor(None, self._GetCalendarID)
+        return self._calendarID
+
+    async def _DoRequestAsync(self, method, url, conditional=False, **k):
+        self.print('_DoRequestAsync(', method, url, k)
+        if await self._GetCalendarIDAsync() is None:
+            raise PermissionError('Error resolving calendar ID "{}"'.format(self.calendarName))
+
+        if conditional:
+            k['url'] = url
+            self._AddValidator(k)
+            del k['url']
+        return await self._SendRequestAsync(method, url, **k)
+
+    async def UpdateCalendarAsync(self, calendar=None, startDT=None, endDT=None):
+        self.print('UpdateCalendarAsync(', calendar, startDT, endDT)
+        # same as UpdateCalendar, an update asked for while one is running is folded into it
+        if not self._BeginUpdate(calendar, startDT, endDT):
+            self.print('UpdateCalendarAsync already running, it will go once more when done')
+            return
+
+        again = (calendar, startDT, endDT)
+        try:
+            while again is not None:
+                await self._UpdateCalendarAsync(*again)
+                again = self._EndUpdate()
+        except BaseException:
+            self._EndUpdate(failed=True)
+            raise
+
+    async def _UpdateCalendarAsync(self, calendar, startDT, endDT):
+        defaultStartDT, defaultEndDT = _GetDefaultWindow()
+        startDT = startDT or defaultStartDT
+        endDT = endDT or defaultEndDT
+
+        start = time.monotonic()
+        error = None
+        try:
+            await self._PollEventsAsync(calendar, startDT, endDT)
+        except _CircuitOpenError as e:
+            # same as UpdateCalendar, nothing was sent
+            error = e
+            self.print('UpdateCalendarAsync', e)
+        except _RequestError as e:
+            error = e
+            self.print('UpdateCalendarAsync error', e)
+            raise
+        except Exception as e:
+            # PermissionError when the calendar ID can not be resolved, OSError when the retries ran out...
+            error = e
+            raise
+        finally:
+            if self._metricsSinks:
+                self._EmitUpdate(start, error)
+
+    async def _PollEventsAsync(self, calendar, startDT, endDT):
+        # raises _RequestError if the update failed
+        if self._UsesTiles():
+            # the tiles are read with the blocking requests, in a thread of the loop's executor
+            await self.GetLoop().run_in_executor(None, self._UpdateTiles, startDT, endDT)
+            return
+
+        url = self._baseURL + 'calendars/{}/events'.format(await self._GetCalendarIDAsync())
+        params = firstParams = self._GetEventsParams(startDT, endDT)
+
+        items = []
+        etag = None
+        self._decodeTime = 0
+        while True:
+            resp = await self._DoRequestAsync(
+                'get',
+                url,
+                params=params,
+                callType='events',
+                conditional=params is firstParams,
+            )
+
+            self._NewConnectionStatus('Connected' if resp.ok else 'Disconnected')
+            if resp.status_code == 304:
+                self._OnNotModified()
+                return
+
+            if not resp.ok:
+                if resp.status_code == 410 and self._syncToken:
+                    # the sync token is no longer valid, start over with a full sync (no syncToken, so no loop)
+                    self.print('syncToken expired, doing a full sync')
+                    self._ResetSync()
+                    return await self._PollEventsAsync(calendar, startDT, endDT)
+
+                if resp.status_code == 404:
+                    self._directory.Invalidate()
+                    self._calendarID = None
+
+                self.print('UpdateCalendarAsync error', resp.status_code, _Lazy(lambda: resp.text))
+                raise _RequestError(resp)
+
+            if params is firstParams:
+                etag = resp.headers.get('ETag', None)
+
+            decodeStart = time.perf_counter()
+            page = resp.json()
+            self._decodeTime += time.perf_counter() - decodeStart
+            items.extend(page.get('items', []))
+
+            pageToken = page.get('nextPageToken', None)
+            if pageToken is None:
+                self._nextSyncToken = page.get('nextSyncToken', None)
+                break
+            params = dict(params, pageToken=pageToken)
+
+        if self._expandRecurring:
+            # the series _RecurringSeries can not expand are read with the blocking requests (_FetchInstances),
+            #   in a thread of the loop's executor like the tiles
+            await self.GetLoop().run_in_executor(None, self._ApplyEventItems, items, startDT, endDT)
+        else:
+            self._ApplyEventItems(items, startDT, endDT)
+        self._SaveValidator(url, firstParams, etag)
+
+    async def CreateCalendarEventAsync(self, subject, body, startDT, endDT):
+        resp = await self._DoRequestAsync(
+            method='POST',
+            url=self._baseURL + 'calendars/{}/events'.format(await self._GetCalendarIDAsync()),
+            json=self._GetCreateEventData(subject, body, startDT, endDT),
+            params={'fields': self._fields['event']},
+            callType='event',
+        )
+        self.print('resp=', _Lazy(lambda: resp.text))
+
+        if resp.ok:
+            self._RegisterEventResponse(resp.json())
+
+    async def ChangeEventTimeAsync(self, calItem, newStartDT=None, newEndDT=None):
+        resp = await self._DoRequestAsync(
+            method='PATCH',
+            url=self._baseURL + 'calendars/{}/events/{}'.format(
+                await self._GetCalendarIDAsync(),
+                urllib.parse.quote(calItem.Get('ItemId'), safe=''),
+            ),
+            json=self._GetChangeEventData(newStartDT, newEndDT),
+            params={'fields': self._fields['event']},
+            callType='event',
+        )
+        self.print('resp=', _Lazy(lambda: resp.text))
+
+        if resp.ok:
+            self._RegisterEventResponses([resp.json()], replaced=[calItem])
+
+    async def GetAttachmentsAsync(self, item):
+        '''
+        Same as GetAttachments, but the Drive metadata (Name/Size) of all the attachments is fetched concurrently
+
+        :param item: _CalendarItem
+        :return: list of _Attachment
+        '''
+        import asyncio
+
+        attachments = self.GetAttachments(item)
+
+        async def FetchMetadata(attachment):
+            attachment._metadata = self._attachmentCache.GetMetadata(attachment.ID)
+            if attachment._metadata is not None:
+                return
+
+            resp = await self._SendRequestAsync(
+                'get',
+                self._driveURL + 'files/{}'.format(attachment.ID),
+                params={'fields': self._fields['driveFile']},
+                callType='driveFile',
+            )
+            if resp.ok:
+                attachment._metadata = resp.json()
+                self._attachmentCache.PutMetadata(attachment.ID, attachment._metadata)
+
+        await asyncio.gather(*[FetchMetadata(attachment) for attachment in attachments])
+        return attachments
+
+    # the sync API, thin wrappers around the coroutines
+
+    def _UpdateCalendar(self, calendar, startDT, endDT):
+        # called by UpdateCalendar once the calendar is claimed, so not through the claiming UpdateCalendarAsync
+        try:
+            return self._RunSync(self._UpdateCalendarAsync(calendar, startDT, endDT))
+        except _RequestError:
+            # like GoogleCalendar.UpdateCalendar, the error was printed and is in the 'update' metrics record
+            return
+
+    def CreateCalendarEvent(self, subject, body, startDT, endDT):
+        return self._RunSync(self.CreateCalendarEventAsync(subject, body, startDT, endDT))
+
+    def ChangeEventTime(self, calItem, newStartDT=None, newEndDT=None):
+        return self._RunSync(self.ChangeEventTimeAsync(calItem, newStartDT, newEndDT))
+
+
+async def UpdateCalendarsAsync(calendars, startDT=None, endDT=None, concurrency=100):
+    '''
+    Updates many AsyncGoogleCalendar objects concurrently, with at most "concurrency" updates in flight.
+    Must run on the shared loop (AsyncGoogleCalendar.GetLoop()).
+
+    :param calendars: list of AsyncGoogleCalendar
+    :param startDT: datetime
+    :param endDT: datetime
+    :param concurrency: int
+    :return: list, the exception raised for each calendar or None
+    '''
+    import asyncio
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def Update(calendar):
+        async with semaphore:
+            await calendar.UpdateCalendarAsync(startDT=startDT, endDT=endDT)
+
+    return await asyncio.gather(*[Update(calendar) for calendar in calendars], return_exceptions=True)
+
+
+_WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+
+class _UnsupportedRecurrence(ValueError):
+    # the recurrence uses something _RecurringSeries can not expand, google has to do it
+    pass
+
+
+class _RecurringSeries:
+    '''
+    The occurrences of one recurring event (the "master"), expanded locally from its RRULE/EXDATE lines.
+    Supported: one RRULE with FREQ=DAILY/WEEKLY/MONTHLY/YEARLY, INTERVAL, COUNT, UNTIL, WKST,
+        BYDAY (weekdays, or like "2TU"/"-1FR" for MONTHLY) and BYMONTHDAY, plus EXDATE.
+        Anything else (RDATE, BYSETPOS, BYMONTH...) raises _UnsupportedRecurrence.
+    The occurrences are computed in the event's time zone (with zoneinfo) or in the local one when they are the same,
+        so the meetings stay at the same wall clock time across DST changes.
+    The occurrences are generated lazily as the window moves forward, and the instance dicts are kept,
+        so polls that see the same master etag do not expand it again.
+    '''
+
+    def __init__(self, master):
+        self.etag = _Fingerprint(master)
+        self._master = master
+        self._allDay = 'date' in master['start']
+        self._zone = None
+
+        startTS = _ParseEventTime(master['start']).timestamp()
+        endTS = _ParseEventTime(master['end']).timestamp()
+        if not self._allDay:
+            timeZone = master['start'].get('timeZone', None)
+            if zoneinfo is not None and timeZone:
+                try:
+                    self._zone = zoneinfo.ZoneInfo(timeZone)
+                except Exception:
+                    raise _UnsupportedRecurrence('Unknown time zone {}'.format(timeZone))
+            elif _GetUTCOffset(master['start']['dateTime']) != _GetLocalUTCOffset(startTS):
+                raise _UnsupportedRecurrence('Time zone {} is not the local one'.format(timeZone))
+
+        self._start = self._ToWall(startTS)
+        self._duration = endTS - startTS  # seconds
+        self._days = datetime.timedelta(days=round(self._duration / 86400))  # all-day events
+
+        rules = []
+        self._exdates = set()  # walls
+        for line in master.get('recurrence', []):
+            name, _, value = line.partition(':')
+            params = name.split(';')
+            if params[0].upper() == 'RRULE':
+                rules.append(value)
+            elif params[0].upper() == 'EXDATE':
+                for date in value.split(','):
+                    self._exdates.add(self._ParseDate(date))
+            else:
+                raise _UnsupportedRecurrence(line)
+        if len(rules) != 1:
+            raise _UnsupportedRecurrence('{} RRULE'.format(len(rules)))
+
+        rule = dict(part.split('=', 1) for part in rules[0].upper().split(';') if part)
+        unsupported = set(rule.keys()) - {'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'WKST', 'BYDAY', 'BYMONTHDAY'}
+        if unsupported or rule.get('FREQ', None) not in ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'):
+            raise _UnsupportedRecurrence(rules[0])
+
+        self._freq = rule['FREQ']
+        self._interval = int(rule.get('INTERVAL', 1))
+        self._count = int(rule['COUNT']) if 'COUNT' in rule else None
+        self._until = self._ParseDate(rule['UNTIL']) if 'UNTIL' in rule else None
+        self._wkst = _WEEKDAYS[rule.get('WKST', 'MO')]
+        self._byMonthDay = [int(day) for day in rule['BYMONTHDAY'].split(',')] if 'BYMONTHDAY' in rule else None
+        self._byDay = []  # list of (ordinal or None, weekday)
+        for day in rule['BYDAY'].split(',') if 'BYDAY' in rule else []:
+            self._byDay.append((int(day[:-2]) if day[:-2] else None, _WEEKDAYS[day[-2:]]))
+
+        ordinals = any(ordinal is not None for ordinal, _ in self._byDay)
+        if (ordinals and self._freq != 'MONTHLY') or (self._byDay and self._byMonthDay) or (
+                self._freq == 'YEARLY' and (self._byDay or self._byMonthDay)):
+            raise _UnsupportedRecurrence(rules[0])
+
+        self._walls = []  # occurrences generated so far, ascending
+        self._iter = self._Generate()
+        self._exhausted = False
+        self._instances = {}  # wall > (startTS, endTS, instance dict)
+
+    def __str__(self):
+        return '<_RecurringSeries: id={}, FREQ={}, INTERVAL={}>'.format(self._master['id'], self._freq, self._interval)
+
+    def _ToWall(self, ts):
+        # timestamp > offset-naive wall clock datetime in the event's time zone
+        if self._zone is not None:
+            return datetime.datetime.fromtimestamp(ts, self._zone).replace(tzinfo=None)
+        return datetime.datetime.fromtimestamp(ts)
+
+    def _ToTimestamp(self, wall):
+        if self._zone is not None:
+            return wall.replace(tzinfo=self._zone).timestamp()
+        return wall.timestamp()
+
+    def _ParseDate(self, value):
+        # EXDATE/UNTIL value like "20200731", "20200731T090000" (event time zone) or "20200731T130000Z" > wall
+        value = value.strip()
+        if len(value) == 8:
+            return datetime.datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+        try:
+            wall = datetime.datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+        except ValueError:
+            raise _UnsupportedRecurrence(value)
+        if value.endswith('Z'):
+            return self._ToWall(timegm(wall.timetuple()))
+        return wall
+
+    def _Generate(self):
+        # all the occurrences, ascending, with COUNT and UNTIL applied (EXDATE is applied by GetInstances)
+        count = 0
+        emptyPeriods = 0
+        for candidates in self._Periods():
+            emptyPeriods = 0 if candidates else emptyPeriods + 1
+            if emptyPeriods > 1000:
+                # the rule can never match again (like BYMONTHDAY=30 in a series that only covers february)
+                return
+
+            for wall in candidates:
+                if wall < self._start:
+                    continue
+                if self._until is not None and wall > self._until and (self._allDay or wall.date() > self._until.date() or
+                                                                         self._until.time() != datetime.time()):
+                    return
+                count += 1
+                if self._count is not None and count > self._count:
+                    return
+                yield wall
+
+    def _Periods(self):
+        # the candidate occurrences of each period (day/week/month/year), forever
+        start = self._start
+        k = 0
+        while True:
+            if self._freq == 'DAILY':
+                day = start + datetime.timedelta(days=k * self._interval)
+                candidates = [day] if self._Matches(day) else []
+
+            elif self._freq == 'WEEKLY':
+                weekStart = start - datetime.timedelta(days=(start.weekday() - self._wkst) % 7)
+                weekStart += datetime.timedelta(weeks=k * self._interval)
+                weekdays = [weekday for _, weekday in self._byDay] or [start.weekday()]
+                candidates = sorted(
+                    weekStart + datetime.timedelta(days=(weekday - self._wkst) % 7) for weekday in set(weekdays)
+                )
 
-    def print(self, *a, **k):
-        if self._debug:
-            print(*a, **k)
+            elif self._freq == 'MONTHLY':
+                month = start.month - 1 + k * self._interval
+                year, month = start.year + month // 12, month % 12 + 1
+                candidates = sorted(self._MonthDays(year, month))
 
-    def _DoRequest(self, *a, **k):
-        self.print('_DoRequest(', a, k)
-        if self._GetCalendarID() is None:
-            raise PermissionError('Error resolving calendar ID "{}"'.format(self.calendarName))
+            else:  # YEARLY
+                candidates = self._MonthDays(start.year + k * self._interval, start.month)
 
-        self.session.headers['Authorization'] = 'Bearer {}'.format(self._getAccessTokenCallback())
-        self.session.headers['Accept'] = 'application/json'
-        for key, val in self.session.headers.items():
-            if 'Auth' in key:
-                val = val[:15] + '...'
+            yield candidates
+            k += 1
 
-            self.print('header', key, '=', val)
+    def _Matches(self, wall):
+        # BYDAY/BYMONTHDAY filter of FREQ=DAILY
+        if self._byDay and wall.weekday() not in [weekday for _, weekday in self._byDay]:
+            return False
+        if self._byMonthDay:
+            lastDay = _DaysInMonth(wall.year, wall.month)
+            if wall.day not in [day if day > 0 else lastDay + 1 + day for day in self._byMonthDay]:
+                return False
+        return True
 
-        resp = self.session.request(*a, **k)
-        return resp
+    def _MonthDays(self, year, month):
+        # the candidate walls of one month for FREQ=MONTHLY/YEARLY
+        lastDay = _DaysInMonth(year, month)
+        days = set()
+        if self._byDay:
+            firstWeekday = datetime.date(year, month, 1).weekday()
+            for ordinal, weekday in self._byDay:
+                matching = list(range(1 + (weekday - firstWeekday) % 7, lastDay + 1, 7))
+                if ordinal is None:
+                    days.update(matching)
+                elif 0 < ordinal <= len(matching):
+                    days.add(matching[ordinal - 1])
+                elif 0 < -ordinal <= len(matching):
+                    days.add(matching[ordinal])
+        else:
+            for day in self._byMonthDay or [self._start.day]:
+                day = day if day > 0 else lastDay + 1 + day
+                if 1 <= day <= lastDay:
+                    days.add(day)
 
-    def _GetCalendarID(self, nextPageToken=None):
-        self.print('_GetCalendarID(nextPageToken=', nextPageToken)
+        return [self._start.replace(year=year, month=month, day=day) for day in days]
 
-        if self._calendarID is None:
-            url = self._baseURL + 'users/me/calendarList'.format(
-                self._getAccessTokenCallback(),
-            )
-            if nextPageToken:
-                # This will request the next page of results.
-                # This happens when the account has access to many-many calendars
-                url += '?pageToken={}'.format(nextPageToken)
+    def GetInstances(self, startTS, endTS):
+        '''
+        :param startTS: float
+        :param endTS: float
+        :return: list of "calendar#event" dicts, like the ones google returns with singleEvents=True
+        '''
+        lastWall = self._ToWall(endTS) + datetime.timedelta(days=1)
+        while not self._exhausted and (not self._walls or self._walls[-1] <= lastWall):
+            try:
+                self._walls.append(next(self._iter))
+            except StopIteration:
+                self._exhausted = True
 
-            self.print('29 url=', url)
-            resp = gs_requests.get(
-                url,
-                headers={
-                    'Authorization': 'Bearer {}'.format(self._getAccessTokenCallback())
-                }
-            )
-            self.print('_GetCalendarID resp=', json.dumps(resp.json(), indent=2))
-            for calendar in resp.json().get('items', []):
-                calendarName = calendar.get('summary', None)
+        firstWall = self._ToWall(startTS) - datetime.timedelta(seconds=self._duration) - datetime.timedelta(days=1)
+        ret = []
+        for wall in self._walls[bisect.bisect_left(self._walls, firstWall):]:
+            if wall > lastWall:
+                break
+            if wall in self._exdates:
+                continue
+
+            cached = self._instances.get(wall, None)
+            if cached is None:
+                cached = self._instances[wall] = self._MakeInstance(wall)
+            if cached[0] < endTS and cached[1] > startTS:
+                ret.append(cached[2])
+        return ret
 
-                self.calendars.add(calendarName)
+    def _MakeInstance(self, wall):
+        if self._allDay:
+            startTS = wall.timestamp()
+            endTS = (wall + self._days).timestamp()
+            suffix = wall.strftime('%Y%m%d')
+            start = {'date': wall.strftime('%Y-%m-%d')}
+            end = {'date': (wall + self._days).strftime('%Y-%m-%d')}
+        else:
+            startTS = self._ToTimestamp(wall)
+            endTS = startTS + self._duration
+            suffix = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(startTS))
+            start = {'dateTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(startTS))}
+            end = {'dateTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(endTS))}
 
-                if calendarName == self.calendarName:
-                    self._calendarID = calendar.get('id')
-                    self.print('calendar ID found "{}"'.format(self._calendarID))
-                    break
+        instance = {key: val for key, val in self._master.items() if key != 'recurrence'}
+        instance.update({
+            'id': '{}_{}'.format(self._master['id'], suffix),  # same ID google gives the instance
+            'recurringEventId': self._master['id'],
+            'originalStartTime': start,
+            'start': start,
+            'end': end,
+        })
+        return startTS, endTS, instance
 
-            npToken = resp.json().get('nextPageToken', None)
-            self.print('npToken=', npToken)
-            while self._calendarID is None and npToken is not None:
-                self.print('len(items)=', len(resp.json().get('items')))
-                return self._GetCalendarID(nextPageToken=npToken)
 
-        return self._calendarID
+class _IntervalIndex:
+    '''
+    Index of events sorted by start time, so "now", "next" and "in range" lookups are bisections
+        instead of scans of every item.
+    Events that started up to maxDuration ago are the only ones that can still be running,
+        so only that slice has to be checked for its end time.
+    The start/end timestamps are kept in parallel lists, there is no extra object per event.
+    '''
+    __slots__ = ('_starts', '_ends', '_calItems', '_maxDuration')
 
-    def UpdateCalendar(self, calendar=None, startDT=None, endDT=None):
+    def __init__(self, calItems=()):
+        self._starts = []
+        self._ends = []
+        self._calItems = []
+        self._maxDuration = 0
+        self._Rebuild(calItems)
+
+    def __len__(self):
+        return len(self._calItems)
+
+    def _Rebuild(self, calItems):
+        entries = sorted(
+            ((event.Get('Start').timestamp(), event.Get('End').timestamp(), event) for event in calItems),
+            key=lambda entry: entry[0],
+        )
+        self._starts = [entry[0] for entry in entries]
+        self._ends = [entry[1] for entry in entries]
+        self._calItems = [entry[2] for entry in entries]
+        self._maxDuration = max((endTS - startTS for startTS, endTS, _ in entries), default=0)
+
+    def Sync(self, calItems):
         '''
-        Subclasses should override this
+        Brings the index in step with calItems, moving only the events that were added or removed
+            (a poll usually changes a few events out of hundreds)
 
-        :param calendar: a particular calendar ( None means use the default calendar)
-        :param startDT: only search for events after this date
-        :param endDT: only search for events before this date
-        :return:
+        :param calItems: list of _CalendarItem, all the events that should be in the index
         '''
-        self.print('UpdateCalendar(', calendar, startDT, endDT)
+        current = dict((id(event), event) for event in calItems)
+        indexed = set(id(event) for event in self._calItems)
+        removed = [event for event in self._calItems if id(event) not in current]
+        added = [event for key, event in current.items() if key not in indexed]
+        if len(removed) + len(added) > len(calItems) // 4 + 8:
+            self._Rebuild(calItems)
+            return
 
-        startDT = startDT or datetime.datetime.now() - datetime.timedelta(days=1)
-        endDT = endDT or datetime.datetime.now() + datetime.timedelta(days=7)
+        for event in removed:
+            startTS = event.Get('Start').timestamp()
+            lo = bisect.bisect_left(self._starts, startTS)
+            hi = bisect.bisect_right(self._starts, startTS)
+            for pos in range(lo, hi):
+                if self._calItems[pos] is event:
+                    del self._starts[pos], self._ends[pos], self._calItems[pos]
+                    break
+        # maxDuration is not lowered when the longest event goes away, the lookups are still right, only a bit wider
 
-        startStr = datetime.datetime.utcfromtimestamp(startDT.timestamp()).isoformat() + "-0000"
-        endStr = datetime.datetime.utcfromtimestamp(endDT.timestamp()).isoformat() + "-0000"
-        self.print('startStr=', startStr)
-        self.print('endStr=', endStr)
+        for event in added:
+            startTS = event.Get('Start').timestamp()
+            endTS = event.Get('End').timestamp()
+            pos = bisect.bisect_right(self._starts, startTS)
+            self._starts.insert(pos, startTS)
+            self._ends.insert(pos, endTS)
+            self._calItems.insert(pos, event)
+            self._maxDuration = max(self._maxDuration, endTS - startTS)
 
-        url = self._baseURL + 'calendars/{}/events?timeMax={}&timeMin={}&singleEvents=True'.format(
-            self._GetCalendarID(),
-            endStr,
-            startStr
-        )
-        resp = self._DoRequest(
-            method='get',
-            url=url
-        )
-        self._NewConnectionStatus('Connected' if resp.ok else 'Disconnected')
-        self.print('resp=', resp.text)
-
-        theseCalendarItems = []
-        for item in resp.json().get('items', []):
-            self.print('item=', json.dumps(item, indent=2, sort_keys=True))
-
-            start = fromisoformat(item['start']['dateTime'])
-            self.print('95 start=', start)
-
-            end = fromisoformat(item['end']['dateTime'])
-
-            hasAttachments = 'attachments' in item.keys()
-
-            event = _CalendarItem(
-                startDT=datetime.datetime.fromtimestamp(start.timestamp()),
-                endDT=datetime.datetime.fromtimestamp(end.timestamp()),
-                data={
-                    'ItemId': item.get('id'),
-                    'Subject': item.get('summary'),
-                    'OrganizerName': item['creator']['email'],
-                    'HasAttachments': hasAttachments,
-                    'attachments': item.get('attachments', []),
-                },
-                parentCalendar=self,
-            )
-            theseCalendarItems.append(event)
+    def GetAt(self, ts):
+        lo = bisect.bisect_left(self._starts, ts - self._maxDuration)
+        hi = bisect.bisect_right(self._starts, ts)
+        return [self._calItems[pos] for pos in range(lo, hi) if self._ends[pos] > ts]
 
-        self.RegisterCalendarItems(
-            calItems=theseCalendarItems,
-            startDT=startDT,
-            endDT=endDT,
+    def GetNext(self, ts):
+        lo = bisect.bisect_right(self._starts, ts)
+        if lo == len(self._starts):
+            return []
+        hi = bisect.bisect_right(self._starts, self._starts[lo])
+        return self._calItems[lo:hi]
 
-        )
+    def GetOverlapping(self, startTS, endTS):
+        lo = bisect.bisect_left(self._starts, startTS - self._maxDuration)
+        hi = bisect.bisect_left(self._starts, endTS) if endTS > startTS else bisect.bisect_right(self._starts, endTS)
+        return [self._calItems[pos] for pos in range(lo, hi) if self._ends[pos] > startTS]
 
-    def CreateCalendarEvent(self, subject, body, startDT, endDT):
-        timezone = time.tzname[-1] if len(time.tzname) > 1 else time.tzname[0]
-        self.print('timezone=', timezone)
 
-        data = {
-            "kind": "calendar#event",
-            "summary": subject,  # meeting subject
-            "description": body,  # meeting body
-            "start": {
-                # "dateTime": startDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
-                "dateTime": datetime.datetime.utcfromtimestamp(startDT.timestamp()).isoformat() + '+00:00',
-            },
-            "end": {
-                # "dateTime": endDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
-                "dateTime": datetime.datetime.utcfromtimestamp(endDT.timestamp()).isoformat() + '+00:00',
-            },
-        }
-        self.print('data=', data)
+class _AttachmentCache:
+    '''
+    Size-bounded on-disk cache of downloaded attachments.
+    Files are keyed by Drive fileId and md5Checksum (or version), so an attachment that has not changed
+        is never downloaded again, and a new version replaces the old one.
+    When the cache grows over maxBytes, the least recently used files are deleted.
+    The Drive metadata of the files is kept in memory for metadataTTL seconds,
+        so reading a cached attachment again does not cost a metadata request.
+    '''
+    _caches = {}  # directory > _AttachmentCache
+    _cachesLock = threading.Lock()
 
-        resp = self._DoRequest(
-            method='POST',
-            url='https://www.googleapis.com/calendar/v3/calendars/{calendarID}/events'.format(
-                calendarID=self._calendarID,
-            ),
-            json=data,
-        )
-        self.print('resp=', resp.text)
+    @classmethod
+    def Get(cls, directory, maxBytes=50 * 1024 * 1024):
+        with cls._cachesLock:
+            cache = cls._caches.get(directory, None)
+            if cache is None:
+                cache = cls._caches[directory] = cls(directory, maxBytes)
+            return cache
 
-        if resp.ok:
-            # save the calendar item into memory
-            item = resp.json()
-            start = fromisoformat(item['start']['dateTime'])
-            # start is offset-aware
-
-            end = fromisoformat(item['end']['dateTime'])
-
-            event = _CalendarItem(
-                startDT=datetime.datetime.fromtimestamp(start.timestamp()),
-                endDT=datetime.datetime.fromtimestamp(end.timestamp()),
-
-                data={
-                    'ItemId': item.get('id'),
-                    'Subject': item.get('summary'),
-                    'OrganizerName': item['creator']['email'],
-                    'HasAttachment': False,
-                },
-                parentCalendar=self,
-            )
+    def __init__(self, directory, maxBytes=50 * 1024 * 1024, metadataTTL=300, maxMetadata=1024):
+        '''
 
-            self.RegisterCalendarItems(
-                calItems=[event],
-                startDT=start,
-                endDT=end,
+        :param directory: str
+        :param maxBytes: int
+        :param metadataTTL: float, seconds the metadata of a file is used before it is requested again
+            (a file edited in Drive is seen after at most that long)
+        :param maxMetadata: int, max number of files whose metadata is kept, least recently used are dropped
+        '''
+        self._directory = directory
+        self._maxBytes = maxBytes
+        self._metadataTTL = metadataTTL
+        self._maxMetadata = maxMetadata
+        self._metadata = collections.OrderedDict()  # fileId > (time.monotonic() it was fetched, metadata dict)
+        self._lock = threading.Lock()
 
-            )
+    def __str__(self):
+        return '<_AttachmentCache: directory={}, maxBytes={}>'.format(self._directory, self._maxBytes)
 
-    def ChangeEventTime(self, calItem, newStartDT=None, newEndDT=None):
-        self.print('ChangeEventTime(', calItem, 'newStartDT=', newStartDT, ', newEndDT=', newEndDT)
-        # url = 'http://192.168.68.105'
-        url = 'https://www.googleapis.com/calendar/v3/calendars/{calendarId}/events/{eventId}'.format(
-            calendarId=self._calendarID,
-            eventId=calItem.Get('ItemId')
+    def _GetPath(self, fileId, fingerprint):
+        # like "cache/1a2B3c.d41d8cd98f00b204e9800998ecf8427e"
+        fileId, fingerprint = (
+            ''.join(c if c.isalnum() or c in '-_' else '_' for c in part)
+            for part in (fileId, fingerprint)
         )
+        return os.path.join(self._directory, '{}.{}'.format(fileId, fingerprint))
 
-        data = {
-        }
+    def GetMetadata(self, fileId):
+        '''
+        :return: dict, the Drive metadata saved by PutMetadata, or None if it is unknown or too old
+        '''
+        with self._lock:
+            entry = self._metadata.get(fileId, None)
+            if entry is None or time.monotonic() - entry[0] > self._metadataTTL:
+                return None
+            self._metadata.move_to_end(fileId)
+            return entry[1]
 
-        if newStartDT:
-            data['start'] = {
-                # "dateTime": newStartDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
-                "dateTime": datetime.datetime.utcfromtimestamp(newStartDT.timestamp()).isoformat() + '+00:00',
-            }
+    def PutMetadata(self, fileId, metadata):
+        '''
+        :param fileId: str
+        :param metadata: dict like {'size': str, 'mimeType': str, 'modifiedTime': str, 'md5Checksum': str...}
+        '''
+        with self._lock:
+            self._metadata[fileId] = (time.monotonic(), metadata)
+            self._metadata.move_to_end(fileId)
+            while len(self._metadata) > self._maxMetadata:
+                self._metadata.popitem(last=False)
 
-        if newEndDT:
-            data['end'] = {
-                # "dateTime": newEndDT.astimezone(datetime.timezone.utc).isoformat(),# doesnt work on python 3.5
-                "dateTime": datetime.datetime.utcfromtimestamp(newEndDT.timestamp()).isoformat() + '+00:00',
-            }
+    def GetPath(self, fileId, fingerprint):
+        '''
+        :return: str path of the cached file, or None if this version is not cached
+        '''
+        path = self._GetPath(fileId, fingerprint)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path, None)  # mark as recently used
+                return path
+        return None
 
-        resp = self._DoRequest(
-            method='PATCH',
-            url=url,
-            json=data,
-        )
-        self.print('resp=', resp.text)
+    def Store(self, fileId, fingerprint, chunks):
+        '''
+        Writes the chunks to the cache, one at a time.
 
-        if resp.ok:
-            # save the calendar item into memory
-            item = resp.json()
-            start = fromisoformat(item['start']['dateTime'])
-            # start is offset-aware
-
-            end = fromisoformat(item['end']['dateTime'])
-
-            event = _CalendarItem(
-                startDT=datetime.datetime.fromtimestamp(start.timestamp()),
-                endDT=datetime.datetime.fromtimestamp(end.timestamp()),
-                data={
-                    'ItemId': item.get('id'),
-                    'Subject': item.get('summary'),
-                    'OrganizerName': item['creator']['email'],
-                    'HasAttachment': False,
-                },
-                parentCalendar=self,
-            )
+        :param fileId: str
+        :param fingerprint: str, changes when the content changes
+        :param chunks: iterable of bytes
+        :return: str path of the cached file
+        '''
+        if not os.path.exists(self._directory):
+            os.makedirs(self._directory)
 
-            self.RegisterCalendarItems(
-                calItems=[event],
-                startDT=start,
-                endDT=end,
+        path = self._GetPath(fileId, fingerprint)
+        tempPath = '{}.{}.part'.format(path, uuid.uuid4().hex)
+        with open(tempPath, mode='wb') as file:
+            for chunk in chunks:
+                if chunk:
+                    file.write(chunk)
 
-            )
+        with self._lock:
+            os.replace(tempPath, path)
 
-    def GetAttachments(self, item):
-        ret = []
-        for d in item.Get('attachments'):
-            ret.append(
-                _Attachment(
-                    AttachmentId=d['fileId'],
-                    name=d['title'],
-                    parentExchange=self,
-                    **d,
-                )
-            )
-        return ret
+            # remove the other versions of this file
+            prefix = os.path.basename(self._GetPath(fileId, ''))
+            for name in os.listdir(self._directory):
+                if name.startswith(prefix) and name != os.path.basename(path) and not name.endswith('.part'):
+                    os.remove(os.path.join(self._directory, name))
+
+            self._Trim(keep=path)
+
+        return path
+
+    def _Trim(self, keep=None):
+        files = []
+        total = 0
+        for name in os.listdir(self._directory):
+            if name.endswith('.part'):
+                continue
+            path = os.path.join(self._directory, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for mtime, size, path in sorted(files):
+            if total <= self._maxBytes:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
 
 
 class _Attachment:
+    CHUNK_SIZE = 64 * 1024
+
     def __init__(self, AttachmentId, name, parentExchange, **kwargs):
-        print('_Attachment(', AttachmentId, parentExchange)
+        parentExchange.print('_Attachment(', AttachmentId, parentExchange)
         self.Filename = name
         self.ID = AttachmentId
         self._parentExchange = parentExchange
-        self._content = None
+        self._metadata = None
         self._kwargs = kwargs
 
-    def Read(self):
-        if self._content is None:
-            # resp = self._parentExchange.session.get(self._kwargs['fileUrl'])
-            resp = self._parentExchange.session.get(
-                'https://www.googleapis.com/drive/v3/files/{}'.format(self._kwargs['fileId']))
-            print('resp=', resp)
-            self._content = resp.content.encode()
+    def _GetMetadata(self):
+        # size/checksum from Drive, without downloading the content, shared with the other attachments of that file
+        if self._metadata is None:
+            cache = self._parentExchange._attachmentCache
+            self._metadata = cache.GetMetadata(self.ID)
+            if self._metadata is None:
+                resp = self._parentExchange._SendRequest(
+                    method='get',
+                    url=self._parentExchange._driveURL + 'files/{}'.format(self._kwargs['fileId']),
+                    params={'fields': self._parentExchange._fields['driveFile']},
+                    callType='driveFile',
+                )
+                if not resp.ok:
+                    raise _RequestError(resp)
+                self._metadata = resp.json()
+                cache.PutMetadata(self.ID, self._metadata)
+
+        return self._metadata
+
+    def _IsNative(self):
+        # google docs/sheets/slides, no content to download, only exports
+        return self._GetMetadata().get('mimeType', '').startswith(NATIVE_MIMETYPE_PREFIX)
+
+    def _GetCachedPath(self):
+        metadata = self._GetMetadata()
+        fingerprint = metadata.get('md5Checksum', None) or 'v{}'.format(metadata.get('version', 0))
+        cache = self._parentExchange._attachmentCache
+
+        path = cache.GetPath(self.ID, fingerprint)
+        if path is None:
+            if self._IsNative():
+                url = self._parentExchange._driveURL + 'files/{}/export'.format(self._kwargs['fileId'])
+                params = {'mimeType': NATIVE_EXPORT_MIMETYPE}
+            else:
+                url = self._parentExchange._driveURL + 'files/{}'.format(self._kwargs['fileId'])
+                params = {'alt': 'media'}
+            resp = self._parentExchange._SendRequest(
+                method='get',
+                url=url,
+                params=params,
+                headers={'Accept': '*/*'},
+                stream=True,
+                callType='driveMedia',
+            )
+            self._parentExchange.print('resp=', resp)
+            if not resp.ok:
+                raise _RequestError(resp)
+            try:
+                path = cache.Store(self.ID, fingerprint, resp.iter_content(self.CHUNK_SIZE))
+            finally:
+                resp.close()
+
+        return path
 
-        return self._content
+    def Iterate(self, chunkSize=CHUNK_SIZE):
+        '''
+        Yields the content in chunks, without loading the whole file in memory
+
+        :param chunkSize: int
+        :return: generator of bytes
+        '''
+        with open(self._GetCachedPath(), mode='rb') as file:
+            while True:
+                chunk = file.read(chunkSize)
+                if not chunk:
+                    return
+                yield chunk
+
+    def Map(self):
+        '''
+        Memory-maps the cached file, the OS pages it in as needed. The caller must close() the returned mmap.
+
+        :return: mmap.mmap (read-only)
+        '''
+        with open(self._GetCachedPath(), mode='rb') as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def Read(self):
+        with open(self._GetCachedPath(), mode='rb') as file:
+            return file.read()
 
     @property
     def Size(self):
         # return size of content in Bytes
-        # In theory you could request the size of the attachment from EWS API, or even the hash or changekey
-        # but according to this microsoft forum, it is not possible (or at least it does not work as intended)
-        # https://social.technet.microsoft.com/Forums/office/en-US/143ab86c-903a-49da-9603-03e65cbd8180/ews-how-to-get-attachment-mime-info-not-content
-        return len(self.Read())
+        # Drive gives us the size in the file metadata, no need to download the content
+        # (files native to google docs/sheets/slides do not have a size, theirs is the size of the export)
+        size = self._GetMetadata().get('size', None)
+        if size is None:
+            return os.path.getsize(self._GetCachedPath())
+        return int(size)
 
     @property
     def Name(self):
         if self.Filename is None:
-            self._Update(getContent=False)
+            self.Filename = self._GetMetadata().get('name', None)
         return self.Filename
 
     def __str__(self):
         return '<Attachment: Name={}>'.format(self.Name)
 
 
+def _Fingerprint(item):
+    # changes whenever the event changes, cheaper than comparing the content
+    return item.get('etag', None) or item.get('updated', None)
+
+
+def _ItemSignature(event):
+    # used to tell if an event changed, it must cover every field that _ItemFromJSON reads
+    return (
+        event.Get('Start'),
+        event.Get('End'),
+        event.Get('Subject'),
+        event.Get('OrganizerName'),
+        event.Get('HasAttachments'),
+        event.Get('attachments'),
+    )
+
+
+def _GroupConsecutiveDays(days):
+    '''
+    :param days: sorted list of datetime.date
+    :return: list of lists of consecutive days, like [[d1, d2, d3], [d5]]
+    '''
+    runs = []
+    for day in days:
+        if runs and runs[-1][-1] + datetime.timedelta(days=1) == day:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _GetDefaultWindow():
+    '''
+    The window polled when no startDT/endDT is given: from 1 day ago to 7 days from now,
+        rounded out to DEFAULT_WINDOW_QUANTUM so the request URL (and the ETag google returns for it)
+        stays the same between polls and unchanged calendars get a 304.
+
+    :return: tuple of (startDT, endDT)
+    '''
+    now = time.time()
+    startTS = (now - 24 * 3600) // DEFAULT_WINDOW_QUANTUM * DEFAULT_WINDOW_QUANTUM
+    endTS = -(-(now + 7 * 24 * 3600) // DEFAULT_WINDOW_QUANTUM) * DEFAULT_WINDOW_QUANTUM
+    return datetime.datetime.fromtimestamp(startTS), datetime.datetime.fromtimestamp(endTS)
+
+
+def _ToUTCString(dt):
+    # offset-naive local datetime > RFC3339 string in UTC
+    return datetime.datetime.utcfromtimestamp(dt.timestamp()).isoformat() + '-0000'
+
+
+@functools.lru_cache(maxsize=4096)
+def _ParseRFC3339(dateString):
+    '''
+    Fast parser for the timestamps google returns, like "2020-07-31T15:30:00-04:00", "2020-07-31T19:30:00.000Z"
+        or "2020-07-31" (all-day events).
+    Returns an offset-naive datetime in the local timezone, same as
+        datetime.datetime.fromtimestamp(fromisoformat(dateString).timestamp()) but in one step.
+    The same strings come back on every poll, so the results are cached.
+    Anything that does not look like the above falls back to fromisoformat.
+
+    :param dateString: str
+    :return: datetime.datetime
+    '''
+    s = dateString
+    try:
+        if len(s) == 10:
+            # "date" of an all-day event, midnight local time
+            return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+        if s[4] != '-' or s[7] != '-' or s[10] not in 'Tt ' or s[13] != ':' or s[16] != ':':
+            raise ValueError(s)
+
+        seconds = timegm((int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19])))
+
+        pos = 19
+        microsecond = 0
+        if s[pos] == '.':
+            end = pos + 1
+            while s[end].isdigit():
+                end += 1
+            microsecond = int((s[pos + 1:end] + '00000')[:6])
+            pos = end
+
+        tz = s[pos:]
+        if tz not in ('Z', 'z'):
+            if len(tz) != 6 or tz[3] != ':' or tz[0] not in '+-':
+                raise ValueError(s)
+            offset = int(tz[1:3]) * 3600 + int(tz[4:6]) * 60
+            seconds += -offset if tz[0] == '+' else offset
+
+    except (ValueError, IndexError):
+        return fromisoformat(dateString)
+
+    return datetime.datetime.fromtimestamp(seconds).replace(microsecond=microsecond)
+
+
+def _ParseEventTime(eventTime):
+    '''
+    :param eventTime: the "start" or "end" dict of an event, has either a "dateTime" or a "date" (all-day events)
+    :return: offset-naive datetime in the local timezone
+    '''
+    return _ParseRFC3339(eventTime.get('dateTime', None) or eventTime['date'])
+
+
+def _GetUTCOffset(dateString):
+    # seconds east of UTC of a string like "2020-07-31T15:30:00-04:00" or "2020-07-31T19:30:00Z"
+    if dateString[-1] in 'Zz':
+        return 0
+    offset = int(dateString[-5:-3]) * 3600 + int(dateString[-2:]) * 60
+    return -offset if dateString[-6] == '-' else offset
+
+
+def _GetLocalUTCOffset(ts):
+    # seconds east of UTC of the local time zone at timestamp ts
+    return round((datetime.datetime.fromtimestamp(ts) - datetime.datetime.utcfromtimestamp(ts)).total_seconds())
+
+
+def _DaysInMonth(year, month):
+    if month == 12:
+        return 31
+    return (datetime.date(year, month + 1, 1) - datetime.date(year, month, 1)).days
+
+
 def fromisoformat(date_string, returnOffsetAware=False):
     # apparently GS python 3.5 does not support this method.
     # Copied these from python 3.8 datetime source code
@@ -455,11 +4251,171 @@ def _parse_isoformat_date(dtstr):
     return [year, month, day]
 
 
+class _OccupancyIndex:
+    '''
+    Busy/free map of many rooms over one window, one int per room used as a bitmap of time slots:
+        bit i is set when the room is busy at any time during slot i (startTS + i * slotSeconds).
+    The queries are a few bitwise operations on each room's int, no matter how many events the rooms have.
+    A slot that is only partly busy counts as busy, so a room is never reported free when it is not.
+    '''
+
+    def __init__(self, startDT, endDT, slotMinutes=15):
+        '''
+
+        :param startDT: datetime, rounded down to a slot
+        :param endDT: datetime, rounded up to a slot
+        :param slotMinutes: int
+        '''
+        self.slotSeconds = slotMinutes * 60
+        self.startTS = int(startDT.timestamp() // self.slotSeconds * self.slotSeconds)
+        self.slots = int(-(-(endDT.timestamp() - self.startTS) // self.slotSeconds))
+        self.endTS = self.startTS + self.slots * self.slotSeconds
+        self.updated = time.time()
+        self._full = (1 << self.slots) - 1
+        self._rows = {}  # roomName > int bitmap
+        self._errors = {}  # roomName > str, rooms google did not return the busy times of
+
+    def __str__(self):
+        return '<_OccupancyIndex: {} rooms, {} slots of {} minutes from {}>'.format(
+            len(self._rows),
+            self.slots,
+            self.slotSeconds // 60,
+            datetime.datetime.fromtimestamp(self.startTS),
+        )
+
+    def Covers(self, startDT, endDT):
+        return self.startTS <= startDT.timestamp() and endDT.timestamp() <= self.endTS
+
+    def GetRoomNames(self):
+        return set(self._rows.keys()) | set(self._errors.keys())
+
+    def SetBusy(self, roomName, periods):
+        '''
+
+        :param roomName: str
+        :param periods: iterable of (startTS, endTS) tuples
+        '''
+        row = 0
+        for startTS, endTS in periods:
+            first, last = self._GetSlots(startTS, endTS)
+            if last > first:
+                row |= ((1 << (last - first)) - 1) << first
+        self._rows[roomName] = row
+        self._errors.pop(roomName, None)
+
+    def SetError(self, roomName, error):
+        self._rows.pop(roomName, None)
+        self._errors[roomName] = error
+
+    def GetErrors(self):
+        '''
+        :return: dict like {roomName: str}
+        '''
+        return self._errors.copy()
+
+    def _GetSlots(self, startTS, endTS):
+        # the slots [first, last) that touch the time range, clamped to the window
+        first = int((startTS - self.startTS) // self.slotSeconds)
+        last = int(-(-(endTS - self.startTS) // self.slotSeconds))
+        return max(first, 0), min(last, self.slots)
+
+    def _GetMask(self, startDT, endDT):
+        if not self.Covers(startDT, endDT):
+            raise ValueError('{} - {} is not in the window of {}'.format(startDT, endDT, self))
+        first, last = self._GetSlots(startDT.timestamp(), endDT.timestamp())
+        return ((1 << (last - first)) - 1) << first
+
+    def GetFreeRooms(self, startDT, endDT, roomNames=None):
+        '''
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :param roomNames: iterable of str, default is every room of the index
+        :return: list of str, sorted, the rooms that are free during the whole time
+        '''
+        mask = self._GetMask(startDT, endDT)
+        rows = self._rows
+        if roomNames is None:
+            roomNames = rows.keys()
+        return sorted(name for name in roomNames if name in rows and not rows[name] & mask)
+
+    def GetNextFreeSlot(self, roomName, duration, afterDT=None):
+        '''
+
+        :param roomName: str
+        :param duration: datetime.timedelta
+        :param afterDT: datetime, default is the start of the window
+        :return: datetime of the first time the room is free for "duration", or None if not in the window
+        '''
+        if roomName not in self._rows:
+            return None
+
+        length = max(1, int(-(-duration.total_seconds() // self.slotSeconds)))
+        if length > self.slots:
+            return None
+        first = 0
+        if afterDT is not None:
+            first = max(0, int(-(-(afterDT.timestamp() - self.startTS) // self.slotSeconds)))
+
+        # bit i of "runs" is set when the "length" slots starting at i are free
+        runs = ~self._rows[roomName] & self._full
+        done = 1
+        while done < length:
+            step = min(done, length - done)
+            runs &= runs >> step
+            done += step
+        runs &= self._full >> (length - 1)  # runs must end in the window
+        runs >>= first
+        if not runs:
+            return None
+
+        slot = first + (runs & -runs).bit_length() - 1
+        return datetime.datetime.fromtimestamp(self.startTS + slot * self.slotSeconds)
+
+    def GetUtilization(self, startDT=None, endDT=None, roomNames=None):
+        '''
+
+        :param startDT: datetime, default is the start of the window
+        :param endDT: datetime, default is the end of the window
+        :param roomNames: iterable of str, default is every room of the index
+        :return: dict like {roomName: float 0-1, the part of the slots that are busy}
+        '''
+        if startDT is None and endDT is None:
+            mask, slots = self._full, self.slots
+        else:
+            mask = self._GetMask(
+                startDT or datetime.datetime.fromtimestamp(self.startTS),
+                endDT or datetime.datetime.fromtimestamp(self.endTS),
+            )
+            slots = bin(mask).count('1')
+
+        rows = self._rows
+        if roomNames is None:
+            roomNames = rows.keys()
+        return {
+            name: bin(rows[name] & mask).count('1') / slots if slots else 0
+            for name in roomNames if name in rows
+        }
+
+
 class ServiceAccount(_ServiceAccountBase):
-    def __init__(self, googleJSONpath, oauthID, authManager):
+    def __init__(self, googleJSONpath, oauthID, authManager, availabilityTTL=60):
+        '''
+
+        :param googleJSONpath: str
+        :param oauthID: str
+        :param authManager: gs_oauth_tools.AuthManager
+        :param availabilityTTL: int, seconds GetFreeRooms/GetNextFreeSlot/GetUtilization use the busy times
+            before asking google again
+        '''
         self.googleJSONpath = googleJSONpath
         self.oauthID = oauthID
         self.authManager = authManager
+        self._roomInterfaces = weakref.WeakValueDictionary()  # roomName > GoogleCalendar
+        self._availabilityTTL = availabilityTTL
+        self._occupancy = None  # _OccupancyIndex
+        self._occupancyLock = threading.Lock()
+        self._accountInterface = None  # GoogleCalendar used for the account-wide calls when there are no rooms yet
 
     def __str__(self):
         return '<Google ServiceAccount: googleJSONpath={}, oauthID={}, authManager={}>'.format(
@@ -525,17 +4481,205 @@ class ServiceAccount(_ServiceAccountBase):
             #     ))
             return
 
+        kwargs.setdefault('accountKey', self.oauthID)
+        kwargs.setdefault('projectKey', self.googleJSONpath)
         google = GoogleCalendar(
             getAccessTokenCallback=user.GetAccessToken,
             calendarName=roomName,
             **kwargs,
         )
+        self._roomInterfaces[roomName] = google
         return google
 
+    def GetTransportStats(self):
+        return _HTTPTransport.Get(self.oauthID).GetStats()
+
+    def UpdateAll(self, startDT=None, endDT=None):
+        '''
+        Updates every room interface returned by GetRoomInterface (that is still in use) with batched requests
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :return:
+        '''
+        GoogleCalendarPool(
+            [google for roomName, google in self._roomInterfaces.items() if roomName is not None]
+        ).UpdateAll(startDT=startDT, endDT=endDT)
+
+    def _GetAccountInterface(self):
+        # any room of the account will do, they share the transport, limits and calendar list
+        intf = next(iter(self._roomInterfaces.values()), None)
+        if intf is None:
+            if self._accountInterface is None:
+                self._accountInterface = self.GetRoomInterface(None)
+            intf = self._accountInterface
+        if intf is None:
+            raise PermissionError('No User with ID "{}"'.format(self.oauthID))
+        return intf
+
     @property
     def calendars(self):
-        intf = self.GetRoomInterface(None)
-        return intf.calendars
+        intf = self._GetAccountInterface()
+        return intf._directory.GetNames(intf._SendRequest)
+
+    def WarmUp(self, wait=False):
+        '''
+        Calls WarmUp on every room returned by GetRoomInterface, so the controller can finish booting
+            while the token and the calendar list are fetched.
+
+        :param wait: bool, True to block until done
+        :return: threading.Thread if wait is False
+        '''
+        if not wait:
+            thread = threading.Thread(target=self.WarmUp, args=(True,), daemon=True)
+            thread.start()
+            return thread
+
+        for roomName, google in list(self._roomInterfaces.items()):
+            if roomName is not None:
+                google.WarmUp()
+
+    def UpdateAvailability(self, roomNames=None, startDT=None, endDT=None, slotMinutes=15, maxWorkers=4):
+        '''
+        Reads the busy times of many rooms at once with the freeBusy endpoint (up to 50 rooms per request)
+            into the _OccupancyIndex used by GetFreeRooms, GetNextFreeSlot and GetUtilization.
+
+        :param roomNames: iterable of str, default is the rooms returned by GetRoomInterface, or else every calendar
+        :param startDT: datetime, default is now
+        :param endDT: datetime, default is 24 hours after startDT
+        :param slotMinutes: int, resolution of the index
+        :param maxWorkers: int, max number of freeBusy requests at the same time
+        :return: _OccupancyIndex
+        '''
+        intf = self._GetAccountInterface()
+
+        if roomNames is None:
+            roomNames = [roomName for roomName in self._roomInterfaces.keys() if roomName is not None]
+            if not roomNames:
+                roomNames = intf.calendars
+        # a calendar without a summary (None) can not be a room
+        roomNames = sorted(set(roomName for roomName in roomNames if roomName is not None))
+
+        startDT = startDT or datetime.datetime.now()
+        endDT = endDT or startDT + datetime.timedelta(days=1)
+        index = _OccupancyIndex(startDT, endDT, slotMinutes)
+
+        roomNamesByID = {}
+        for roomName in roomNames:
+            calendarID = intf._directory.GetID(roomName, intf._SendRequest)
+            if calendarID is None:
+                index.SetError(roomName, 'notFound')
+            else:
+                roomNamesByID[calendarID] = roomName
+
+        calendarIDs = list(roomNamesByID.keys())
+        chunks = [
+            calendarIDs[i:i + FREEBUSY_MAX_CALENDARS]
+            for i in range(0, len(calendarIDs), FREEBUSY_MAX_CALENDARS)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            futures = {
+                executor.submit(self._QueryFreeBusy, intf, chunk, index.startTS, index.endTS): chunk
+                for chunk in chunks
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    calendars = future.result()
+                except Exception as e:
+                    ProgramLog('Google ServiceAccount freeBusy error: {}'.format(e))
+                    for calendarID in futures[future]:
+                        index.SetError(roomNamesByID[calendarID], str(e))
+                    continue
+
+                for calendarID in futures[future]:
+                    calendar = calendars.get(calendarID, {})
+                    if calendar.get('errors', None) or 'busy' not in calendar:
+                        index.SetError(
+                            roomNamesByID[calendarID],
+                            ','.join(error.get('reason', '') for error in calendar.get('errors', [])) or 'missing',
+                        )
+                    else:
+                        index.SetBusy(roomNamesByID[calendarID], [
+                            (_ParseRFC3339(busy['start']).timestamp(), _ParseRFC3339(busy['end']).timestamp())
+                            for busy in calendar['busy']
+                        ])
+
+        with self._occupancyLock:
+            self._occupancy = index
+        return index
+
+    def _QueryFreeBusy(self, intf, calendarIDs, startTS, endTS):
+        # one freeBusy request, returns the "calendars" dict of the response
+        resp = intf._SendRequest(
+            method='POST',
+            url=intf._baseURL + 'freeBusy',
+            json={
+                'timeMin': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(startTS)),
+                'timeMax': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(endTS)),
+                'items': [{'id': calendarID} for calendarID in calendarIDs],
+            },
+            params={'fields': intf._fields['freeBusy']},
+            callType='freeBusy',
+        )
+        if not resp.ok:
+            raise _RequestError(resp)
+        return resp.json().get('calendars', {})
+
+    def GetOccupancy(self, startDT, endDT, roomNames=None):
+        '''
+        :return: _OccupancyIndex that covers the time and rooms, updated by UpdateAvailability if needed
+        '''
+        with self._occupancyLock:
+            index = self._occupancy
+
+        if index is None or not index.Covers(startDT, endDT) or time.time() - index.updated > self._availabilityTTL or (
+                roomNames is not None and not set(roomNames) <= index.GetRoomNames()):
+            # keep the same window if it is still useful, so the queries around "now" do not each ask google again
+            if index is not None and index.Covers(startDT, endDT):
+                startDT = datetime.datetime.fromtimestamp(index.startTS)
+                endDT = datetime.datetime.fromtimestamp(index.endTS)
+            if roomNames is not None and index is not None:
+                roomNames = set(roomNames) | index.GetRoomNames()
+            index = self.UpdateAvailability(
+                roomNames=roomNames,
+                startDT=startDT,
+                endDT=max(endDT, startDT + datetime.timedelta(days=1)),
+                slotMinutes=index.slotSeconds // 60 if index else 15,
+            )
+        return index
+
+    def GetFreeRooms(self, startDT, endDT, roomNames=None):
+        '''
+        Which rooms are free from startDT to endDT
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :param roomNames: iterable of str, default is the rooms of the last UpdateAvailability
+        :return: list of str
+        '''
+        return self.GetOccupancy(startDT, endDT, roomNames).GetFreeRooms(startDT, endDT, roomNames)
+
+    def GetNextFreeSlot(self, roomName, duration, afterDT=None):
+        '''
+
+        :param roomName: str
+        :param duration: datetime.timedelta
+        :param afterDT: datetime, default is now
+        :return: datetime when the room is free for "duration", or None if not in the next 24 hours
+        '''
+        afterDT = afterDT or datetime.datetime.now()
+        index = self.GetOccupancy(afterDT, afterDT + duration, [roomName])
+        return index.GetNextFreeSlot(roomName, duration, afterDT)
+
+    def GetUtilization(self, startDT, endDT, roomNames=None):
+        '''
+
+        :param startDT: datetime
+        :param endDT: datetime
+        :param roomNames: iterable of str, default is the rooms of the last UpdateAvailability
+        :return: dict like {roomName: float 0-1, the part of the time the room is busy}
+        '''
+        return self.GetOccupancy(startDT, endDT, roomNames).GetUtilization(startDT, endDT, roomNames)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, '..'), os.path.join(HERE, '..', 'benchmarks')]
+
+
+@pytest.fixture
+def fakeGoogle():
+    '''
+    Starts fake_google servers, all stopped at the end of the test:
+        server = fakeGoogle(rooms=1, eventsPerRoom=10)
+        server.api, server.url
+    '''
+    import fake_google
+
+    servers = []
+
+    def Start(**k):
+        server = fake_google.FakeGoogleServer(fake_google.FakeGoogleAPI(**k)).Start()
+        servers.append(server)
+        return server
+
+    yield Start
+    for server in servers:
+        server.Stop()
+
+
+@pytest.fixture
+def makeCalendar():
+    '''
+    GoogleCalendar (or a subclass) for a room of a fake_google server.
+    Every calendar gets its own accountKey unless one is passed,
+        so the process-wide caches (calendar list, ETags...) are not shared between tests.
+    '''
+    import gs_google_calendar
+
+    def Make(server, roomName='Room 0', cls=None, **k):
+        k.setdefault('rateLimit', 1000)
+        k.setdefault('accountKey', 'test-{}'.format(uuid.uuid4().hex))
+        return (cls or gs_google_calendar.GoogleCalendar)(
+            getAccessTokenCallback=lambda: 'fake-token',
+            calendarName=roomName,
+            apiRoot=server.url,
+            **k
+        )
+
+    return Make
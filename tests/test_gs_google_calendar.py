@@ -0,0 +1,331 @@
+import asyncio
+import datetime
+import threading
+import time
+
+import pytest
+
+# the GS modules come with the controller's firmware, not from pip
+for _name in ('gs_calendar_base', 'gs_service_accounts', 'gs_requests'):
+    pytest.importorskip(_name)
+
+import fake_google
+import gs_google_calendar
+
+ROOM0 = 'room0@resource.calendar.google.com'
+
+
+def _Window():
+    # covers every event fake_google makes by default (from 1 day ago, over 8 days)
+    now = datetime.datetime.now()
+    return now - datetime.timedelta(days=2), now + datetime.timedelta(days=9)
+
+
+def _CountRequests(records, callType):
+    return sum(1 for record in records if record['type'] == 'request' and record['callType'] == callType)
+
+
+def _PutEvent(api, calendarID, event):
+    with api._lock:
+        api._PutEvent(calendarID, event)
+
+
+def test_paging(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=25)
+    records = []
+    calendar = makeCalendar(server, maxResults=10, metricsSinks=[records.append])
+
+    startDT, endDT = _Window()
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+
+    assert _CountRequests(records, 'events') == 3
+    assert len(calendar.GetCalendarItemsInRange(startDT, endDT)) == 25
+    assert calendar.GetPollStats()['items'] == 25
+
+
+def test_not_modified(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=10)
+    records = []
+    calendar = makeCalendar(server, metricsSinks=[records.append])
+    startDT, endDT = _Window()
+
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    items = calendar.GetCalendarItemsInRange(startDT, endDT)
+
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert calendar.GetPollStats().get('notModified') is True
+    assert [record['status'] for record in records if record['type'] == 'request'][-1] == 304
+    assert calendar.GetCalendarItemsInRange(startDT, endDT) == items
+
+    server.api.Touch(ROOM0, 1)
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    stats = calendar.GetPollStats()
+    assert not stats.get('notModified', False)
+    assert stats['changed'] == 1
+    assert any(item.Get('Subject').endswith('*') for item in calendar.GetCalendarItemsInRange(startDT, endDT))
+
+
+def test_not_modified_after_failed_register(fakeGoogle, makeCalendar, monkeypatch):
+    # the ETag must only be saved once the events are registered, or the next poll is a 304 over the old items
+    server = fakeGoogle(rooms=1, eventsPerRoom=10)
+    calendar = makeCalendar(server)
+    startDT, endDT = _Window()
+
+    def Fail(*a, **k):
+        raise RuntimeError('register failed')
+
+    monkeypatch.setattr(calendar, 'RegisterCalendarItems', Fail)
+    with pytest.raises(RuntimeError):
+        calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    monkeypatch.undo()
+
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert not calendar.GetPollStats().get('notModified', False)
+    assert len(calendar.GetCalendarItemsInRange(startDT, endDT)) == 10
+
+
+def test_changed_etag(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=3)
+    calendar = makeCalendar(server)
+    startDT, endDT = _Window()
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    item = calendar._items['evt0x0']
+
+    # a new etag for a field that is not read, the item is kept
+    event = dict(server.api.events[ROOM0]['evt0x0'], description='New agenda')
+    _PutEvent(server.api, ROOM0, event)
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert calendar.GetPollStats()['changed'] == 0
+    assert calendar._items['evt0x0'] is item
+
+    # an attachment was added
+    attachment = {'fileId': 'file-new', 'title': 'slides.pdf', 'mimeType': 'application/pdf'}
+    _PutEvent(server.api, ROOM0, dict(event, attachments=[attachment]))
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert calendar.GetPollStats()['changed'] == 1
+    assert calendar._items['evt0x0'].Get('HasAttachments')
+    assert calendar._items['evt0x0'].Get('attachments') == [attachment]
+
+
+def test_concurrent_lookups(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=40)
+    calendar = makeCalendar(server)
+    startDT, endDT = _Window()
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+
+    errors = []
+    done = threading.Event()
+
+    def Read():
+        while not done.is_set():
+            ids = [item.Get('ItemId') for item in calendar.GetCalendarItemsInRange(startDT, endDT)]
+            if len(ids) != 40 or len(set(ids)) != 40:
+                errors.append(sorted(ids))
+
+    readers = [threading.Thread(target=Read) for _ in range(8)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(20):
+            server.api.Touch(ROOM0, 10)
+            calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
+    assert len(calendar._index) == 40
+
+
+def test_sync_token(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=10)
+    calendar = makeCalendar(server, useSyncToken=True)
+    startDT, endDT = _Window()
+
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert calendar._syncToken is not None
+
+    # only the changes come back
+    server.api.Touch(ROOM0, 2)
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert calendar.GetPollStats()['items'] == 2
+    assert len(calendar.GetCalendarItemsInRange(startDT, endDT)) == 10
+
+
+def test_sync_token_expired(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=10)
+    records = []
+    calendar = makeCalendar(server, useSyncToken=True, metricsSinks=[records.append])
+    startDT, endDT = _Window()
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+
+    # fake_google answers 410 to a sync token it does not know, then a full sync is done
+    calendar._syncToken = 'expired'
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+
+    statuses = [record['status'] for record in records if record['type'] == 'request' and record['callType'] == 'events']
+    assert statuses[-2:] == [410, 200]
+    assert calendar._syncToken not in (None, 'expired')
+    assert len(calendar.GetCalendarItemsInRange(startDT, endDT)) == 10
+
+
+def test_async_sync_token_expired(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=10)
+    calendar = makeCalendar(server, cls=gs_google_calendar.AsyncGoogleCalendar, useSyncToken=True)
+    startDT, endDT = _Window()
+
+    def Run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, calendar.GetLoop()).result()
+
+    Run(calendar.UpdateCalendarAsync(startDT=startDT, endDT=endDT))
+    calendar._syncToken = 'expired'
+    assert Run(calendar.UpdateCalendarAsync(startDT=startDT, endDT=endDT)) is None
+    assert calendar._syncToken not in (None, 'expired')
+    assert len(calendar.GetCalendarItemsInRange(startDT, endDT)) == 10
+
+    # other errors are raised
+    calendar._calendarID = 'deleted@resource.calendar.google.com'
+    with pytest.raises(gs_google_calendar._RequestError):
+        Run(calendar.UpdateCalendarAsync(startDT=startDT, endDT=endDT))
+
+
+def _UTC(ts):
+    return datetime.datetime.utcfromtimestamp(ts).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _PutSeries(api, masterID, summary, firstTS, recurrence, moved):
+    # a recurring event, with the instance that starts at moved[0] moved to moved[1]
+    _PutEvent(api, ROOM0, {
+        'id': masterID,
+        'status': 'confirmed',
+        'summary': summary,
+        'creator': {'email': 'organizer@example.com'},
+        'start': {'dateTime': fake_google._ToRFC3339(firstTS), 'timeZone': 'UTC'},
+        'end': {'dateTime': fake_google._ToRFC3339(firstTS + 1800), 'timeZone': 'UTC'},
+        'recurrence': recurrence,
+    })
+    _PutEvent(api, ROOM0, {
+        'id': '{}_{}'.format(masterID, _UTC(moved[0])),
+        'status': 'confirmed',
+        'summary': summary + ' (moved)',
+        'creator': {'email': 'organizer@example.com'},
+        'recurringEventId': masterID,
+        'originalStartTime': {'dateTime': fake_google._ToRFC3339(moved[0]), 'timeZone': 'UTC'},
+        'start': {'dateTime': fake_google._ToRFC3339(moved[1]), 'timeZone': 'UTC'},
+        'end': {'dateTime': fake_google._ToRFC3339(moved[1] + 1800), 'timeZone': 'UTC'},
+    })
+
+
+def _PutRecurring(api):
+    # returns the (start, subject) of the instances, in order
+    firstTS = (int(time.time()) // 3600 - 1) * 3600  # on the hour, 1 hour ago
+    day = 24 * 3600
+
+    # expanded locally: daily for 5 days, the 3rd one removed with EXDATE, the 2nd one moved 2 hours later
+    _PutSeries(api, 'standup', 'Standup', firstTS, [
+        'RRULE:FREQ=DAILY;COUNT=5',
+        'EXDATE:{}'.format(_UTC(firstTS + 2 * day)),
+    ], (firstTS + day, firstTS + day + 7200))
+
+    # RDATE is not supported by _RecurringSeries, google expands it (events/{id}/instances)
+    reviewTS = firstTS + 4 * 3600
+    _PutSeries(api, 'review', 'Review', reviewTS, [
+        'RRULE:FREQ=DAILY;COUNT=2',
+        'RDATE:{}'.format(_UTC(reviewTS + 3 * day)),
+    ], (reviewTS + day, reviewTS + day + 3600))
+
+    return sorted([
+        (firstTS, 'Standup'),
+        (firstTS + day + 7200, 'Standup (moved)'),
+        (firstTS + 3 * day, 'Standup'),
+        (firstTS + 4 * day, 'Standup'),
+        (reviewTS, 'Review'),
+        (reviewTS + day + 3600, 'Review (moved)'),
+        (reviewTS + 3 * day, 'Review'),
+    ])
+
+
+def _Instances(calendar, startDT, endDT):
+    items = calendar.GetCalendarItemsInRange(startDT, endDT)
+    return sorted((item.Get('Start').timestamp(), item.Get('Subject')) for item in items)
+
+
+def test_recurring_expansion(fakeGoogle, makeCalendar):
+    server = fakeGoogle(rooms=1, eventsPerRoom=0)
+    expected = _PutRecurring(server.api)
+    records = []
+    calendar = makeCalendar(server, expandRecurring=True, metricsSinks=[records.append])
+    startDT, endDT = _Window()
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+
+    assert _Instances(calendar, startDT, endDT) == expected
+    assert _CountRequests(records, 'instances') == 1
+
+    # a 304 keeps the series
+    calendar.UpdateCalendar(startDT=startDT, endDT=endDT)
+    assert calendar.GetPollStats().get('notModified') is True
+    assert set(calendar._masters) == {'standup', 'review'}
+    assert _Instances(calendar, startDT, endDT) == expected
+
+
+def test_async_recurring_expansion(fakeGoogle, makeCalendar, monkeypatch):
+    server = fakeGoogle(rooms=1, eventsPerRoom=0)
+    expected = _PutRecurring(server.api)
+    calendar = makeCalendar(server, cls=gs_google_calendar.AsyncGoogleCalendar, expandRecurring=True)
+    startDT, endDT = _Window()
+
+    threads = []
+    FetchInstances = calendar._FetchInstances
+
+    def Fetch(*a, **k):
+        threads.append(threading.current_thread())
+        return FetchInstances(*a, **k)
+
+    monkeypatch.setattr(calendar, '_FetchInstances', Fetch)
+    loop = calendar.GetLoop()
+    loopThread = asyncio.run_coroutine_threadsafe(_CurrentThread(), loop).result()
+    asyncio.run_coroutine_threadsafe(calendar.UpdateCalendarAsync(startDT=startDT, endDT=endDT), loop).result()
+
+    assert _Instances(calendar, startDT, endDT) == expected
+    # the blocking request is not made on the loop
+    assert threads and loopThread not in threads
+
+
+async def _CurrentThread():
+    return threading.current_thread()
+
+
+def test_occupancy_index_next_free_slot():
+    startDT = datetime.datetime(2026, 10, 19, 8)
+    index = gs_google_calendar._OccupancyIndex(startDT, startDT + datetime.timedelta(hours=10), slotMinutes=15)
+    startTS = startDT.timestamp()
+    index.SetBusy('Room A', [(startTS, startTS + 3600), (startTS + 5400, startTS + 3 * 3600)])
+    index.SetBusy('Room B', [])
+
+    assert index.GetNextFreeSlot('Room A', datetime.timedelta(minutes=30)) == startDT + datetime.timedelta(hours=1)
+    assert index.GetNextFreeSlot('Room A', datetime.timedelta(minutes=45)) == startDT + datetime.timedelta(hours=3)
+    assert index.GetNextFreeSlot(
+        'Room A', datetime.timedelta(minutes=15), startDT + datetime.timedelta(hours=2)) == startDT + datetime.timedelta(hours=3)
+    assert index.GetNextFreeSlot('Room B', datetime.timedelta(hours=1)) == startDT
+    assert index.GetNextFreeSlot('Room A', datetime.timedelta(hours=11)) is None
+    assert index.GetNextFreeSlot('Room C', datetime.timedelta(minutes=15)) is None
+
+
+def test_next_free_slot_from_free_busy(fakeGoogle):
+    import bench_rooms
+
+    # Room 0 and Room 1 are booked back to back for 2 hours from startDT
+    startDT = datetime.datetime.now().replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+    server = fakeGoogle(rooms=2, eventsPerRoom=2, windowStart=startDT.timestamp(), windowDays=2 / 24)
+
+    serviceAccount = gs_google_calendar.ServiceAccount(
+        'test.json', 'test-freebusy-{}'.format(id(server)), bench_rooms._FakeAuthManager())
+    rooms = [serviceAccount.GetRoomInterface('Room {}'.format(room), apiRoot=server.url, rateLimit=1000) for room in range(2)]
+
+    index = serviceAccount.UpdateAvailability(startDT=startDT, endDT=startDT + datetime.timedelta(hours=6))
+    assert index.GetRoomNames() == {'Room 0', 'Room 1'}
+    for room in rooms:
+        assert index.GetNextFreeSlot(room.calendarName, datetime.timedelta(minutes=30), startDT) == \
+            startDT + datetime.timedelta(hours=2)
+    assert index.GetFreeRooms(startDT, startDT + datetime.timedelta(hours=1)) == []
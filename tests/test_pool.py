@@ -0,0 +1,45 @@
+import datetime
+import uuid
+
+import pytest
+
+for _name in ('gs_calendar_base', 'gs_service_accounts', 'gs_requests'):
+    pytest.importorskip(_name)
+
+import gs_google_calendar
+
+
+def _Window():
+    now = datetime.datetime.now()
+    return now - datetime.timedelta(days=2), now + datetime.timedelta(days=9)
+
+
+def _MakeRooms(server, makeCalendar, count, **k):
+    # the rooms of one account, so they share a batch
+    accountKey = 'test-{}'.format(uuid.uuid4().hex)
+    return [makeCalendar(server, roomName='Room {}'.format(room), accountKey=accountKey, **k) for room in range(count)]
+
+
+def test_failing_tile_room_does_not_stick_the_batch(fakeGoogle, makeCalendar, monkeypatch):
+    server = fakeGoogle(rooms=3, eventsPerRoom=5)
+    rooms = _MakeRooms(server, makeCalendar, 2)
+    tiled = makeCalendar(server, roomName='Room 2', accountKey=rooms[0]._accountKey, dayTiles=True)
+    pool = gs_google_calendar.GoogleCalendarPool(rooms + [tiled])
+    startDT, endDT = _Window()
+
+    def Fail(*a, **k):
+        raise OSError('connection reset')
+
+    monkeypatch.setattr(tiled, '_UpdateTiles', Fail)
+    pool.UpdateAll(startDT=startDT, endDT=endDT)
+    for room in rooms:
+        assert not room._updating
+        assert len(room.GetCalendarItemsInRange(startDT, endDT)) == 5
+    assert not tiled._updating
+
+    # the next pass still reaches every room
+    monkeypatch.undo()
+    server.api.Touch('room0@resource.calendar.google.com', 1)
+    pool.UpdateAll(startDT=startDT, endDT=endDT)
+    assert any(item.Get('Subject').endswith('*') for item in rooms[0].GetCalendarItemsInRange(startDT, endDT))
+    assert len(tiled.GetCalendarItemsInRange(startDT, endDT)) == 5